@@ -86,6 +86,19 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory is per process; point this at Redis or Memcached when running
+# several workers so weather and stats caches are shared between them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'paddysense',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -123,6 +136,103 @@ LANGUAGES = [
     ('si', 'Sinhala'),
 ]
 
+# Geocoding cache (seconds / entries)
+GEOCODE_CACHE_TTL = 60 * 60 * 24 * 30  # 30 days for resolved locations
+GEOCODE_NEGATIVE_CACHE_TTL = 60 * 60 * 6  # 6 hours for locations no strategy could find
+GEOCODE_CACHE_MAX_ENTRIES = 5000
+
+# Offline gazetteer checked before any remote geocoding (defaults to main/data/gazetteer.tsv)
+GAZETTEER_PATH = BASE_DIR / 'main' / 'data' / 'gazetteer.tsv'
+REGIONS_PATH = BASE_DIR / 'main' / 'data' / 'regions.tsv'  # district and province table for region codes
+
+# Concurrent geocoding resolver
+GEOCODE_DEADLINE = 12  # overall seconds allowed for all strategies
+GEOCODE_MAX_WORKERS = 10
+
+# Weather cache: coordinates are snapped to a grid so nearby users share entries
+WEATHER_GRID_DEGREES = 0.05  # roughly 5.5 km
+WEATHER_CACHE_TTL = 300  # seconds
+WEATHER_BATCH_CHUNK = 50  # grid cells per multi-location upstream request
+WEATHER_BATCH_MAX_POINTS = 1000  # coordinates accepted by /api/weather-batch/
+WEATHER_STALE_TTL = 60 * 60 * 6  # keep last-known-good forecasts to serve while refreshing
+WEATHER_BREAKER_FAILURES = 5  # consecutive provider failures before the circuit opens
+WEATHER_BREAKER_RESET = 30  # seconds before a half-open probe is allowed
+WEATHER_RETRY_AFTER = 30  # Retry-After sent with 503s when the provider fails but the circuit is closed
+
+# Background weather prefetch for the most requested grid cells
+WEATHER_PREFETCH_ENABLED = False  # in-process refresher; or run `manage.py prefetch_weather`
+WEATHER_PREFETCH_INTERVAL = 60  # seconds between refresh cycles
+WEATHER_PREFETCH_TOP = 50  # hottest cells considered per cycle
+WEATHER_PREFETCH_MAX_PER_MINUTE = 30  # upper bound on upstream refreshes
+WEATHER_PREFETCH_WINDOW = 60 * 60 * 24  # only cells requested within this many seconds
+WEATHER_PREFETCH_MARGIN = 60  # refresh this many seconds before the cache entry expires
+WEATHER_HOTSPOT_FLUSH_INTERVAL = 30  # seconds between hit counter writes
+
+# Shared upstream HTTP client (weather and geocoding providers)
+UPSTREAM_POOL_SIZE = 10  # keep-alive connections per host
+UPSTREAM_RETRIES = 2
+UPSTREAM_BACKOFF = 0.3  # seconds, with up to the same amount of random jitter
+UPSTREAM_DEFAULT_TIMEOUT = 10
+UPSTREAM_TIMEOUTS = {
+    'nominatim.openstreetmap.org': 10,
+    'geocoding-api.open-meteo.com': 8,
+    'api.open-meteo.com': 8,
+}
+
+# Upstream rate limits as (requests per second, burst). Nominatim's usage
+# policy allows roughly one request per second per application.
+UPSTREAM_RATE_LIMITS = {
+    'nominatim.openstreetmap.org': (1.0, 1),
+}
+UPSTREAM_RATE_LIMIT_BACKEND = 'local'  # 'cache' shares buckets between workers via CACHES
+UPSTREAM_RATE_LIMIT_MAX_WAIT = 10  # seconds a request may queue before failing
+
+# Paddy recommendation rule tables
+PADDY_RULES_PATH = BASE_DIR / 'main' / 'data' / 'paddy_rules.json'
+PADDY_RULES_RELOAD_INTERVAL = 5  # seconds between checks for an edited rule file
+PADDY_RULES_MEMO_SIZE = 2048  # compiled recommendations kept per worker
+RECOMMENDATION_BATCH_MAX_ROWS = 5000  # rows accepted per /api/recommendations/batch/ request
+RECOMMENDATION_BATCH_CHUNK = 500  # rows per INSERT statement
+REGENERATE_CHUNK = 500  # rows per chunk when regenerating after a rule change
+REGENERATE_PAUSE = 0.5  # seconds between regeneration chunks
+
+# Write-behind saving of user_input submissions. Submissions are fsync'd to a
+# journal in WRITE_BEHIND_JOURNAL_DIR and inserted in batches by a background
+# thread; journals left by a crashed process are replayed on the next start.
+RECOMMENDATION_WRITE_BEHIND = False
+WRITE_BEHIND_QUEUE_SIZE = 1000  # queued submissions before requests insert synchronously
+WRITE_BEHIND_BATCH = 200
+WRITE_BEHIND_FLUSH_INTERVAL = 1.0  # seconds to wait for a batch to fill
+# Kept outside the checkout so journal segments are never committed or deployed
+WRITE_BEHIND_JOURNAL_DIR = Path.home() / '.local' / 'state' / 'paddysense' / 'journal'
+
+# manage.py benchmark
+BENCHMARK_BASELINE_PATH = BASE_DIR / 'benchmarks' / 'baseline.json'
+BENCHMARK_REGRESSION_THRESHOLD = 0.25  # allowed growth of p95 latency and peak memory
+BENCHMARK_SIZES = [10000, 100000, 1000000]  # seeded PaddyRecommendation rows
+BENCHMARK_REPEAT = 20
+
+# manage.py generate_portfolio_recommendations
+PORTFOLIO_WORKERS = None  # worker processes; None uses every CPU
+PORTFOLIO_CHUNK = 500  # fields evaluated per worker task (whole farms are never split)
+
+# Daily rollup of PaddyRecommendation read by analytics and the dashboard
+ROLLUP_REBUILD_DAYS = 31  # days rebuilt per transaction by rebuild_recommendation_stats
+ANALYTICS_CACHE_TTL = 300  # seconds; the cached analytics context is also retired on every data change
+RECOMMENDATION_STATS_TTL = 300  # seconds; shared dashboard/notification/analytics totals
+
+# Live dashboard counters in the cache (see main.counters). Reconciled against
+# the database in a background thread when older than this many seconds; None
+# leaves it to `manage.py reconcile_counters`, which needs a cache shared
+# between processes.
+COUNTER_RECONCILE_INTERVAL = 300
+COUNTER_HLL_PRECISION = 12  # 4096 one-byte registers per distinct-count sketch
+
+# Streaming recommendation export (/api/export/recommendations.csv|ndjson)
+EXPORT_CHUNK_SIZE = 2000  # rows fetched from the database per round trip
+EXPORT_BUFFER_SIZE = 64 * 1024  # bytes of output gathered before each write
+EXPORT_GZIP_LEVEL = 6  # when the client sends Accept-Encoding: gzip
+
 
 
 
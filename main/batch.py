@@ -0,0 +1,154 @@
+import csv
+import io
+import json
+import math
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import counters, rollup
+from .models import PaddyRecommendation, RecommendationPayload
+from .regions import resolve_region
+from .rules import compiled_recommendation, get_rule_set
+
+RECOMMENDATION_BATCH_MAX_ROWS = getattr(settings, 'RECOMMENDATION_BATCH_MAX_ROWS', 5000)
+RECOMMENDATION_BATCH_CHUNK = getattr(settings, 'RECOMMENDATION_BATCH_CHUNK', 500)
+
+BATCH_COLUMNS = ['location', 'field_name', 'soil_temperature', 'soil_type', 'season']
+
+# Same defaults as the user_input form
+DEFAULT_SOIL_TYPE = 'loamy'
+DEFAULT_SEASON = 'current'
+
+
+def parse_rows(body, content_type):
+    """Read batch rows from a JSON ({"rows": [...]} or a bare list) or CSV request body"""
+    if 'csv' in content_type:
+        try:
+            text = body.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ValueError('CSV body must be UTF-8 encoded')
+        reader = csv.DictReader(io.StringIO(text))
+        missing = {'location', 'soil_temperature'} - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f'CSV header is missing: {", ".join(sorted(missing))}')
+        rows = list(reader)
+    else:
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise ValueError('Invalid JSON body')
+        rows = data.get('rows') if isinstance(data, dict) else data
+
+    if not isinstance(rows, list) or not rows:
+        raise ValueError('A non-empty "rows" list is required')
+    return rows
+
+
+def clean_row(row):
+    """Validate one batch row and return it with defaults applied"""
+    if not isinstance(row, dict):
+        raise ValueError('Row must be an object')
+
+    def text(name, default, max_length):
+        value = row.get(name)
+        value = default if value is None else str(value).strip() or default
+        if len(value) > max_length:
+            raise ValueError(f'{name} is longer than {max_length} characters')
+        return value
+
+    location = text('location', '', 200)
+    if not location:
+        raise ValueError('location is required')
+    try:
+        soil_temperature = float(row.get('soil_temperature'))
+    except (TypeError, ValueError):
+        raise ValueError('soil_temperature must be a number')
+    if not math.isfinite(soil_temperature):
+        raise ValueError('soil_temperature must be a finite number')
+
+    return {
+        'location': location,
+        'field_name': text('field_name', '', 100),
+        'soil_temperature': soil_temperature,
+        'soil_type': text('soil_type', DEFAULT_SOIL_TYPE, 50),
+        'season': text('season', DEFAULT_SEASON, 50),
+    }
+
+
+def clean_rows(rows):
+    """Split rows into (valid rows, errors); errors carry the input row index"""
+    valid = []
+    errors = []
+    for index, row in enumerate(rows):
+        try:
+            valid.append(clean_row(row))
+        except ValueError as e:
+            errors.append({'row': index, 'error': str(e)})
+    return valid, errors
+
+
+def group_rows(rule_set, rows, month=None):
+    """Map each rule key to the indexes of the cleaned rows it covers
+
+    All temperatures are banded in one NumPy pass.
+    """
+    month = month or datetime.now().month
+    bands = rule_set.band_array([row['soil_temperature'] for row in rows]).tolist()
+
+    groups = defaultdict(list)
+    for index, (row, band) in enumerate(zip(rows, bands)):
+        key = (
+            band,
+            rule_set.soil_key(row['soil_type']),
+            rule_set.season_kind(row['season']),
+            rule_set.region_of(row['location']),
+            month,
+        )
+        groups[key].append(index)
+    return groups
+
+
+def build_recommendations(rows, month=None):
+    """Unsaved PaddyRecommendation objects for cleaned rows, plus the number of distinct rule keys
+
+    Every distinct rule key is evaluated once for the whole batch.
+    """
+    rule_set = get_rule_set()
+    groups = group_rows(rule_set, rows, month)
+
+    # Rows sharing a rule key share the payload, only the explanation differs
+    compiled = {key: compiled_recommendation(rule_set, key) for key in groups}
+    payloads = dict(zip(compiled, RecommendationPayload.objects.intern_many(list(compiled.values()))))
+
+    now = timezone.now()
+    objects = [None] * len(rows)
+    for key, indexes in groups.items():
+        for index in indexes:
+            row = rows[index]
+            objects[index] = PaddyRecommendation(
+                location=row['location'],
+                region=resolve_region(row['location']),
+                field_name=row['field_name'],
+                soil_temperature=row['soil_temperature'],
+                soil_type=row['soil_type'],
+                planting_season=row['season'],
+                payload=payloads[key],
+                explanation=rule_set.fill_explanation(compiled[key], row['soil_temperature']),
+                rule_version=rule_set.revision,
+                timestamp=now,
+                success=True,
+            )
+    return objects, len(groups)
+
+
+def save_recommendations(objects):
+    """Insert recommendations in chunks and add them to the daily rollup and counters, all in one transaction"""
+    with transaction.atomic():
+        created = PaddyRecommendation.objects.bulk_create(objects, batch_size=RECOMMENDATION_BATCH_CHUNK)
+        rollup.record_inserted(created)
+        counters.record_inserted(created)
+    return created
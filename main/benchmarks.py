@@ -0,0 +1,233 @@
+import itertools
+import json
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .batch import build_recommendations, save_recommendations
+
+BENCHMARK_BASELINE_PATH = getattr(settings, 'BENCHMARK_BASELINE_PATH', Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json')
+BENCHMARK_REGRESSION_THRESHOLD = getattr(settings, 'BENCHMARK_REGRESSION_THRESHOLD', 0.25)
+BENCHMARK_SIZES = getattr(settings, 'BENCHMARK_SIZES', [10000, 100000, 1000000])
+BENCHMARK_REPEAT = getattr(settings, 'BENCHMARK_REPEAT', 20)
+
+SEED_CHUNK = 5000
+
+GRID_TEMPERATURES = [t / 2 for t in range(-10, 101)]
+GRID_SOILS = ['clay', 'sandy', 'loamy', 'silt', 'other']
+GRID_SEASONS = ['yala', 'maha', 'current', 'other']
+GRID_LOCATIONS = [
+    'Jaffna, Sri Lanka', 'Colombo, Sri Lanka', 'Kandy, Sri Lanka', 'Anuradhapura, Sri Lanka',
+    'Batticaloa, Sri Lanka', 'Thanjavur, India', 'Palakkad, Kerala', 'Unknown village',
+]
+
+# Views timed against each seeded dataset: (name, method, path, POST data)
+VIEW_CASES = [
+    ('user_input', 'post', '/user-input/', {
+        'location': 'Kandy, Sri Lanka', 'field_name': 'Benchmark field',
+        'soil_temperature': '26.5', 'soil_type': 'clay', 'season': 'yala',
+    }),
+    ('analytics', 'get', '/analytics/', None),
+    ('dashboard_data', 'get', '/api/dashboard-data/', None),
+    ('paddy_history', 'get', '/paddy-history/', None),
+    ('notifications', 'get', '/api/notifications/', None),
+]
+
+# Views whose warm timings only measure a cache hit; these are also timed with
+# the cache cleared before every request and reported as "<name>_cold"
+COLD_VIEW_CASES = ['analytics']
+
+
+def summarize(samples):
+    """p50/p95/max of timings in seconds, reported in milliseconds"""
+    values = np.array(samples) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'max_ms': round(float(values.max()), 3),
+    }
+
+
+def peak_memory_kb(fn):
+    """Peak Python allocation while running fn once"""
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def bench_engine():
+    """Time get_paddy_recommendations over the full input grid"""
+    from .views import get_paddy_recommendations
+
+    grid = list(itertools.product(GRID_TEMPERATURES, GRID_SOILS, GRID_SEASONS, GRID_LOCATIONS))
+    samples = []
+    started = time.perf_counter()
+    for soil_temp, soil_type, season, location in grid:
+        call_started = time.perf_counter()
+        get_paddy_recommendations(soil_temp, soil_type, season, location)
+        samples.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+
+    result = summarize(samples)
+    result['calls'] = len(grid)
+    result['calls_per_second'] = round(len(grid) / elapsed)
+    result['peak_kb'] = peak_memory_kb(
+        lambda: [get_paddy_recommendations(*inputs) for inputs in grid[:1000]]
+    )
+    return result
+
+
+def seed_recommendations(count, rng):
+    """Add count generated recommendations spread over the past year"""
+    now = timezone.now()
+    remaining = count
+    while remaining > 0:
+        size = min(SEED_CHUNK, remaining)
+        rows = [{
+            'location': rng.choice(GRID_LOCATIONS),
+            'field_name': f'Field {rng.randrange(5000)}',
+            'soil_temperature': round(rng.uniform(12, 42), 1),
+            'soil_type': rng.choice(GRID_SOILS),
+            'season': rng.choice(GRID_SEASONS),
+        } for _ in range(size)]
+        objects, groups = build_recommendations(rows)
+        for rec in objects:
+            rec.timestamp = now - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        save_recommendations(objects)
+        remaining -= size
+
+
+def bench_view(client, method, path, data, repeat, cold=False):
+    """Time one view; query count and peak memory come from separate runs
+
+    With cold=True the cache is cleared before every request, so cached views
+    are measured computing their response instead of serving a hit.
+    """
+    request = getattr(client, method)
+
+    def call():
+        response = request(path, data) if data is not None else request(path)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{path} returned {response.status_code}')
+        if getattr(response, 'streaming', False):
+            b''.join(response.streaming_content)
+        return response
+
+    cache.clear()
+    call()  # warm up caches and lazy imports
+
+    samples = []
+    for _ in range(repeat):
+        if cold:
+            cache.clear()
+        started = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - started)
+
+    if cold:
+        cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+        call()
+    result = summarize(samples)
+    result['queries'] = len(queries)
+    if cold:
+        cache.clear()
+    result['peak_kb'] = peak_memory_kb(call)
+    return result
+
+
+def run_benchmarks(sizes=None, repeat=None, seed=42, log=print):
+    """Run the engine and view benchmarks; the caller provides an empty (test) database"""
+    rng = random.Random(seed)
+    repeat = repeat or BENCHMARK_REPEAT
+    results = {
+        'meta': {
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'repeat': repeat,
+        },
+        'engine': bench_engine(),
+        'views': {},
+    }
+    log(f"engine: {results['engine']}")
+
+    client = Client()
+    seeded = 0
+    for size in sorted(sizes or BENCHMARK_SIZES):
+        started = time.perf_counter()
+        seed_recommendations(size - seeded, rng)
+        seeded = size
+        log(f"seeded {size} rows in {time.perf_counter() - started:.1f}s")
+
+        views = results['views'][str(size)] = {}
+        cases = [(name, method, path, data, False) for name, method, path, data in VIEW_CASES]
+        cases += [(f'{name}_cold', method, path, data, True)
+                  for name, method, path, data in VIEW_CASES if name in COLD_VIEW_CASES]
+        for name, method, path, data, cold in cases:
+            try:
+                views[name] = bench_view(client, method, path, data, repeat, cold=cold)
+            except Exception as e:
+                views[name] = {'error': str(e)}
+            log(f"{size} {name}: {views[name]}")
+    return results
+
+
+def find_regressions(results, baseline, threshold=None):
+    """Metrics that got worse than the baseline by more than the threshold
+
+    Latency and memory may grow by the threshold fraction; query counts may not
+    grow at all. A benchmark that fails now but did not in the baseline is a
+    regression too.
+    """
+    threshold = BENCHMARK_REGRESSION_THRESHOLD if threshold is None else threshold
+    regressions = []
+
+    def compare(label, current, previous):
+        if 'error' in current:
+            if 'error' not in previous:
+                regressions.append(f"{label} failed: {current['error']}")
+            return
+        if 'error' in previous:
+            return
+        for metric in ('p95_ms', 'peak_kb'):
+            if metric in previous and current.get(metric, 0) > previous[metric] * (1 + threshold):
+                regressions.append(f"{label} {metric}: {previous[metric]} -> {current[metric]}")
+        if 'queries' in previous and current.get('queries', 0) > previous['queries']:
+            regressions.append(f"{label} queries: {previous['queries']} -> {current['queries']}")
+
+    compare('engine', results['engine'], baseline.get('engine', {}))
+    for size, views in baseline.get('views', {}).items():
+        for name, previous in views.items():
+            current = results['views'].get(size, {}).get(name)
+            if current is not None:
+                compare(f"{size} {name}", current, previous)
+    return regressions
+
+
+def load_baseline(path=None):
+    path = Path(path or BENCHMARK_BASELINE_PATH)
+    if not path.exists():
+        return None
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def save_results(results, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as handle:
+        json.dump(results, handle, indent=2)
+        handle.write('\n')
@@ -0,0 +1,276 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Count, Q
+
+from .models import TEMPERATURE_CATEGORIES, PaddyRecommendation
+
+# Dashboard KPIs kept as live counters in the cache. Writers increment them
+# after commit; reads need no SQL. Counters are reconciled against the
+# database in a background thread when they are missing or older than
+# COUNTER_RECONCILE_INTERVAL (None leaves periodic reconciliation to the
+# reconcile_counters command).
+COUNTER_RECONCILE_INTERVAL = getattr(settings, 'COUNTER_RECONCILE_INTERVAL', 300)
+COUNTER_HLL_PRECISION = getattr(settings, 'COUNTER_HLL_PRECISION', 12)
+
+COUNTER_NAMES = ['total', 'successful'] + list(TEMPERATURE_CATEGORIES)
+SKETCH_NAMES = ['locations', 'fields']
+
+RECONCILED_AT_KEY = 'counters:reconciled_at'
+DRIFT_KEY = 'counters:drift'
+
+_sketch_lock = threading.Lock()
+_reconcile_lock = threading.Lock()
+
+
+def counter_key(name):
+    return f"counters:{name}"
+
+
+def sketch_key(name):
+    return f"counters:hll:{name}"
+
+
+ALL_KEYS = [counter_key(name) for name in COUNTER_NAMES] + [sketch_key(name) for name in SKETCH_NAMES] + [RECONCILED_AT_KEY]
+
+
+class HyperLogLog:
+    """Distinct-value estimator in 2**precision one-byte registers (~1.6% error at precision 12)
+
+    Registers only ever grow, so sketches merge by taking the maximum and a
+    lost concurrent update can only make the estimate a little low until the
+    next reconciliation.
+    """
+
+    def __init__(self, precision=COUNTER_HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+
+    def add(self, value):
+        """Add a value; returns True when a register changed"""
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest()
+        hashed = int.from_bytes(digest, 'big')
+        index = hashed >> (64 - self.precision)
+        remainder = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def update(self, values):
+        changed = False
+        for value in values:
+            changed = self.add(value) or changed
+        return changed
+
+    def estimate(self):
+        registers = np.frombuffer(bytes(self.registers), dtype=np.uint8)
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        raw = alpha * self.size * self.size / float(np.sum(np.exp2(-registers.astype(float))))
+        zeros = int(np.count_nonzero(registers == 0))
+        if raw <= 2.5 * self.size and zeros:
+            # Linear counting is more accurate for small cardinalities
+            return round(self.size * math.log(self.size / zeros))
+        return round(raw)
+
+    def to_bytes(self):
+        return bytes(self.registers)
+
+
+def _deltas(records, sign):
+    deltas = dict.fromkeys(COUNTER_NAMES, 0)
+    for rec in records:
+        deltas['total'] += sign
+        deltas['successful'] += sign if rec.success else 0
+        deltas[rec.get_temperature_category()] += sign
+    return deltas
+
+
+def record_inserted(records):
+    """Count saved recommendations once the current transaction commits"""
+    records = list(records)
+    deltas = _deltas(records, 1)
+    locations = {rec.location for rec in records}
+    fields = {rec.field_name for rec in records}
+    transaction.on_commit(lambda: _apply(deltas, {'locations': locations, 'fields': fields}))
+
+
+def record_deleted(records):
+    """Uncount deleted recommendations; distinct estimates only shrink at reconciliation"""
+    deltas = _deltas(records, -1)
+    transaction.on_commit(lambda: _apply(deltas, {}))
+
+
+def _apply(deltas, sketch_values):
+    for name, delta in deltas.items():
+        if delta:
+            try:
+                cache.incr(counter_key(name), delta)
+            except ValueError:
+                pass  # not initialized yet; the first reconciliation counts this row
+    for name, values in sketch_values.items():
+        _grow_sketch(name, values)
+
+
+def _grow_sketch(name, values):
+    """Merge values into a cached sketch
+
+    The read-modify-write is only serialized within this process. With a
+    cache shared between workers, concurrent updates can overwrite each
+    other's registers, so the estimate is approximate and may run low until
+    the next reconciliation rebuilds the sketch.
+    """
+    with _sketch_lock:
+        registers = cache.get(sketch_key(name))
+        if registers is None:
+            return
+        sketch = HyperLogLog(registers=registers)
+        if sketch.update(values):
+            cache.set(sketch_key(name), sketch.to_bytes(), timeout=None)
+
+
+def _snapshot(values):
+    counts = {name: values[counter_key(name)] for name in COUNTER_NAMES}
+    return {
+        'total': counts['total'],
+        'successful': counts['successful'],
+        'locations': HyperLogLog(registers=values[sketch_key('locations')]).estimate(),
+        'fields': HyperLogLog(registers=values[sketch_key('fields')]).estimate(),
+        'bands': {category: counts[category] for category in TEMPERATURE_CATEGORIES},
+    }
+
+
+def get_counters():
+    """Current KPI counters from the cache; never scans the database itself
+
+    A due or missing reconciliation is started in the background. Until the
+    counters exist the last reconciled values are served, or the rollup
+    totals before the first reconciliation.
+    """
+    values = cache.get_many(ALL_KEYS)
+    if len(values) == len(ALL_KEYS):
+        if (COUNTER_RECONCILE_INTERVAL is not None
+                and time.time() - values[RECONCILED_AT_KEY] > COUNTER_RECONCILE_INTERVAL):
+            reconcile_in_background()
+        return _snapshot(values)
+    reconcile_in_background()
+    report = get_drift()
+    if report is not None:
+        return report['actual']
+    return _rollup_snapshot()
+
+
+def _rollup_snapshot():
+    from .stats import get_recommendation_stats
+
+    stats = get_recommendation_stats()
+    return {
+        'total': stats['total'],
+        'successful': stats['successful'],
+        'locations': stats['locations'],
+        'fields': stats['fields'],
+        'bands': dict(stats['bands']),
+    }
+
+
+def reconcile_in_background():
+    """Start a reconciliation thread unless one is already running in this process"""
+    if not _reconcile_lock.acquire(blocking=False):
+        return False
+    threading.Thread(target=_background_reconcile, name='counter-reconcile', daemon=True).start()
+    return True
+
+
+def _background_reconcile():
+    try:
+        reconcile()
+    except Exception as e:
+        print(f"Counter reconciliation failed: {e}")
+    finally:
+        connections.close_all()
+        _reconcile_lock.release()
+
+
+def reconcile():
+    """Recompute every counter from the database, record the drift and correct the cache
+
+    The counters are read right after the count and corrected by adding
+    the difference, so rows committed (and counted) before the count are
+    not counted twice and increments made during the later scans are kept.
+    Only a commit whose increment lands between the count and that read
+    can leave a counter off by one until the next reconciliation. Sketches
+    are replaced; a location or field first added during their scan may be
+    missing from them until then.
+
+    Returns the drift report: for each metric the live counter, the actual
+    value and their difference.
+    """
+    totals = PaddyRecommendation.objects.aggregate(
+        total=Count('id'),
+        successful=Count('id', filter=Q(success=True)),
+        **{category: Count('id', filter=condition) for category, condition in TEMPERATURE_CATEGORIES.items()},
+    )
+    previous = cache.get_many(ALL_KEYS)
+    current = _snapshot(previous) if len(previous) == len(ALL_KEYS) else None
+    for name in COUNTER_NAMES:
+        key = counter_key(name)
+        if key in previous:
+            try:
+                cache.incr(key, totals[name] - previous[key])
+                continue
+            except ValueError:
+                pass  # evicted since it was read
+        cache.set(key, totals[name], timeout=None)
+
+    sketches = {}
+    distinct = {}
+    for name, field in [('locations', 'location'), ('fields', 'field_name')]:
+        sketch = HyperLogLog()
+        distinct[name] = 0
+        for value in PaddyRecommendation.objects.order_by().values_list(field, flat=True).distinct().iterator():
+            sketch.add(value)
+            distinct[name] += 1
+        sketches[name] = sketch
+
+    reconciled_at = time.time()
+    values = {sketch_key(name): sketch.to_bytes() for name, sketch in sketches.items()}
+    values[RECONCILED_AT_KEY] = reconciled_at
+    cache.set_many(values, timeout=None)
+
+    actual = {
+        'total': totals['total'],
+        'successful': totals['successful'],
+        'locations': distinct['locations'],
+        'fields': distinct['fields'],
+        'bands': {category: totals[category] for category in TEMPERATURE_CATEGORIES},
+    }
+    report = {
+        'reconciled_at': datetime.fromtimestamp(reconciled_at, tz=dt_timezone.utc).isoformat(),
+        'counters': current,
+        'actual': actual,
+        'drift': _drift(current, actual) if current else None,
+        'estimates': {name: sketches[name].estimate() for name in SKETCH_NAMES},
+    }
+    cache.set(DRIFT_KEY, report, timeout=None)
+    return report
+
+
+def _drift(current, actual):
+    """Counter minus actual value for every metric"""
+    drift = {name: current[name] - actual[name] for name in ['total', 'successful', 'locations', 'fields']}
+    drift['bands'] = {category: current['bands'][category] - actual['bands'][category] for category in TEMPERATURE_CATEGORIES}
+    return drift
+
+
+def get_drift():
+    """The report of the latest reconciliation, or None before the first one"""
+    return cache.get(DRIFT_KEY)
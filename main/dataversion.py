@@ -0,0 +1,46 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Counter bumped whenever PaddyRecommendation rows change. Caches of derived
+# data (e.g. the analytics context) put it in their keys, so a bump retires
+# every entry computed from older data without having to find and delete them.
+DATA_VERSION_CACHE_KEY = 'recommendations:data-version'
+DATA_CHANGED_AT_CACHE_KEY = 'recommendations:data-changed-at'
+
+
+def get_data_version():
+    """Current data version, starting a new sequence when the counter was evicted"""
+    version = cache.get(DATA_VERSION_CACHE_KEY)
+    if version is None:
+        # Seeded from the clock so an evicted counter never repeats an old version
+        cache.add(DATA_VERSION_CACHE_KEY, time.time_ns(), timeout=None)
+        version = cache.get(DATA_VERSION_CACHE_KEY)
+    return version
+
+
+def get_data_changed_at():
+    """Unix time of the latest data version bump; restarts at the current time when evicted"""
+    changed_at = cache.get(DATA_CHANGED_AT_CACHE_KEY)
+    if changed_at is None:
+        cache.add(DATA_CHANGED_AT_CACHE_KEY, time.time(), timeout=None)
+        changed_at = cache.get(DATA_CHANGED_AT_CACHE_KEY)
+    return changed_at
+
+
+def bump_data_version():
+    """Advance the data version once the current transaction commits
+
+    Bumping before the commit would let a reader recompute from the old rows
+    and cache them under the new version.
+    """
+    transaction.on_commit(_bump)
+
+
+def _bump():
+    try:
+        cache.incr(DATA_VERSION_CACHE_KEY)
+    except ValueError:
+        cache.add(DATA_VERSION_CACHE_KEY, time.time_ns(), timeout=None)
+    cache.set(DATA_CHANGED_AT_CACHE_KEY, time.time(), timeout=None)
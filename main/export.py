@@ -0,0 +1,130 @@
+import csv
+import io
+import json
+import zlib
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import PAYLOAD_FIELDS
+
+EXPORT_CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+EXPORT_BUFFER_SIZE = getattr(settings, 'EXPORT_BUFFER_SIZE', 64 * 1024)
+EXPORT_GZIP_LEVEL = getattr(settings, 'EXPORT_GZIP_LEVEL', 6)
+
+# Query parameters shared by paddy_history and the export
+HISTORY_FILTERS = ['location', 'soil_type', 'season', 'date_from', 'date_to']
+
+# Exportable columns and the lookups they are read through; the payload columns
+# are large JSON documents, so they are only exported when asked for
+ROW_FIELDS = [
+    'id', 'timestamp', 'location', 'region', 'field_name', 'soil_temperature', 'soil_type',
+    'planting_season', 'rule_version', 'success', 'explanation', 'notes',
+]
+EXPORT_FIELDS = {field: field for field in ROW_FIELDS}
+EXPORT_FIELDS.update({field: f'payload__{field}' for field in PAYLOAD_FIELDS})
+DEFAULT_EXPORT_FIELDS = ROW_FIELDS
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def history_filters(params):
+    """The paddy_history filter values from a query dict"""
+    return {name: params.get(name, '') for name in HISTORY_FILTERS}
+
+
+def filter_recommendations(recommendations, filters):
+    """Apply paddy_history filters; invalid dates raise ValidationError"""
+    if filters['location']:
+        recommendations = recommendations.filter(location__icontains=filters['location'])
+    if filters['soil_type']:
+        recommendations = recommendations.filter(soil_type=filters['soil_type'])
+    if filters['season']:
+        recommendations = recommendations.filter(planting_season=filters['season'])
+    if filters['date_from']:
+        recommendations = recommendations.filter(timestamp__gte=filters['date_from'])
+    if filters['date_to']:
+        recommendations = recommendations.filter(timestamp__lte=filters['date_to'])
+    return recommendations
+
+
+def parse_fields(value):
+    """Columns requested with ?fields=a,b,c; raises ValueError for unknown names"""
+    if not value:
+        return list(DEFAULT_EXPORT_FIELDS)
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in EXPORT_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"Unknown export field(s): {', '.join(unknown) or value}. "
+                         f"Available: {', '.join(EXPORT_FIELDS)}")
+    return list(dict.fromkeys(fields))
+
+
+def export_rows(recommendations, fields):
+    """Stream value tuples for the fields, EXPORT_CHUNK_SIZE rows per database fetch"""
+    return recommendations.values_list(*[EXPORT_FIELDS[field] for field in fields]).iterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    )
+
+
+def csv_lines(rows, fields):
+    """CSV text, header first; JSON columns are written as JSON"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        writer.writerow(values)
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    yield line(fields)
+    for row in rows:
+        yield line([
+            json.dumps(value, ensure_ascii=False) if isinstance(value, (list, dict))
+            else value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in row
+        ])
+
+
+def ndjson_lines(rows, fields):
+    """One JSON object per line"""
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def encode_chunks(lines, size=EXPORT_BUFFER_SIZE):
+    """Join text lines into UTF-8 chunks of about size bytes"""
+    pending = []
+    pending_size = 0
+    for line in lines:
+        pending.append(line)
+        pending_size += len(line)
+        if pending_size >= size:
+            yield ''.join(pending).encode('utf-8')
+            pending = []
+            pending_size = 0
+    if pending:
+        yield ''.join(pending).encode('utf-8')
+
+
+def gzip_chunks(chunks, level=EXPORT_GZIP_LEVEL):
+    """Compress a byte stream into one gzip member as it is produced"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(recommendations, fmt, fields, compress=False):
+    """Byte chunks of the export in the given format, gzip-compressed when asked"""
+    rows = export_rows(recommendations, fields)
+    lines = csv_lines(rows, fields) if fmt == 'csv' else ndjson_lines(rows, fields)
+    chunks = encode_chunks(lines)
+    return gzip_chunks(chunks) if compress else chunks
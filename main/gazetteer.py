@@ -0,0 +1,157 @@
+import csv
+import re
+import threading
+import unicodedata
+from pathlib import Path
+
+from django.conf import settings
+
+GAZETTEER_PATH = getattr(settings, 'GAZETTEER_PATH', Path(__file__).resolve().parent / 'data' / 'gazetteer.tsv')
+
+COUNTRY_NAMES = {
+    'LK': ['sri lanka', 'srilanka', 'ceylon', 'lanka'],
+    'IN': ['india', 'bharat'],
+}
+
+# Romanization variants folded together, applied in order after accents are removed
+_FOLDS = [
+    ('zh', 'l'), ('th', 't'), ('dh', 'd'), ('bh', 'b'), ('ph', 'p'), ('kh', 'k'),
+    ('gh', 'g'), ('ch', 'c'), ('sh', 's'), ('w', 'v'), ('q', 'k'),
+    ('ee', 'i'), ('oo', 'u'), ('aa', 'a'), ('ou', 'u'),
+]
+_REPEATS = re.compile(r'([a-z])\1+')
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+_QUALIFIER_SUFFIX = re.compile(r' (province|district|state|division|ds division)$')
+
+KIND_RANK = {'district': 0, 'town': 1, 'division': 2}
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def fold_name(text):
+    """Fold a place name so common Tamil and Sinhala romanizations compare equal"""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    text = _NON_ALNUM.sub(' ', text).strip()
+    for source, target in _FOLDS:
+        text = text.replace(source, target)
+    return _REPEATS.sub(r'\1', text)
+
+
+class Gazetteer:
+    """In-memory place index: folded-name hash for lookups, prefix trie for autocomplete"""
+
+    def __init__(self, places):
+        self.places = sorted(places, key=lambda place: (KIND_RANK.get(place['kind'], 9), place['name']))
+        self.by_name = {}
+        self.trie = {}
+        for place_id, place in enumerate(self.places):
+            for name in [place['name']] + place['alternate_names']:
+                key = fold_name(name)
+                if not key:
+                    continue
+                ids = self.by_name.setdefault(key, [])
+                if place_id not in ids:
+                    ids.append(place_id)
+                self._insert(key, place_id)
+        self.countries = {fold_name(name): code for code, names in COUNTRY_NAMES.items() for name in names}
+        self.admins = {fold_name(place['admin']) for place in self.places}
+
+    def _insert(self, key, place_id):
+        node = self.trie
+        for ch in key:
+            node = node.setdefault(ch, {})
+        ids = node.setdefault('$', [])
+        if place_id not in ids:
+            ids.append(place_id)
+
+    def lookup(self, location):
+        """Resolve a free-text location to a single place, or None when unsure
+
+        The first comma separated part names the place; later parts (a known
+        place, province/state or country) disambiguate and reject mismatches.
+        """
+        parts = [fold_name(part) for part in location.split(',')]
+        parts = [part for part in parts if part]
+        if not parts:
+            return None
+
+        candidates = [self.places[i] for i in self.by_name.get(parts[0], [])]
+        if not candidates and len(parts) == 1:
+            # "Jaffna Sri Lanka" without a comma: strip a trailing country name
+            for country_key, code in self.countries.items():
+                if parts[0].endswith(' ' + country_key):
+                    name = parts[0][:-len(country_key)].strip()
+                    candidates = [self.places[i] for i in self.by_name.get(name, []) if self.places[i]['country'] == code]
+                    break
+
+        for context in parts[1:]:
+            context = _QUALIFIER_SUFFIX.sub('', context)
+            if context in self.countries:
+                candidates = [place for place in candidates if place['country'] == self.countries[context]]
+            elif context in self.admins:
+                candidates = [place for place in candidates if fold_name(place['admin']) == context]
+            elif context not in self.by_name:
+                # Qualified by something we do not know (another state or
+                # country, a street); leave it to the remote geocoders
+                return None
+        return candidates[0] if candidates else None
+
+    def autocomplete(self, prefix, limit=8):
+        """Places whose name or alternate name starts with the prefix"""
+        node = self.trie
+        for ch in fold_name(prefix):
+            node = node.get(ch)
+            if node is None:
+                return []
+        found = set()
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for key, child in node.items():
+                if key == '$':
+                    found.update(child)
+                else:
+                    stack.append(child)
+        return [self.places[i] for i in sorted(found)[:limit]]
+
+
+def load_places(path=None):
+    """Read the bundled gazetteer TSV"""
+    places = []
+    with open(path or GAZETTEER_PATH, encoding='utf-8', newline='') as handle:
+        for row in csv.DictReader(handle, delimiter='\t'):
+            places.append({
+                'name': row['name'],
+                'alternate_names': [name for name in row['alternate_names'].split('|') if name],
+                'kind': row['kind'],
+                'admin': row['admin'],
+                'country': row['country'],
+                'latitude': float(row['latitude']),
+                'longitude': float(row['longitude']),
+            })
+    return places
+
+
+def get_gazetteer():
+    """Return the process-wide gazetteer, loading it on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = Gazetteer(load_places())
+    return _index
+
+
+def lookup_place(location):
+    """Resolve a location from the local gazetteer in the resolver's place format"""
+    place = get_gazetteer().lookup(location)
+    if place is None:
+        return None
+    return {
+        'latitude': place['latitude'],
+        'longitude': place['longitude'],
+        'display_name': place['name'],
+        'source': 'Local Gazetteer',
+    }
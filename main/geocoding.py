@@ -0,0 +1,252 @@
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+import requests
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from . import upstream
+from .gazetteer import lookup_place
+from .models import GeocodeCache
+from .regions import strip_street_terms
+
+# Cache settings (seconds / entries)
+GEOCODE_CACHE_TTL = getattr(settings, 'GEOCODE_CACHE_TTL', 60 * 60 * 24 * 30)
+GEOCODE_NEGATIVE_CACHE_TTL = getattr(settings, 'GEOCODE_NEGATIVE_CACHE_TTL', 60 * 60 * 6)
+GEOCODE_CACHE_MAX_ENTRIES = getattr(settings, 'GEOCODE_CACHE_MAX_ENTRIES', 5000)
+
+# Concurrent resolver settings
+GEOCODE_DEADLINE = getattr(settings, 'GEOCODE_DEADLINE', 12)
+GEOCODE_MAX_WORKERS = getattr(settings, 'GEOCODE_MAX_WORKERS', 10)
+
+_executor = ThreadPoolExecutor(max_workers=GEOCODE_MAX_WORKERS, thread_name_prefix='geocoding')
+_PENDING = object()
+
+
+def normalize_query(location):
+    """Normalize a location query so equivalent searches share a cache entry"""
+    query = re.sub(r'\s+', ' ', location.strip().lower())
+    query = re.sub(r'\s*,\s*', ', ', query)
+    return query.strip(' ,')[:255]
+
+
+def _nominatim_place(data):
+    """Build a place dict from the best Nominatim match"""
+    if data and len(data) > 0:
+        best_match = data[0]
+        return {
+            'latitude': float(best_match['lat']),
+            'longitude': float(best_match['lon']),
+            'display_name': best_match['display_name'].split(',')[0],
+        }
+    return None
+
+
+def _search_nominatim(query, params, cancelled=None):
+    """Run a Nominatim search and return the best match or None"""
+    url = f"https://nominatim.openstreetmap.org/search?q={query}&{params}"
+    response = upstream.get(url, cancelled=cancelled)
+    if response.status_code == 200 and response.text.strip():
+        try:
+            return _nominatim_place(response.json())
+        except json.JSONDecodeError as e:
+            print(f"Nominatim JSON decode error: {e}")
+    return None
+
+
+def strategy_exact(location, cancelled=None):
+    """Strategy 1: OpenStreetMap Nominatim exact search"""
+    return _search_nominatim(location, 'format=json&limit=5&addressdetails=1', cancelled)
+
+
+def strategy_detailed(location, cancelled=None):
+    """Strategy 2: Nominatim with more specific search parameters"""
+    return _search_nominatim(location, 'format=json&limit=10&addressdetails=1&extratags=1&namedetails=1', cancelled)
+
+
+def strategy_open_meteo(location, cancelled=None):
+    """Strategy 3: Open-Meteo Geocoding API"""
+    url = f"https://geocoding-api.open-meteo.com/v1/search?name={location}&count=5&language=en&format=json"
+    response = upstream.get(url, cancelled=cancelled)
+    if response.status_code == 200:
+        try:
+            data = response.json()
+            if data.get('results') and len(data['results']) > 0:
+                result = data['results'][0]
+                return {
+                    'latitude': float(result['latitude']),
+                    'longitude': float(result['longitude']),
+                    'display_name': result['name'],
+                }
+        except Exception as e:
+            print(f"Open-Meteo geocoding error: {e}")
+    return None
+
+
+def strategy_main_part(location, cancelled=None):
+    """Strategy 4: Nominatim with just the main part of a comma separated location"""
+    location_parts = [part.strip() for part in location.split(',') if part.strip()]
+    if len(location_parts) > 1:
+        return _search_nominatim(location_parts[0], 'format=json&limit=3', cancelled)
+    return None
+
+
+def strategy_cleaned(location, cancelled=None):
+    """Strategy 5: Nominatim with common street terms removed"""
+    cleaned_location = strip_street_terms(location)
+    if cleaned_location != location:
+        return _search_nominatim(cleaned_location, 'format=json&limit=3', cancelled)
+    return None
+
+
+# Strategies in priority order with the source label shown to the user
+GEOCODING_STRATEGIES = [
+    ('OpenStreetMap', strategy_exact),
+    ('OpenStreetMap (Detailed)', strategy_detailed),
+    ('Open-Meteo Geocoding', strategy_open_meteo),
+    ('OpenStreetMap (Main Part)', strategy_main_part),
+    ('OpenStreetMap (Cleaned)', strategy_cleaned),
+]
+
+
+def geocode_location(location, deadline=None):
+    """Run the geocoding strategies concurrently and return the best ranked place
+
+    A result is accepted as soon as every higher priority strategy has finished
+    without an answer; the remaining strategies are then cancelled, and those
+    already running send no further upstream requests. When the overall
+    deadline passes the best answer received so far is used.
+    """
+    deadline = deadline or GEOCODE_DEADLINE
+    cancelled = threading.Event()
+    futures = {
+        _executor.submit(strategy, location, cancelled): index
+        for index, (source, strategy) in enumerate(GEOCODING_STRATEGIES)
+    }
+    results = [_PENDING] * len(futures)
+    errors = []
+
+    try:
+        for future in as_completed(futures, timeout=deadline):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except requests.RequestException as e:
+                print(f"Strategy {index + 1} network error: {e}")
+                results[index] = None
+                errors.append(e)
+            except Exception as e:
+                print(f"Strategy {index + 1} error: {e}")
+                results[index] = None
+            if _ranked_winner(results, complete_only=True) is not None:
+                break
+    except FuturesTimeoutError:
+        print(f"Geocoding deadline of {deadline}s exceeded for '{location}'")
+    finally:
+        cancelled.set()
+        for future in futures:
+            future.cancel()
+
+    index = _ranked_winner(results, complete_only=False)
+    if index is not None:
+        place = dict(results[index], source=GEOCODING_STRATEGIES[index][0])
+        print(f"Strategy {index + 1} success - Coordinates: {place['latitude']}, {place['longitude']}, Display: {place['display_name']}")
+        return place
+
+    # Only report "not found" when every strategy really answered; network
+    # errors and timeouts must not end up in the negative cache.
+    if errors:
+        raise errors[0]
+    if _PENDING in results:
+        raise requests.Timeout(f"Geocoding timed out after {deadline} seconds")
+    return None
+
+
+def _ranked_winner(results, complete_only):
+    """Index of the highest priority place, optionally requiring all better strategies to be done"""
+    for index, result in enumerate(results):
+        if result is _PENDING:
+            if complete_only:
+                return None
+            continue
+        if result:
+            return index
+    return None
+
+
+def get_cached_location(query):
+    """Return (hit, place) for a normalized query; place is None for negative hits"""
+    entry = GeocodeCache.objects.filter(query=query).first()
+    if entry is None:
+        return False, None
+
+    ttl = GEOCODE_CACHE_TTL if entry.found else GEOCODE_NEGATIVE_CACHE_TTL
+    if entry.created_at < timezone.now() - timedelta(seconds=ttl):
+        entry.delete()
+        return False, None
+
+    GeocodeCache.objects.filter(pk=entry.pk).update(last_used=timezone.now(), hits=F('hits') + 1)
+    if not entry.found:
+        return True, None
+    return True, {
+        'latitude': entry.latitude,
+        'longitude': entry.longitude,
+        'display_name': entry.display_name,
+        'source': entry.source,
+    }
+
+
+def cache_location(query, place):
+    """Store a geocoding result (or a negative result when place is None)"""
+    now = timezone.now()
+    values = {
+        'found': place is not None,
+        'latitude': place['latitude'] if place else None,
+        'longitude': place['longitude'] if place else None,
+        'display_name': place['display_name'][:200] if place else '',
+        'source': place['source'] if place else '',
+        'created_at': now,
+        'last_used': now,
+    }
+    try:
+        GeocodeCache.objects.update_or_create(query=query, defaults=values)
+    except IntegrityError:
+        # Another worker stored the same query first
+        return
+    evict_stale_locations()
+
+
+def evict_stale_locations():
+    """Drop least recently used entries beyond the configured cache size"""
+    overflow = GeocodeCache.objects.count() - GEOCODE_CACHE_MAX_ENTRIES
+    if overflow > 0:
+        stale_ids = list(GeocodeCache.objects.order_by('last_used').values_list('id', flat=True)[:overflow])
+        GeocodeCache.objects.filter(id__in=stale_ids).delete()
+
+
+def resolve_location(location, deadline=None):
+    """Resolve a location to coordinates from the gazetteer, the cache or the network
+
+    This is the entry point for any location-aware view.
+    """
+    # Known villages and districts resolve from the bundled gazetteer
+    place = lookup_place(location)
+    if place:
+        print(f"Gazetteer hit for '{location}'")
+        return place
+
+    query = normalize_query(location)
+    hit, place = get_cached_location(query)
+    if hit:
+        print(f"Geocoding cache hit for '{query}'")
+        return place
+
+    place = geocode_location(location, deadline)
+    cache_location(query, place)
+    return place
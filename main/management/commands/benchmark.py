@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from main.benchmarks import (
+    BENCHMARK_BASELINE_PATH, BENCHMARK_REGRESSION_THRESHOLD, BENCHMARK_REPEAT, BENCHMARK_SIZES,
+    find_regressions, load_baseline, run_benchmarks, save_results
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the recommendation engine and the main views against seeded test databases'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=BENCHMARK_SIZES,
+                            help='Dataset sizes (rows) to seed and benchmark the views against')
+        parser.add_argument('--repeat', type=int, default=BENCHMARK_REPEAT,
+                            help='Timed requests per view and dataset size')
+        parser.add_argument('--baseline', default=BENCHMARK_BASELINE_PATH,
+                            help='JSON baseline to compare against')
+        parser.add_argument('--threshold', type=float, default=BENCHMARK_REGRESSION_THRESHOLD,
+                            help='Allowed relative growth of p95 latency and peak memory')
+        parser.add_argument('--output', help='Also write the results to this JSON file')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Store the results as the new baseline instead of comparing')
+
+    def handle(self, *args, **options):
+        # Never seed the real database: run everything inside a throwaway test database
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = run_benchmarks(options['sizes'], options['repeat'], log=self.stdout.write)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['output']:
+            save_results(results, options['output'])
+
+        if options['update_baseline']:
+            save_results(results, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        baseline = load_baseline(options['baseline'])
+        if baseline is None:
+            self.stdout.write(self.style.WARNING(f"No baseline at {options['baseline']}; run with --update-baseline to create one"))
+            return
+
+        regressions = find_regressions(results, baseline, options['threshold'])
+        if regressions:
+            raise CommandError('Performance regressions:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
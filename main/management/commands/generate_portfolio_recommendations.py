@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from main.portfolio import PORTFOLIO_CHUNK, run_portfolio
+
+
+class Command(BaseCommand):
+    help = 'Generate a recommendation for every registered paddy field, e.g. before Yala or Maha'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--season', default='current', choices=['yala', 'maha', 'current', 'other'],
+                            help='Planting season to plan for')
+        parser.add_argument('--month', type=int, choices=range(1, 13), default=None,
+                            help='Month the recommendations are for (defaults to the current month)')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (defaults to PORTFOLIO_WORKERS or the CPU count)')
+        parser.add_argument('--chunk-size', type=int, default=PORTFOLIO_CHUNK,
+                            help='Fields evaluated per worker task')
+
+    def handle(self, *args, **options):
+        def report(progress):
+            self.stdout.write(
+                f"{progress['fields']}/{progress['total']} fields, {progress['written']} written, "
+                f"{progress['skipped']} without sensor data, {progress['failed']} failed "
+                f"({progress['rows_per_second']} rows/s)"
+            )
+
+        result = run_portfolio(
+            season=options['season'],
+            month=options['month'],
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            progress=report,
+        )
+        style = self.style.WARNING if result['failed'] else self.style.SUCCESS
+        self.stdout.write(style(
+            f"{result['written']} recommendation(s) written for {result['fields']} field(s) "
+            f"in {result['partitions']} partition(s), {result['skipped']} skipped without sensor data; "
+            f"{result['seconds']}s on {result['workers']} worker(s), {result['rows_per_second']} rows/s, "
+            f"{result['rows_per_second_per_core']} rows/s per core"
+        ))
+        for partition in result['failed']:
+            self.stderr.write(
+                f"Failed: {partition['fields']} field(s) of farm(s) {', '.join(map(str, partition['farm_ids']))}: "
+                f"{partition['error']}"
+            )
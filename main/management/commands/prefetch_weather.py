@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.prefetch import WEATHER_PREFETCH_INTERVAL, WEATHER_PREFETCH_MAX_PER_MINUTE, WEATHER_PREFETCH_TOP, run_prefetch_cycle
+
+
+class Command(BaseCommand):
+    help = 'Refresh cached weather for the most requested locations before it expires'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run a single refresh cycle and exit')
+        parser.add_argument('--interval', type=int, default=WEATHER_PREFETCH_INTERVAL,
+                            help='Seconds between refresh cycles')
+        parser.add_argument('--top', type=int, default=WEATHER_PREFETCH_TOP,
+                            help='Number of hottest locations to consider')
+        parser.add_argument('--max-per-minute', type=int, default=WEATHER_PREFETCH_MAX_PER_MINUTE,
+                            help='Upper bound on upstream refreshes per minute')
+
+    def handle(self, *args, **options):
+        while True:
+            refreshed = run_prefetch_cycle(limit=options['top'], max_per_minute=options['max_per_minute'])
+            self.stdout.write(f"Refreshed weather for {refreshed} location(s)")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,31 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.rollup import ROLLUP_REBUILD_DAYS, rebuild, rebuild_fields
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily and per-field recommendation rollups from the raw recommendations, e.g. after a backfill'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', default=None,
+                            help='First date to rebuild (YYYY-MM-DD); defaults to the oldest recommendation')
+        parser.add_argument('--to', dest='end', default=None,
+                            help='Date to stop before (YYYY-MM-DD); defaults to the day after the newest one')
+        parser.add_argument('--days', type=int, default=ROLLUP_REBUILD_DAYS,
+                            help='Days rebuilt per transaction')
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError as e:
+            raise CommandError(f'Invalid date: {e}')
+
+        def report(progress):
+            self.stdout.write(f"{progress['start']} - {progress['end']}: {progress['rows']} rollup row(s) written")
+
+        written = rebuild(start=start, end=end, days=options['days'], progress=report)
+        fields = rebuild_fields()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the daily rollup: {written} row(s); {fields} field(s) counted"))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.counters import COUNTER_RECONCILE_INTERVAL, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recompute the live dashboard counters from the database and report their drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Reconcile once and exit')
+        parser.add_argument('--interval', type=int, default=COUNTER_RECONCILE_INTERVAL or 300,
+                            help='Seconds between reconciliations')
+
+    def handle(self, *args, **options):
+        while True:
+            report = reconcile()
+            actual = report['actual']
+            self.stdout.write(
+                f"Reconciled at {report['reconciled_at']}: {actual['total']} recommendation(s), "
+                f"{actual['locations']} location(s), {actual['fields']} field(s); drift {report['drift']}"
+            )
+            if options['once']:
+                break
+            time.sleep(options['interval'])
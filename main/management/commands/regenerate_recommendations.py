@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from main.regenerate import REGENERATE_CHUNK, REGENERATE_PAUSE, regenerate_outdated
+
+
+class Command(BaseCommand):
+    help = 'Regenerate stored recommendations produced by another rule set revision (version or rule file contents)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=REGENERATE_CHUNK,
+                            help='Rows read and written per chunk')
+        parser.add_argument('--pause', type=float, default=REGENERATE_PAUSE,
+                            help='Seconds to sleep between chunks')
+        parser.add_argument('--start-after', type=int, default=0,
+                            help='Skip rows with an id up to this value')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Stop after scanning this many rows')
+
+    def handle(self, *args, **options):
+        def report(progress):
+            self.stdout.write(
+                f"[{progress['revision']}] {progress['scanned']}/{progress['total']} scanned, "
+                f"{progress['rewritten']} rewritten, last id {progress['last_id']} "
+                f"({progress['rows_per_second']} rows/s)"
+            )
+
+        result = regenerate_outdated(
+            after_id=options['start_after'],
+            chunk_size=options['chunk_size'],
+            pause=options['pause'],
+            limit=options['limit'],
+            progress=report,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Rule revision {result['revision']}: {result['scanned']} row(s) checked, "
+            f"{result['rewritten']} regenerated, last id {result['last_id']}"
+        ))
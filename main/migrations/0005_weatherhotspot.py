@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:31
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_geocodecache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeatherHotspot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latitude', models.FloatField(help_text='Grid cell centre latitude')),
+                ('longitude', models.FloatField(help_text='Grid cell centre longitude')),
+                ('name', models.CharField(blank=True, max_length=200)),
+                ('hits', models.IntegerField(default=0)),
+                ('last_requested', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('last_refreshed', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-hits'],
+                'unique_together': {('latitude', 'longitude')},
+            },
+        ),
+    ]
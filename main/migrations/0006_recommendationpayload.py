@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_weatherhotspot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationPayload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(help_text='SHA-256 of the canonical JSON content', max_length=64, unique=True)),
+                ('primary_varieties', models.JSONField(help_text='Primary paddy varieties recommended')),
+                ('secondary_varieties', models.JSONField(help_text='Secondary paddy varieties')),
+                ('planting_timing', models.TextField(help_text='Planting timing recommendations')),
+                ('soil_preparation', models.TextField(help_text='Soil preparation advice')),
+                ('water_management', models.TextField(help_text='Water management tips')),
+                ('fertilizer_tips', models.TextField(help_text='Fertilizer recommendations')),
+                ('risk_factors', models.JSONField(help_text='Risk factors identified')),
+                ('optimal_conditions', models.JSONField(help_text='Optimal growing conditions')),
+                ('current_time_recommendations', models.TextField(help_text='Current time-based advice')),
+                ('seasonal_varieties', models.JSONField(help_text='Season-specific varieties')),
+                ('immediate_actions', models.JSONField(help_text='Immediate actions required')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='paddyrecommendation',
+            name='payload',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='recommendations', to='main.recommendationpayload'),
+        ),
+    ]
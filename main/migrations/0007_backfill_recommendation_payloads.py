@@ -0,0 +1,61 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:42
+
+import hashlib
+import json
+
+from django.db import migrations
+
+PAYLOAD_FIELDS = [
+    'primary_varieties', 'secondary_varieties', 'planting_timing', 'soil_preparation',
+    'water_management', 'fertilizer_tips', 'risk_factors', 'optimal_conditions',
+    'current_time_recommendations', 'seasonal_varieties', 'immediate_actions',
+]
+CHUNK_SIZE = 1000
+
+
+def content_hash(content):
+    canonical = json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def move_payloads(apps, schema_editor):
+    """Point every recommendation at a shared payload row, walking the table by id"""
+    PaddyRecommendation = apps.get_model('main', 'PaddyRecommendation')
+    RecommendationPayload = apps.get_model('main', 'RecommendationPayload')
+    payload_ids = {}
+    last_id = 0
+    while True:
+        rows = list(
+            PaddyRecommendation.objects.filter(id__gt=last_id).order_by('id')
+            .only('id', *PAYLOAD_FIELDS)[:CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        for rec in rows:
+            content = {field: getattr(rec, field) for field in PAYLOAD_FIELDS}
+            key = content_hash(content)
+            if key not in payload_ids:
+                # Payloads survive a reverse of this migration, so reuse them
+                payload_ids[key] = RecommendationPayload.objects.get_or_create(content_hash=key, defaults=content)[0].id
+            rec.payload_id = payload_ids[key]
+        PaddyRecommendation.objects.bulk_update(rows, ['payload'])
+        last_id = rows[-1].id
+
+
+def copy_payloads_back(apps, schema_editor):
+    PaddyRecommendation = apps.get_model('main', 'PaddyRecommendation')
+    for rec in PaddyRecommendation.objects.select_related('payload').iterator(chunk_size=CHUNK_SIZE):
+        for field in PAYLOAD_FIELDS:
+            setattr(rec, field, getattr(rec.payload, field))
+        rec.save(update_fields=PAYLOAD_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_recommendationpayload'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_payloads, copy_payloads_back),
+    ]
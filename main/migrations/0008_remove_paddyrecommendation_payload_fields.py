@@ -0,0 +1,125 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_backfill_recommendation_payloads'),
+    ]
+
+    operations = [
+        # State only: reversing the removals below re-adds the columns as NOT
+        # NULL, so they need a default for existing rows until 0007's reverse
+        # copies the payloads back into them.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='paddyrecommendation',
+                    name='current_time_recommendations',
+                    field=models.TextField(default=''),
+                ),
+                migrations.AlterField(
+                    model_name='paddyrecommendation',
+                    name='fertilizer_tips',
+                    field=models.TextField(default=''),
+                ),
+                migrations.AlterField(
+                    model_name='paddyrecommendation',
+                    name='immediate_actions',
+                    field=models.JSONField(default=list),
+                ),
+                migrations.AlterField(
+                    model_name='paddyrecommendation',
+                    name='optimal_conditions',
+                    field=models.JSONField(default=dict),
+                ),
+                migrations.AlterField(
+                    model_name='paddyrecommendation',
+                    name='planting_timing',
+                    field=models.TextField(default=''),
+                ),
+                migrations.AlterField(
+                    model_name='paddyrecommendation',
+                    name='primary_varieties',
+                    field=models.JSONField(default=list),
+                ),
+                migrations.AlterField(
+                    model_name='paddyrecommendation',
+                    name='risk_factors',
+                    field=models.JSONField(default=list),
+                ),
+                migrations.AlterField(
+                    model_name='paddyrecommendation',
+                    name='seasonal_varieties',
+                    field=models.JSONField(default=list),
+                ),
+                migrations.AlterField(
+                    model_name='paddyrecommendation',
+                    name='secondary_varieties',
+                    field=models.JSONField(default=list),
+                ),
+                migrations.AlterField(
+                    model_name='paddyrecommendation',
+                    name='soil_preparation',
+                    field=models.TextField(default=''),
+                ),
+                migrations.AlterField(
+                    model_name='paddyrecommendation',
+                    name='water_management',
+                    field=models.TextField(default=''),
+                ),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='paddyrecommendation',
+            name='current_time_recommendations',
+        ),
+        migrations.RemoveField(
+            model_name='paddyrecommendation',
+            name='fertilizer_tips',
+        ),
+        migrations.RemoveField(
+            model_name='paddyrecommendation',
+            name='immediate_actions',
+        ),
+        migrations.RemoveField(
+            model_name='paddyrecommendation',
+            name='optimal_conditions',
+        ),
+        migrations.RemoveField(
+            model_name='paddyrecommendation',
+            name='planting_timing',
+        ),
+        migrations.RemoveField(
+            model_name='paddyrecommendation',
+            name='primary_varieties',
+        ),
+        migrations.RemoveField(
+            model_name='paddyrecommendation',
+            name='risk_factors',
+        ),
+        migrations.RemoveField(
+            model_name='paddyrecommendation',
+            name='seasonal_varieties',
+        ),
+        migrations.RemoveField(
+            model_name='paddyrecommendation',
+            name='secondary_varieties',
+        ),
+        migrations.RemoveField(
+            model_name='paddyrecommendation',
+            name='soil_preparation',
+        ),
+        migrations.RemoveField(
+            model_name='paddyrecommendation',
+            name='water_management',
+        ),
+        migrations.AlterField(
+            model_name='paddyrecommendation',
+            name='payload',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='recommendations', to='main.recommendationpayload'),
+        ),
+    ]
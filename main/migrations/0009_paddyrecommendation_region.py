@@ -0,0 +1,84 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:45
+
+import csv
+import re
+import unicodedata
+from pathlib import Path
+
+from django.db import migrations, models
+
+# Frozen copy of the region matcher as of this migration (main.regions and
+# main.gazetteer.fold_name), so later changes to them cannot alter the backfill.
+REGIONS_PATH = Path(__file__).resolve().parent.parent / 'data' / 'regions.tsv'
+KIND_RANK = {'district': 0, 'state': 1, 'province': 1, 'country': 2}
+FOLDS = [
+    ('zh', 'l'), ('th', 't'), ('dh', 'd'), ('bh', 'b'), ('ph', 'p'), ('kh', 'k'),
+    ('gh', 'g'), ('ch', 'c'), ('sh', 's'), ('w', 'v'), ('q', 'k'),
+    ('ee', 'i'), ('oo', 'u'), ('aa', 'a'), ('ou', 'u'),
+]
+CHUNK_SIZE = 1000
+
+
+def fold_name(text):
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    text = re.sub(r'[^a-z0-9]+', ' ', text).strip()
+    for source, target in FOLDS:
+        text = text.replace(source, target)
+    return re.sub(r'([a-z])\1+', r'\1', text)
+
+
+def region_matcher():
+    """A function mapping a location to its most specific region code"""
+    kinds = {}
+    codes_by_name = {}
+    with open(REGIONS_PATH, encoding='utf-8', newline='') as handle:
+        for row in csv.DictReader(handle, delimiter='\t'):
+            kinds[row['code']] = row['kind']
+            for name in [row['name']] + [alias for alias in row['aliases'].split('|') if alias]:
+                key = fold_name(name)
+                if key:
+                    codes_by_name.setdefault(key, row['code'])
+    names = '|'.join(re.escape(name) for name in sorted(codes_by_name, key=len, reverse=True))
+    pattern = re.compile(rf'\b(?:{names})\b')
+
+    def resolve(location):
+        best = None
+        for match in pattern.finditer(fold_name(location)):
+            code = codes_by_name[match.group(0)]
+            rank = KIND_RANK.get(kinds[code], 9)
+            if best is None or rank < best[0]:
+                best = (rank, code)
+        return best[1] if best else ''
+    return resolve
+
+
+def detect_regions(apps, schema_editor):
+    """Store the region code of every existing recommendation, walking the table by id"""
+    PaddyRecommendation = apps.get_model('main', 'PaddyRecommendation')
+    resolve_region = region_matcher()
+    last_id = 0
+    while True:
+        rows = list(PaddyRecommendation.objects.filter(id__gt=last_id).order_by('id').only('id', 'location')[:CHUNK_SIZE])
+        if not rows:
+            break
+        for rec in rows:
+            rec.region = resolve_region(rec.location)
+        PaddyRecommendation.objects.bulk_update(rows, ['region'])
+        last_id = rows[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_remove_paddyrecommendation_payload_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paddyrecommendation',
+            name='region',
+            field=models.CharField(blank=True, db_index=True, help_text='Region code detected from the location', max_length=10),
+        ),
+        migrations.RunPython(detect_regions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_paddyrecommendation_region'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paddyrecommendation',
+            name='rule_version',
+            field=models.CharField(blank=True, db_index=True, help_text='Rule set version that generated the recommendation', max_length=32),
+        ),
+    ]
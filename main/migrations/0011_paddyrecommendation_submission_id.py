@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_paddyrecommendation_rule_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paddyrecommendation',
+            name='submission_id',
+            field=models.UUIDField(blank=True, editable=False, help_text='Client side id making journal replays idempotent', null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_paddyrecommendation_submission_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paddyrecommendation',
+            index=models.Index(fields=['timestamp', 'soil_temperature'], name='main_paddyr_timesta_f4cd5e_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_paddyrecommendation_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='Local date of the recommendations')),
+                ('location', models.CharField(max_length=200)),
+                ('soil_type', models.CharField(max_length=50)),
+                ('planting_season', models.CharField(max_length=50)),
+                ('region', models.CharField(blank=True, db_index=True, help_text='Region code of the location', max_length=10)),
+                ('recommendation_count', models.IntegerField(default=0)),
+                ('success_count', models.IntegerField(default=0)),
+                ('temperature_sum', models.FloatField(default=0)),
+                ('temperature_min', models.FloatField(null=True)),
+                ('temperature_max', models.FloatField(null=True)),
+                ('cold_count', models.IntegerField(default=0)),
+                ('optimal_count', models.IntegerField(default=0)),
+                ('warm_count', models.IntegerField(default=0)),
+                ('hot_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Recommendation Daily Stats',
+                'constraints': [models.UniqueConstraint(fields=('date', 'location', 'soil_type', 'planting_season'), name='unique_recommendation_daily_stats')],
+            },
+        ),
+    ]
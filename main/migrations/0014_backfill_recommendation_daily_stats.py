@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:55
+
+from django.db import migrations
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate
+
+BATCH_SIZE = 1000
+
+# Frozen copy of the temperature categories as of this migration
+CATEGORY_FILTERS = {
+    'cold_count': Q(soil_temperature__lt=20),
+    'optimal_count': Q(soil_temperature__gte=20, soil_temperature__lte=30),
+    'warm_count': Q(soil_temperature__gt=30, soil_temperature__lte=35),
+    'hot_count': Q(soil_temperature__gt=35),
+}
+
+
+def build_stats(apps, schema_editor):
+    """Fill the daily rollup from the existing recommendations"""
+    PaddyRecommendation = apps.get_model('main', 'PaddyRecommendation')
+    RecommendationDailyStats = apps.get_model('main', 'RecommendationDailyStats')
+    rows = (
+        PaddyRecommendation.objects
+        .annotate(day=TruncDate('timestamp'))
+        .values('day', 'location', 'soil_type', 'planting_season')
+        .annotate(
+            recommendation_count=Count('id'),
+            success_count=Count('id', filter=Q(success=True)),
+            temperature_sum=Sum('soil_temperature'),
+            temperature_min=Min('soil_temperature'),
+            temperature_max=Max('soil_temperature'),
+            region_code=Max('region'),
+            **{field: Count('id', filter=condition) for field, condition in CATEGORY_FILTERS.items()},
+        )
+        .order_by()
+    )
+    stats = []
+    for row in rows.iterator():
+        region = row.pop('region_code') or ''
+        stats.append(RecommendationDailyStats(date=row.pop('day'), region=region, **row))
+        if len(stats) >= BATCH_SIZE:
+            RecommendationDailyStats.objects.bulk_create(stats)
+            stats = []
+    RecommendationDailyStats.objects.bulk_create(stats)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_recommendationdailystats'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
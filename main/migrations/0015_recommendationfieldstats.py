@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_backfill_recommendation_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationFieldStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field_name', models.CharField(max_length=100, unique=True)),
+                ('recommendation_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Recommendation Field Stats',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:30
+
+from django.db import migrations
+from django.db.models import Count
+
+BATCH_SIZE = 1000
+
+
+def count_fields(apps, schema_editor):
+    """Count the existing recommendations per field name"""
+    PaddyRecommendation = apps.get_model('main', 'PaddyRecommendation')
+    RecommendationFieldStats = apps.get_model('main', 'RecommendationFieldStats')
+    rows = PaddyRecommendation.objects.values('field_name').annotate(total=Count('id')).order_by()
+    stats = []
+    for row in rows.iterator():
+        stats.append(RecommendationFieldStats(field_name=row['field_name'], recommendation_count=row['total']))
+        if len(stats) >= BATCH_SIZE:
+            RecommendationFieldStats.objects.bulk_create(stats)
+            stats = []
+    RecommendationFieldStats.objects.bulk_create(stats)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_recommendationfieldstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_fields, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,6 @@
+import hashlib
+import json
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -258,10 +261,116 @@ class WeatherHistory(models.Model):
     def __str__(self):
         return f"{self.location} - {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
 
+class WeatherHotspot(models.Model):
+    """Weather grid cells ranked by how often they are requested"""
+    latitude = models.FloatField(help_text="Grid cell centre latitude")
+    longitude = models.FloatField(help_text="Grid cell centre longitude")
+    name = models.CharField(max_length=200, blank=True)
+    hits = models.IntegerField(default=0)
+    last_requested = models.DateTimeField(default=timezone.now, db_index=True)
+    last_refreshed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-hits']
+        unique_together = ['latitude', 'longitude']
+
+    def __str__(self):
+        return f"{self.name or f'{self.latitude}, {self.longitude}'} ({self.hits} hits)"
+
+class GeocodeCache(models.Model):
+    """Cache geocoding results for normalized location queries"""
+    query = models.CharField(max_length=255, unique=True, help_text="Normalized location query")
+    found = models.BooleanField(default=True, help_text="False when every geocoding strategy failed")
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    display_name = models.CharField(max_length=200, blank=True)
+    source = models.CharField(max_length=100, blank=True)
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    last_used = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name_plural = "Geocode Cache"
+
+    def __str__(self):
+        return f"{self.query} ({self.source or 'not found'})"
+
+# Recommendation fields stored once per distinct output on RecommendationPayload
+PAYLOAD_FIELDS = [
+    'primary_varieties', 'secondary_varieties', 'planting_timing', 'soil_preparation',
+    'water_management', 'fertilizer_tips', 'risk_factors', 'optimal_conditions',
+    'current_time_recommendations', 'seasonal_varieties', 'immediate_actions',
+]
+
+
+def payload_hash(recommendations):
+    """Content hash of the payload fields of a recommendation dict"""
+    content = {field: recommendations[field] for field in PAYLOAD_FIELDS}
+    canonical = json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class RecommendationPayloadManager(models.Manager):
+    
+    def intern(self, recommendations):
+        """Return the payload row for a recommendation dict, creating it if needed"""
+        return self.intern_many([recommendations])[0]
+    
+    def intern_many(self, recommendations_list):
+        """Payload rows for many recommendation dicts with one lookup and one insert"""
+        hashes = [payload_hash(recommendations) for recommendations in recommendations_list]
+        payloads = self.in_bulk(set(hashes), field_name='content_hash')
+        missing = {}
+        for content_hash, recommendations in zip(hashes, recommendations_list):
+            if content_hash not in payloads and content_hash not in missing:
+                missing[content_hash] = self.model(
+                    content_hash=content_hash,
+                    **{field: recommendations[field] for field in PAYLOAD_FIELDS}
+                )
+        if missing:
+            # Concurrent writers may insert the same content; re-read to get the winning rows
+            self.bulk_create(missing.values(), ignore_conflicts=True)
+            payloads.update(self.in_bulk(list(missing), field_name='content_hash'))
+        return [payloads[content_hash] for content_hash in hashes]
+
+class RecommendationPayload(models.Model):
+    """Generated recommendation content shared by every submission with the same output"""
+    content_hash = models.CharField(max_length=64, unique=True, help_text="SHA-256 of the canonical JSON content")
+    primary_varieties = models.JSONField(help_text="Primary paddy varieties recommended")
+    secondary_varieties = models.JSONField(help_text="Secondary paddy varieties")
+    planting_timing = models.TextField(help_text="Planting timing recommendations")
+    soil_preparation = models.TextField(help_text="Soil preparation advice")
+    water_management = models.TextField(help_text="Water management tips")
+    fertilizer_tips = models.TextField(help_text="Fertilizer recommendations")
+    risk_factors = models.JSONField(help_text="Risk factors identified")
+    optimal_conditions = models.JSONField(help_text="Optimal growing conditions")
+    current_time_recommendations = models.TextField(help_text="Current time-based advice")
+    seasonal_varieties = models.JSONField(help_text="Season-specific varieties")
+    immediate_actions = models.JSONField(help_text="Immediate actions required")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = RecommendationPayloadManager()
+    
+    def __str__(self):
+        return f"Payload {self.content_hash[:12]}"
+    
+    def content(self):
+        """The payload fields as a recommendation dict"""
+        return {field: getattr(self, field) for field in PAYLOAD_FIELDS}
+
+# Query filters matching PaddyRecommendation.get_temperature_category()
+TEMPERATURE_CATEGORIES = {
+    'cold': models.Q(soil_temperature__lt=20),
+    'optimal': models.Q(soil_temperature__gte=20, soil_temperature__lte=30),
+    'warm': models.Q(soil_temperature__gt=30, soil_temperature__lte=35),
+    'hot': models.Q(soil_temperature__gt=35),
+}
+
 class PaddyRecommendation(models.Model):
     """Store paddy farming recommendations and inputs"""
     # User Input Data
     location = models.CharField(max_length=200, help_text="Farm location")
+    region = models.CharField(max_length=10, blank=True, db_index=True, help_text="Region code detected from the location")
     field_name = models.CharField(max_length=100, help_text="Field identifier")
     soil_temperature = models.FloatField(help_text="Soil temperature in Celsius")
     soil_type = models.CharField(max_length=50, choices=[
@@ -278,19 +387,12 @@ class PaddyRecommendation(models.Model):
         ('other', 'Other')
     ])
     
-    # Generated Recommendations
-    primary_varieties = models.JSONField(help_text="Primary paddy varieties recommended")
-    secondary_varieties = models.JSONField(help_text="Secondary paddy varieties")
-    planting_timing = models.TextField(help_text="Planting timing recommendations")
-    soil_preparation = models.TextField(help_text="Soil preparation advice")
-    water_management = models.TextField(help_text="Water management tips")
-    fertilizer_tips = models.TextField(help_text="Fertilizer recommendations")
-    risk_factors = models.JSONField(help_text="Risk factors identified")
-    optimal_conditions = models.JSONField(help_text="Optimal growing conditions")
-    current_time_recommendations = models.TextField(help_text="Current time-based advice")
-    seasonal_varieties = models.JSONField(help_text="Season-specific varieties")
-    immediate_actions = models.JSONField(help_text="Immediate actions required")
+    # Generated Recommendations (shared content lives on the payload; the
+    # explanation quotes the soil temperature so it stays on the row)
+    payload = models.ForeignKey(RecommendationPayload, on_delete=models.PROTECT, related_name='recommendations')
     explanation = models.TextField(help_text="Overall explanation and summary")
+    rule_version = models.CharField(max_length=32, blank=True, db_index=True, help_text="Rule set version that generated the recommendation")
+    submission_id = models.UUIDField(null=True, blank=True, unique=True, editable=False, help_text="Client side id making journal replays idempotent")
     
     # Metadata
     timestamp = models.DateTimeField(default=timezone.now, help_text="When recommendation was generated")
@@ -305,11 +407,26 @@ class PaddyRecommendation(models.Model):
             models.Index(fields=['soil_temperature', 'timestamp']),
             models.Index(fields=['soil_type', 'timestamp']),
             models.Index(fields=['planting_season', 'timestamp']),
+            # Date range scans of the analytics trends; covers AVG(soil_temperature) too
+            models.Index(fields=['timestamp', 'soil_temperature']),
         ]
     
     def __str__(self):
         return f"{self.field_name} - {self.location} ({self.timestamp.strftime('%Y-%m-%d %H:%M')})"
     
+    # Read-only access to the shared payload, so templates keep using rec.primary_varieties etc.
+    primary_varieties = property(lambda self: self.payload.primary_varieties)
+    secondary_varieties = property(lambda self: self.payload.secondary_varieties)
+    planting_timing = property(lambda self: self.payload.planting_timing)
+    soil_preparation = property(lambda self: self.payload.soil_preparation)
+    water_management = property(lambda self: self.payload.water_management)
+    fertilizer_tips = property(lambda self: self.payload.fertilizer_tips)
+    risk_factors = property(lambda self: self.payload.risk_factors)
+    optimal_conditions = property(lambda self: self.payload.optimal_conditions)
+    current_time_recommendations = property(lambda self: self.payload.current_time_recommendations)
+    seasonal_varieties = property(lambda self: self.payload.seasonal_varieties)
+    immediate_actions = property(lambda self: self.payload.immediate_actions)
+    
     def get_temperature_category(self):
         """Get temperature category for analysis"""
         if self.soil_temperature < 20:
@@ -330,3 +447,42 @@ class PaddyRecommendation(models.Model):
             return 'maha'
         else:
             return 'transition'
+
+class RecommendationDailyStats(models.Model):
+    """Per-day rollup of PaddyRecommendation rows, kept in step by main.rollup"""
+    date = models.DateField(help_text="Local date of the recommendations")
+    location = models.CharField(max_length=200)
+    soil_type = models.CharField(max_length=50)
+    planting_season = models.CharField(max_length=50)
+    region = models.CharField(max_length=10, blank=True, db_index=True, help_text="Region code of the location")
+    recommendation_count = models.IntegerField(default=0)
+    success_count = models.IntegerField(default=0)
+    temperature_sum = models.FloatField(default=0)
+    temperature_min = models.FloatField(null=True)
+    temperature_max = models.FloatField(null=True)
+    # Rows per PaddyRecommendation.get_temperature_category()
+    cold_count = models.IntegerField(default=0)
+    optimal_count = models.IntegerField(default=0)
+    warm_count = models.IntegerField(default=0)
+    hot_count = models.IntegerField(default=0)
+    
+    class Meta:
+        verbose_name_plural = "Recommendation Daily Stats"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'location', 'soil_type', 'planting_season'],
+                                    name='unique_recommendation_daily_stats'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} {self.location} {self.soil_type}/{self.planting_season}: {self.recommendation_count}"
+
+class RecommendationFieldStats(models.Model):
+    """Recommendations per field name, kept in step by main.rollup; one row per field in use"""
+    field_name = models.CharField(max_length=100, unique=True)
+    recommendation_count = models.IntegerField(default=0)
+    
+    class Meta:
+        verbose_name_plural = "Recommendation Field Stats"
+    
+    def __str__(self):
+        return f"{self.field_name}: {self.recommendation_count}"
@@ -0,0 +1,226 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.db import connections
+
+# Worker processes import this module before Django is set up (spawn/forkserver
+# start methods), so models and rule code are imported inside the functions.
+
+PORTFOLIO_WORKERS = getattr(settings, 'PORTFOLIO_WORKERS', None)
+PORTFOLIO_CHUNK = getattr(settings, 'PORTFOLIO_CHUNK', 500)
+PORTFOLIO_FIELD_TYPES = getattr(settings, 'PORTFOLIO_FIELD_TYPES', ['paddy'])
+
+# PaddyRecommendation soil choices, checked in order against the farm's free-text soil type
+SOIL_TYPES = ['clay', 'sandy', 'loamy', 'silt']
+
+
+def portfolio_fields():
+    """Registered fields that get a seasonal recommendation"""
+    from .models import Field
+
+    return Field.objects.filter(field_type__in=PORTFOLIO_FIELD_TYPES)
+
+
+def partition_farms(chunk_size=PORTFOLIO_CHUNK):
+    """Group farm ids into partitions of about chunk_size fields
+
+    Farms are never split, so a farm larger than chunk_size forms its own partition.
+    Returns a list of (farm ids, field count).
+    """
+    from django.db.models import Count
+
+    counts = (
+        portfolio_fields().values('farm_id').annotate(fields=Count('id')).order_by('farm_id')
+        .values_list('farm_id', 'fields')
+    )
+    partitions = []
+    farm_ids, size = [], 0
+    for farm_id, fields in counts:
+        if farm_ids and size + fields > chunk_size:
+            partitions.append((farm_ids, size))
+            farm_ids, size = [], 0
+        farm_ids.append(farm_id)
+        size += fields
+    if farm_ids:
+        partitions.append((farm_ids, size))
+    return partitions
+
+
+def farm_soil_type(soil_type):
+    """Map a farm's free-text soil type, e.g. "Clay loam", onto a recommendation soil choice"""
+    lowered = (soil_type or '').lower()
+    for choice in SOIL_TYPES:
+        if choice in lowered:
+            return choice
+    return 'other'
+
+
+def init_worker():
+    """Process pool initializer: set Django up and start without any inherited connection"""
+    django.setup()
+    connections.close_all()
+
+
+def evaluate_partition(farm_ids, season, month):
+    """Evaluate every portfolio field of the given farms (runs in a worker process)
+
+    The soil temperature is the field's latest sensor reading; fields without one
+    are skipped. Distinct payloads are returned once, each record points at its
+    payload by index so little data crosses the process boundary.
+    """
+    from django.db.models import OuterRef, Subquery
+
+    from .batch import group_rows
+    from .models import PaddyRecommendation, SensorData
+    from .regions import resolve_region
+    from .rules import compiled_recommendation, get_rule_set
+
+    started = time.perf_counter()
+    latest_temperature = (
+        SensorData.objects.filter(field=OuterRef('pk'), temperature__isnull=False)
+        .order_by('-timestamp').values('temperature')[:1]
+    )
+    fields = (
+        portfolio_fields().filter(farm_id__in=farm_ids)
+        .annotate(soil_temperature=Subquery(latest_temperature))
+        .values_list('name', 'farm__location', 'farm__soil_type', 'soil_temperature')
+    )
+    rows = []
+    skipped = 0
+    for name, location, soil_type, soil_temperature in fields:
+        if soil_temperature is None:
+            skipped += 1
+            continue
+        rows.append({
+            'location': location,
+            'field_name': name,
+            'soil_temperature': float(soil_temperature),
+            'soil_type': farm_soil_type(soil_type),
+            'season': season,
+        })
+
+    # Farm locations may be longer than the recommendation column; the full
+    # text is still used for rule and region matching
+    location_length = PaddyRecommendation._meta.get_field('location').max_length
+    rule_set = get_rule_set()
+    payloads = []
+    records = [None] * len(rows)
+    for key, indexes in group_rows(rule_set, rows, month).items():
+        compiled = compiled_recommendation(rule_set, key)
+        payloads.append(compiled)
+        for index in indexes:
+            row = rows[index]
+            records[index] = (
+                len(payloads) - 1,
+                row['location'][:location_length],
+                resolve_region(row['location']),
+                row['field_name'],
+                row['soil_temperature'],
+                row['soil_type'],
+                rule_set.fill_explanation(compiled, row['soil_temperature']),
+            )
+
+    return {
+        'rule_version': rule_set.revision,
+        'payloads': payloads,
+        'records': records,
+        'skipped': skipped,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def save_partition(result, season):
+    """Insert one worker result; returns the number of rows written"""
+    from django.utils import timezone
+
+    from .batch import save_recommendations
+    from .models import PaddyRecommendation, RecommendationPayload
+
+    payloads = RecommendationPayload.objects.intern_many(result['payloads'])
+    now = timezone.now()
+    objects = [
+        PaddyRecommendation(
+            payload=payloads[payload_index],
+            location=location,
+            region=region,
+            field_name=field_name,
+            soil_temperature=soil_temperature,
+            soil_type=soil_type,
+            planting_season=season,
+            explanation=explanation,
+            rule_version=result['rule_version'],
+            timestamp=now,
+            success=True,
+        )
+        for payload_index, location, region, field_name, soil_temperature, soil_type, explanation in result['records']
+    ]
+    save_recommendations(objects)
+    return len(objects)
+
+
+def run_portfolio(season='current', month=None, workers=None, chunk_size=PORTFOLIO_CHUNK, progress=None):
+    """Generate a recommendation for every portfolio field using a pool of worker processes
+
+    Farms are partitioned across the workers, each of which reads and evaluates
+    its partition over its own database connection. Results are inserted here as
+    they arrive. A failing partition is reported in 'failed' with its farm ids
+    and the run carries on. progress is called after each partition with a dict
+    of counters.
+    """
+    workers = workers or PORTFOLIO_WORKERS or os.cpu_count() or 1
+    month = month or datetime.now().month
+    partitions = partition_farms(chunk_size)
+    total = sum(size for farm_ids, size in partitions)
+    written = skipped = 0
+    failed = []
+    busy = 0.0
+    started = time.perf_counter()
+
+    # Forked workers must not share the parent's open database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        futures = {
+            executor.submit(evaluate_partition, farm_ids, season, month): (farm_ids, size)
+            for farm_ids, size in partitions
+        }
+        done = 0
+        for future in as_completed(futures):
+            farm_ids, size = futures[future]
+            done += size
+            try:
+                result = future.result()
+                written += save_partition(result, season)
+            except Exception as e:
+                print(f"Portfolio partition of {len(farm_ids)} farm(s) failed: {e}")
+                failed.append({'farm_ids': farm_ids, 'fields': size, 'error': str(e)})
+            else:
+                skipped += result['skipped']
+                busy += result['seconds']
+            if progress:
+                elapsed = time.perf_counter() - started
+                progress({
+                    'fields': done,
+                    'total': total,
+                    'written': written,
+                    'skipped': skipped,
+                    'failed': sum(partition['fields'] for partition in failed),
+                    'rows_per_second': round(written / elapsed, 1) if elapsed else None,
+                })
+
+    elapsed = time.perf_counter() - started
+    return {
+        'workers': workers,
+        'partitions': len(partitions),
+        'fields': total,
+        'written': written,
+        'skipped': skipped,
+        'failed': failed,
+        'seconds': round(elapsed, 2),
+        'rows_per_second': round(written / elapsed, 1) if elapsed else None,
+        # Worker throughput while busy, i.e. what one core sustains
+        'rows_per_second_per_core': round(written / busy, 1) if busy else None,
+    }
@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, close_old_connections, connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import WeatherHistory, WeatherHotspot
+
+# Start the in-process refresher from the first request that records a hit.
+# With a shared cache backend the prefetch_weather command can run instead.
+WEATHER_PREFETCH_ENABLED = getattr(settings, 'WEATHER_PREFETCH_ENABLED', False)
+WEATHER_PREFETCH_INTERVAL = getattr(settings, 'WEATHER_PREFETCH_INTERVAL', 60)
+WEATHER_PREFETCH_TOP = getattr(settings, 'WEATHER_PREFETCH_TOP', 50)
+WEATHER_PREFETCH_MAX_PER_MINUTE = getattr(settings, 'WEATHER_PREFETCH_MAX_PER_MINUTE', 30)
+WEATHER_PREFETCH_WINDOW = getattr(settings, 'WEATHER_PREFETCH_WINDOW', 60 * 60 * 24)
+WEATHER_PREFETCH_MARGIN = getattr(settings, 'WEATHER_PREFETCH_MARGIN', 60)
+WEATHER_HOTSPOT_FLUSH_INTERVAL = getattr(settings, 'WEATHER_HOTSPOT_FLUSH_INTERVAL', 30)
+
+_hits = Counter()
+_names = {}
+_hits_lock = threading.Lock()
+_last_flush = time.monotonic()
+_worker = None
+
+
+def record_hits(cells, name=''):
+    """Count requests for weather grid cells; counts are written in batches"""
+    global _last_flush
+    with _hits_lock:
+        for cell in cells:
+            _hits[cell] += 1
+            if name:
+                _names[cell] = name[:200]
+        due = time.monotonic() - _last_flush >= WEATHER_HOTSPOT_FLUSH_INTERVAL
+        if due:
+            _last_flush = time.monotonic()
+
+    if due:
+        # Written from a background thread so the request does not wait on the database
+        threading.Thread(target=_background_flush, name='weather-hotspot-flush', daemon=True).start()
+    if WEATHER_PREFETCH_ENABLED:
+        start_worker()
+
+
+def flush_hits():
+    """Write buffered hit counts to the WeatherHotspot table"""
+    with _hits_lock:
+        hits = dict(_hits)
+        names = dict(_names)
+        _hits.clear()
+        _names.clear()
+
+    now = timezone.now()
+    for (lat, lon), count in hits.items():
+        values = {'hits': F('hits') + count, 'last_requested': now}
+        if (lat, lon) in names:
+            values['name'] = names[(lat, lon)]
+        if WeatherHotspot.objects.filter(latitude=lat, longitude=lon).update(**values):
+            continue
+        try:
+            WeatherHotspot.objects.create(latitude=lat, longitude=lon, name=names.get((lat, lon), ''),
+                                          hits=count, last_requested=now)
+        except IntegrityError:
+            WeatherHotspot.objects.filter(latitude=lat, longitude=lon).update(**values)
+
+
+def _background_flush():
+    try:
+        flush_hits()
+    except Exception as e:
+        print(f"Weather hotspot flush failed: {e}")
+    finally:
+        connections.close_all()
+
+
+def due_hotspots(limit=None):
+    """Most requested recent cells whose cached weather is about to expire
+
+    Cells that user requests refreshed recently are skipped as well, using the
+    fetch time stored next to each cached forecast.
+    """
+    from .weather_service import WEATHER_CACHE_TTL, fetched_cache_key
+
+    now = timezone.now()
+    fresh_for = max(WEATHER_CACHE_TTL - WEATHER_PREFETCH_MARGIN, 0)
+    refresh_before = now - timedelta(seconds=fresh_for)
+    hot = WeatherHotspot.objects.filter(
+        last_requested__gte=now - timedelta(seconds=WEATHER_PREFETCH_WINDOW)
+    ).order_by('-hits')[:limit or WEATHER_PREFETCH_TOP]
+    due = [spot for spot in hot if spot.last_refreshed is None or spot.last_refreshed <= refresh_before]
+    keys = {spot.pk: fetched_cache_key((spot.latitude, spot.longitude)) for spot in due}
+    fetched = cache.get_many(keys.values())
+    return [spot for spot in due if fetched.get(keys[spot.pk], 0) <= time.time() - fresh_for]
+
+
+def refresh_hotspot(spot):
+    """Refresh one hotspot's cached weather and record the observation"""
+    from .weather_service import parse_current_weather, refresh_cell
+
+    weather_data = refresh_cell((spot.latitude, spot.longitude))
+    current_weather = parse_current_weather(weather_data)
+    if current_weather:
+        WeatherHistory.objects.create(
+            location=spot.name or f"{spot.latitude}, {spot.longitude}",
+            latitude=spot.latitude,
+            longitude=spot.longitude,
+            temperature=current_weather['temperature'],
+            humidity=current_weather['humidity'],
+            rainfall=current_weather['rainfall'],
+            wind_speed=current_weather['wind_speed'],
+            condition=current_weather['condition'],
+        )
+    spot.last_refreshed = timezone.now()
+    spot.save(update_fields=['last_refreshed'])
+
+
+def run_prefetch_cycle(limit=None, max_per_minute=None):
+    """Refresh every due hotspot, pacing upstream calls; returns the number refreshed"""
+    pause = 60.0 / (max_per_minute or WEATHER_PREFETCH_MAX_PER_MINUTE)
+    refreshed = 0
+    for spot in due_hotspots(limit):
+        if refreshed:
+            time.sleep(pause)
+        try:
+            refresh_hotspot(spot)
+            refreshed += 1
+        except Exception as e:
+            print(f"Weather prefetch failed for {spot}: {e}")
+    return refreshed
+
+
+def start_worker():
+    """Start the in-process prefetch thread once per process"""
+    global _worker
+    with _hits_lock:
+        if _worker is not None:
+            return
+        _worker = threading.Thread(target=_worker_loop, name='weather-prefetch', daemon=True)
+    _worker.start()
+
+
+def _worker_loop():
+    """Background loop: flush hit counts, then refresh due hotspots"""
+    while True:
+        time.sleep(WEATHER_PREFETCH_INTERVAL)
+        close_old_connections()
+        try:
+            flush_hits()
+            run_prefetch_cycle()
+        except Exception as e:
+            print(f"Weather prefetch cycle failed: {e}")
@@ -0,0 +1,107 @@
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+# Requests per second and burst size for rate limited upstream hosts
+UPSTREAM_RATE_LIMITS = getattr(settings, 'UPSTREAM_RATE_LIMITS', {})
+# 'local' keeps buckets in process memory; 'cache' shares them through the
+# Django cache so every worker respects one budget per host
+UPSTREAM_RATE_LIMIT_BACKEND = getattr(settings, 'UPSTREAM_RATE_LIMIT_BACKEND', 'local')
+UPSTREAM_RATE_LIMIT_MAX_WAIT = getattr(settings, 'UPSTREAM_RATE_LIMIT_MAX_WAIT', 10)
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+class QueueTimeout(requests.Timeout):
+    """Raised when a request would wait in the rate limit queue for too long"""
+
+
+class LocalTokenBucket:
+    """In-process token bucket; callers reserve tokens in arrival order"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, max_wait):
+        """Take a token, returning how long the caller must wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            if wait > max_wait:
+                raise QueueTimeout(f"Rate limit queue wait of {wait:.1f}s exceeds {max_wait}s")
+            self.tokens -= 1
+            return wait
+
+
+class SharedTokenBucket:
+    """Token bucket shared between workers through atomic cache increments
+
+    Time is split into windows of burst / rate seconds, each holding burst
+    tokens. A caller claims the first window with a free token and waits for
+    it to open, so queued requests are spread evenly over future windows.
+    """
+
+    def __init__(self, host, rate, burst):
+        self.host = host
+        self.burst = burst
+        self.window = burst / rate
+
+    def reserve(self, max_wait):
+        """Claim a token in the earliest window with capacity, returning the wait"""
+        now = time.time()
+        first = int(now // self.window)
+        last = int((now + max_wait) // self.window)
+        for slot in range(first, last + 1):
+            key = f"ratelimit:{self.host}:{slot}"
+            cache.add(key, 0, timeout=int(max_wait + self.window) + 1)
+            if cache.incr(key) <= self.burst:
+                return max(0.0, slot * self.window - now)
+        raise QueueTimeout(f"Rate limit queue for {self.host} is longer than {max_wait}s")
+
+
+def get_bucket(host):
+    """Return the bucket for a host, or None when the host is not rate limited"""
+    limit = UPSTREAM_RATE_LIMITS.get(host)
+    if limit is None:
+        return None
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            rate, burst = limit
+            if UPSTREAM_RATE_LIMIT_BACKEND == 'cache':
+                bucket = SharedTokenBucket(host, rate, burst)
+            else:
+                bucket = LocalTokenBucket(rate, burst)
+            _buckets[host] = bucket
+    return bucket
+
+
+def acquire(host, max_wait=None):
+    """Block until a request to host is allowed; returns seconds spent queued"""
+    bucket = get_bucket(host)
+    if bucket is None:
+        return 0.0
+    max_wait = UPSTREAM_RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+    try:
+        wait = bucket.reserve(max_wait)
+    except QueueTimeout:
+        raise
+    except Exception as e:
+        # Shared backend unavailable: fall back to a per-process bucket
+        print(f"Shared rate limiter failed for {host}, using local bucket: {e}")
+        with _buckets_lock:
+            bucket = _buckets[host] = LocalTokenBucket(*UPSTREAM_RATE_LIMITS[host])
+        wait = bucket.reserve(max_wait)
+    if wait:
+        time.sleep(wait)
+    return wait
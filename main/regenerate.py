@@ -0,0 +1,101 @@
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .dataversion import bump_data_version
+from .models import PaddyRecommendation, RecommendationPayload
+from .rules import compiled_recommendation, get_rule_set
+
+REGENERATE_CHUNK = getattr(settings, 'REGENERATE_CHUNK', 500)
+REGENERATE_PAUSE = getattr(settings, 'REGENERATE_PAUSE', 0.5)
+
+# Columns needed to rebuild a row's rule key and compare its output
+INPUT_FIELDS = ['id', 'location', 'soil_temperature', 'soil_type', 'planting_season', 'timestamp',
+                'payload', 'explanation']
+
+
+def outdated_recommendations(revision):
+    """Rows generated by any rule set other than revision (version plus content digest)"""
+    return PaddyRecommendation.objects.exclude(rule_version=revision)
+
+
+def regenerate_chunk(rule_set, after_id=0, chunk_size=REGENERATE_CHUNK):
+    """Re-evaluate the next chunk of outdated rows after after_id
+
+    Rows are visited in id order. A row is only rewritten when its payload or
+    explanation changed; unchanged rows just get the new rule version. Returns
+    (last id seen, rows scanned, rows rewritten), with last id None at the end.
+    """
+    rows = list(
+        outdated_recommendations(rule_set.revision).filter(id__gt=after_id)
+        .order_by('id').only(*INPUT_FIELDS)[:chunk_size]
+    )
+    if not rows:
+        return None, 0, 0
+
+    # The month is part of the rule key, so use the month each row was submitted in
+    keys = [
+        rule_set.rule_key(rec.soil_temperature, rec.soil_type, rec.planting_season, rec.location,
+                          timezone.localtime(rec.timestamp).month)
+        for rec in rows
+    ]
+    compiled = {key: compiled_recommendation(rule_set, key) for key in keys}
+    payloads = dict(zip(compiled, RecommendationPayload.objects.intern_many(list(compiled.values()))))
+
+    changed = []
+    unchanged_ids = []
+    for rec, key in zip(rows, keys):
+        payload = payloads[key]
+        explanation = rule_set.fill_explanation(compiled[key], rec.soil_temperature)
+        if rec.payload_id == payload.id and rec.explanation == explanation:
+            unchanged_ids.append(rec.id)
+            continue
+        rec.payload = payload
+        rec.explanation = explanation
+        rec.rule_version = rule_set.revision
+        changed.append(rec)
+
+    if changed:
+        PaddyRecommendation.objects.bulk_update(changed, ['payload', 'explanation', 'rule_version'])
+        bump_data_version()
+    if unchanged_ids:
+        PaddyRecommendation.objects.filter(id__in=unchanged_ids).update(rule_version=rule_set.revision)
+    return rows[-1].id, len(rows), len(changed)
+
+
+def regenerate_outdated(after_id=0, chunk_size=REGENERATE_CHUNK, pause=REGENERATE_PAUSE, limit=None, progress=None):
+    """Bring every outdated row up to the current rule version, chunk by chunk
+
+    Finished rows carry the new version, so an interrupted run resumes where it
+    stopped. progress is called after each chunk with a dict of counters.
+    """
+    rule_set = get_rule_set()
+    total = outdated_recommendations(rule_set.revision).filter(id__gt=after_id).count()
+    if limit is not None:
+        total = min(total, limit)
+    scanned = rewritten = 0
+    started = time.monotonic()
+
+    while limit is None or scanned < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - scanned)
+        last_id, chunk_scanned, chunk_rewritten = regenerate_chunk(rule_set, after_id, size)
+        if last_id is None:
+            break
+        after_id = last_id
+        scanned += chunk_scanned
+        rewritten += chunk_rewritten
+        if progress:
+            elapsed = time.monotonic() - started
+            progress({
+                'revision': rule_set.revision,
+                'last_id': last_id,
+                'scanned': scanned,
+                'rewritten': rewritten,
+                'total': total,
+                'rows_per_second': round(scanned / elapsed, 1) if elapsed else None,
+            })
+        if pause:
+            time.sleep(pause)
+
+    return {'revision': rule_set.revision, 'last_id': after_id, 'scanned': scanned, 'rewritten': rewritten}
@@ -0,0 +1,104 @@
+import csv
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+
+from .gazetteer import fold_name
+
+REGIONS_PATH = getattr(settings, 'REGIONS_PATH', Path(__file__).resolve().parent / 'data' / 'regions.tsv')
+REGION_CACHE_SIZE = getattr(settings, 'REGION_CACHE_SIZE', 10000)
+
+# More specific regions win when a location names several
+KIND_RANK = {'district': 0, 'state': 1, 'province': 1, 'country': 2}
+
+# Street words dropped by the "cleaned" geocoding fallback
+STREET_TERMS = re.compile(r'\b(?:street|road|lane|avenue)\b', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def compile_patterns(patterns, whole_words=False):
+    """One regex matching any of the patterns, longest first so the most specific name wins"""
+    alternatives = '|'.join(re.escape(pattern) for pattern in sorted(set(patterns), key=len, reverse=True))
+    if whole_words:
+        alternatives = rf'\b(?:{alternatives})\b'
+    return re.compile(alternatives)
+
+
+def strip_street_terms(location):
+    """Remove common street words, e.g. "Temple Road, Jaffna" -> "Temple, Jaffna" """
+    return _SPACES.sub(' ', STREET_TERMS.sub('', location)).replace(' ,', ',').strip()
+
+
+class RegionMatcher:
+    """Finds the region named in free-text locations with a single compiled regex
+
+    Names and aliases are folded like gazetteer names, so romanization variants
+    match. Sri Lankan locations resolve to ISO 3166-2 district or province codes;
+    Indian ones resolve to state codes.
+    """
+
+    def __init__(self, regions):
+        self.regions = {region['code']: region for region in regions}
+        self.codes_by_name = {}
+        for region in regions:
+            for name in [region['name']] + region['aliases']:
+                key = fold_name(name)
+                if key:
+                    self.codes_by_name.setdefault(key, region['code'])
+        self.pattern = compile_patterns(self.codes_by_name, whole_words=True)
+
+    def resolve(self, location):
+        """Most specific region code named in the location, or '' when none is"""
+        best = None
+        for match in self.pattern.finditer(fold_name(location)):
+            code = self.codes_by_name[match.group(0)]
+            rank = KIND_RANK.get(self.regions[code]['kind'], 9)
+            if best is None or rank < best[0]:
+                best = (rank, code)
+        return best[1] if best else ''
+
+    def name(self, code):
+        region = self.regions.get(code)
+        return region['name'] if region else ''
+
+
+def load_regions(path=None):
+    """Read the region table"""
+    regions = []
+    with open(path or REGIONS_PATH, encoding='utf-8', newline='') as handle:
+        for row in csv.DictReader(handle, delimiter='\t'):
+            regions.append({
+                'code': row['code'],
+                'name': row['name'],
+                'kind': row['kind'],
+                'parent': row['parent'],
+                'aliases': [alias for alias in row['aliases'].split('|') if alias],
+            })
+    return regions
+
+
+def get_matcher():
+    """Return the shared region matcher, compiling it on first use"""
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                _matcher = RegionMatcher(load_regions())
+    return _matcher
+
+
+@lru_cache(maxsize=REGION_CACHE_SIZE)
+def resolve_region(location):
+    """Region code for a location string, cached per distinct string"""
+    return get_matcher().resolve(location)
+
+
+def region_name(code):
+    """Display name of a region code, e.g. "LK-41" -> "Jaffna" """
+    return get_matcher().name(code)
@@ -0,0 +1,218 @@
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, FloatField, Max, Min, Q, Sum, Value
+from django.db.models.functions import Greatest, Least, TruncDate
+from django.utils import timezone
+
+from .dataversion import bump_data_version
+from .models import TEMPERATURE_CATEGORIES, PaddyRecommendation, RecommendationDailyStats, RecommendationFieldStats
+
+ROLLUP_REBUILD_DAYS = getattr(settings, 'ROLLUP_REBUILD_DAYS', 31)
+
+KEY_FIELDS = ['location', 'soil_type', 'planting_season']
+
+CATEGORY_FILTERS = {f'{category}_count': condition for category, condition in TEMPERATURE_CATEGORIES.items()}
+COUNTER_FIELDS = ['recommendation_count', 'success_count', 'temperature_sum'] + list(CATEGORY_FILTERS)
+
+
+def stats_key(rec):
+    """Rollup row a recommendation is counted in: (local date, location, soil type, season)"""
+    return (timezone.localdate(rec.timestamp), rec.location, rec.soil_type, rec.planting_season)
+
+
+def average_temperature():
+    """Mean soil temperature over grouped rollup rows"""
+    return Sum('temperature_sum', output_field=FloatField()) / Sum('recommendation_count', output_field=FloatField())
+
+
+def success_rate():
+    """Percentage of successful recommendations over grouped rollup rows"""
+    return Sum('success_count', output_field=FloatField()) * 100.0 / Sum('recommendation_count', output_field=FloatField())
+
+
+def summarize(records):
+    """Rollup deltas per stats key for saved recommendations"""
+    deltas = {}
+    for rec in records:
+        key = stats_key(rec)
+        delta = deltas.get(key)
+        if delta is None:
+            delta = deltas[key] = dict.fromkeys(COUNTER_FIELDS, 0)
+            delta.update(region=rec.region, temperature_min=rec.soil_temperature, temperature_max=rec.soil_temperature)
+        delta['recommendation_count'] += 1
+        delta['success_count'] += 1 if rec.success else 0
+        delta['temperature_sum'] += rec.soil_temperature
+        delta['temperature_min'] = min(delta['temperature_min'], rec.soil_temperature)
+        delta['temperature_max'] = max(delta['temperature_max'], rec.soil_temperature)
+        delta[f'{rec.get_temperature_category()}_count'] += 1
+    return deltas
+
+
+def record_inserted(records):
+    """Add newly inserted recommendations to the rollup
+
+    Counters are incremented in the database, so concurrent writers never lose
+    updates. Call it in the transaction that inserted the rows.
+    """
+    deltas = summarize(records)
+    if not deltas:
+        return
+    bump_data_version()
+    with transaction.atomic():
+        for key, delta in deltas.items():
+            _add(key, delta)
+        count_fields(Counter(rec.field_name for rec in records))
+
+
+def _add(key, delta):
+    date, location, soil_type, planting_season = key
+    rows = RecommendationDailyStats.objects.filter(
+        date=date, location=location, soil_type=soil_type, planting_season=planting_season
+    )
+    changes = {field: F(field) + delta[field] for field in COUNTER_FIELDS}
+    changes['temperature_min'] = Least('temperature_min', Value(delta['temperature_min']))
+    changes['temperature_max'] = Greatest('temperature_max', Value(delta['temperature_max']))
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            RecommendationDailyStats.objects.create(
+                date=date, location=location, soil_type=soil_type, planting_season=planting_season, **delta
+            )
+    except IntegrityError:
+        # Another writer created the row first
+        rows.update(**changes)
+
+
+def count_fields(deltas):
+    """Apply per-field recommendation count changes; fields left without recommendations are dropped"""
+    with transaction.atomic():
+        for field_name, delta in deltas.items():
+            if not delta:
+                continue
+            rows = RecommendationFieldStats.objects.filter(field_name=field_name)
+            if rows.update(recommendation_count=F('recommendation_count') + delta):
+                continue
+            try:
+                with transaction.atomic():
+                    RecommendationFieldStats.objects.create(field_name=field_name, recommendation_count=delta)
+            except IntegrityError:
+                # Another writer created the row first
+                rows.update(recommendation_count=F('recommendation_count') + delta)
+        RecommendationFieldStats.objects.filter(field_name__in=list(deltas), recommendation_count__lte=0).delete()
+
+
+def rebuild_fields(recommendations=PaddyRecommendation, stats=RecommendationFieldStats):
+    """Recount recommendations per field name from the raw table; returns the rows written"""
+    with transaction.atomic():
+        stats.objects.all().delete()
+        rows = recommendations.objects.values('field_name').annotate(total=Count('id')).order_by()
+        created = stats.objects.bulk_create(
+            [stats(field_name=row['field_name'], recommendation_count=row['total']) for row in rows.iterator()],
+            batch_size=1000,
+        )
+    bump_data_version()
+    return len(created)
+
+
+def refresh(keys):
+    """Recompute rollup rows from the raw table, e.g. after deletes or edits"""
+    bump_data_version()
+    with transaction.atomic():
+        for date, location, soil_type, planting_season in set(keys):
+            start = timezone.make_aware(datetime.combine(date, time.min))
+            recommendations = PaddyRecommendation.objects.filter(
+                timestamp__gte=start, timestamp__lt=start + timedelta(days=1),
+                location=location, soil_type=soil_type, planting_season=planting_season,
+            )
+            stats = RecommendationDailyStats.objects.filter(
+                date=date, location=location, soil_type=soil_type, planting_season=planting_season
+            )
+            rows = list(aggregate(recommendations))
+            if rows:
+                stats.update_or_create(defaults=stats_values(rows[0]), date=date, location=location,
+                                       soil_type=soil_type, planting_season=planting_season)
+            else:
+                stats.delete()
+
+
+def aggregate(recommendations):
+    """Group raw recommendations into rollup rows; works on historical models in migrations too"""
+    return (
+        recommendations
+        .annotate(date=TruncDate('timestamp'))
+        .values('date', *KEY_FIELDS)
+        .annotate(
+            total=Count('id'),
+            successes=Count('id', filter=Q(success=True)),
+            temperature_total=Sum('soil_temperature'),
+            lowest=Min('soil_temperature'),
+            highest=Max('soil_temperature'),
+            region_code=Max('region'),
+            **{f'{field}_total': Count('id', filter=condition) for field, condition in CATEGORY_FILTERS.items()},
+        )
+        .order_by()
+    )
+
+
+def stats_values(row):
+    """RecommendationDailyStats field values for one aggregate() row"""
+    values = {field: row[field] for field in ['date'] + KEY_FIELDS}
+    values.update(
+        region=row['region_code'] or '',
+        recommendation_count=row['total'],
+        success_count=row['successes'],
+        temperature_sum=row['temperature_total'],
+        temperature_min=row['lowest'],
+        temperature_max=row['highest'],
+        **{field: row[f'{field}_total'] for field in CATEGORY_FILTERS},
+    )
+    return values
+
+
+def rebuild_window(start, end, recommendations=PaddyRecommendation, stats=RecommendationDailyStats):
+    """Replace the rollup rows for local dates in [start, end); returns the rows written"""
+    start_at = timezone.make_aware(datetime.combine(start, time.min))
+    end_at = timezone.make_aware(datetime.combine(end, time.min))
+    with transaction.atomic():
+        stats.objects.filter(date__gte=start, date__lt=end).delete()
+        rows = aggregate(recommendations.objects.filter(timestamp__gte=start_at, timestamp__lt=end_at))
+        created = stats.objects.bulk_create(
+            [stats(**stats_values(row)) for row in rows.iterator()], batch_size=1000
+        )
+    return len(created)
+
+
+def rebuild(start=None, end=None, days=ROLLUP_REBUILD_DAYS, progress=None,
+            recommendations=PaddyRecommendation, stats=RecommendationDailyStats):
+    """Recompute the rollup from the raw table in windows of `days` days
+
+    Without dates the whole history is rebuilt. Each window is replaced in its
+    own transaction, so readers never see a half-built day.
+    """
+    if start is None or end is None:
+        bounds = recommendations.objects.aggregate(first=Min('timestamp'), last=Max('timestamp'))
+        if bounds['first'] is None:
+            stats.objects.filter(**({'date__gte': start} if start else {}), **({'date__lt': end} if end else {})).delete()
+            return 0
+        # Dates outside the raw history can only hold leftovers
+        if start is None:
+            start = timezone.localdate(bounds['first'])
+            stats.objects.filter(date__lt=start).delete()
+        if end is None:
+            end = timezone.localdate(bounds['last']) + timedelta(days=1)
+            stats.objects.filter(date__gte=end).delete()
+
+    written = 0
+    window_start = start
+    while window_start < end:
+        window_end = min(window_start + timedelta(days=days), end)
+        written += rebuild_window(window_start, window_end, recommendations, stats)
+        if progress:
+            progress({'start': window_start, 'end': window_end, 'rows': written})
+        window_start = window_end
+    bump_data_version()
+    return written
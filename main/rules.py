@@ -0,0 +1,333 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .caching import LRUCache
+from .regions import compile_patterns
+
+PADDY_RULES_PATH = getattr(settings, 'PADDY_RULES_PATH', Path(__file__).resolve().parent / 'data' / 'paddy_rules.json')
+PADDY_RULES_RELOAD_INTERVAL = getattr(settings, 'PADDY_RULES_RELOAD_INTERVAL', 5)
+PADDY_RULES_MEMO_SIZE = getattr(settings, 'PADDY_RULES_MEMO_SIZE', 2048)
+
+MONTHS = range(1, 13)
+DEFAULT_SOIL = 'default'
+
+# Order of the keys in a recommendation, as stored on PaddyRecommendation
+RESULT_FIELDS = [
+    'primary_varieties', 'secondary_varieties', 'planting_timing', 'soil_preparation',
+    'water_management', 'fertilizer_tips', 'risk_factors', 'optimal_conditions',
+    'explanation', 'current_time_recommendations', 'seasonal_varieties', 'immediate_actions',
+]
+
+
+def _band_edges(bands):
+    """Edges of an ascending band table as (value, open) pairs
+
+    A band ending at an exclusive "max" hands over at a closed edge (t >= max),
+    an inclusive "max" at an open edge (t > max). Only the last band may be open ended.
+    """
+    edges = []
+    for band in bands[:-1]:
+        if 'max' not in band:
+            raise ValueError('Only the last temperature band may omit "max"')
+        edges.append((float(band['max']), bool(band.get('inclusive', False))))
+    if 'max' in bands[-1]:
+        raise ValueError('The last temperature band must be open ended')
+    if edges != sorted(edges) or len(set(edges)) != len(edges):
+        raise ValueError('Temperature bands must be in ascending order')
+    return edges
+
+
+def _month_table(rows, name):
+    """Map every month to its band table, rejecting gaps and overlaps"""
+    table = {}
+    for row in rows:
+        for month in row['months']:
+            if month in table or month not in MONTHS:
+                raise ValueError(f'{name}: month {month} is duplicated or invalid')
+            table[month] = row['bands']
+    if set(table) != set(MONTHS):
+        raise ValueError(f'{name}: every month must be covered')
+    return table
+
+
+class RuleSet:
+    """Decision tables compiled into per-band, per-month lookup tables
+
+    Every edge used by any temperature table is merged into one sorted list, so a
+    temperature maps to a single band index with two bisects and every table
+    lookup after that is a plain index or dictionary access.
+    """
+
+    def __init__(self, rules):
+        self.version = str(rules['version'])
+        # Version plus a digest of the tables, so edits without a version bump
+        # still count as a different rule set
+        digest = hashlib.sha256(json.dumps(rules, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+        self.revision = f"{self.version}+{digest[:8]}"
+        temperature = rules['temperature_bands']
+        suitability = rules['suitability']
+        month_tables = {
+            'current_time_recommendations': _month_table(rules['current_time_recommendations'], 'current_time_recommendations'),
+            'seasonal_varieties': _month_table(rules['seasonal_varieties'], 'seasonal_varieties'),
+        }
+
+        tables = [temperature, suitability] + [bands for table in month_tables.values() for bands in table.values()]
+        edges = sorted({edge for bands in tables for edge in _band_edges(bands)})
+        self.closed_edges = [value for value, is_open in edges if not is_open]
+        self.open_edges = [value for value, is_open in edges if is_open]
+
+        def project(bands):
+            """Band of each merged band index within one table"""
+            own = set(_band_edges(bands))
+            return [bands[sum(1 for edge in edges[:index] if edge in own)] for index in range(len(edges) + 1)]
+
+        self.band_count = len(edges) + 1
+        self.temperature = [self._freeze(band) for band in project(temperature)]
+        self.band_names = [band['name'] for band in self.temperature]
+        self.suitability = [band['value'] for band in project(suitability)]
+        self.by_month = {}
+        for field, table in month_tables.items():
+            projected = {month: project(bands) for month, bands in table.items()}
+            self.by_month[field] = [
+                {month: self._freeze_value(bands[index]['value']) for month, bands in projected.items()}
+                for index in range(self.band_count)
+            ]
+
+        self.soils = {name: self._freeze(soil) for name, soil in rules['soil_types'].items()}
+        if DEFAULT_SOIL not in self.soils:
+            raise ValueError('soil_types needs a "default" entry')
+
+        self.seasons = {}
+        self.season_rules = []
+        for season in rules['seasons']:
+            self.seasons[season['name']] = self._freeze(season)
+            self.season_rules.append((season['name'], set(season.get('equals', [])), tuple(season.get('contains', []))))
+
+        self.regions = {}
+        self.region_rules = []
+        for region in rules['regions']:
+            base = self._freeze(region)
+            districts = []
+            self.regions[region['name']] = dict(base, primary_varieties=())
+            for district in region.get('districts', []):
+                key = f"{region['name']}/{district['name']}"
+                self.regions[key] = dict(base, primary_varieties=tuple(district.get('primary_varieties', [])))
+                districts.append((key, compile_patterns(district['contains'])))
+            self.region_rules.append((region['name'], compile_patterns(region['contains']), districts))
+
+        summary = rules['summary']
+        self.risks_template = summary['risks']
+        self.varieties_template = summary['varieties']
+        self.top_varieties = int(summary['top_varieties'])
+
+        # Form values and locations repeat heavily, so classify each string once
+        self.season_kind = lru_cache(maxsize=256)(self._match_season)
+        self.region_of = lru_cache(maxsize=4096)(self._match_region)
+
+    @staticmethod
+    def _freeze_value(value):
+        """Store list values as tuples so compiled tables cannot be mutated by callers"""
+        return tuple(value) if isinstance(value, list) else value
+
+    @classmethod
+    def _freeze(cls, entry):
+        return {key: cls._freeze_value(value) for key, value in entry.items()}
+
+    def _match_season(self, season):
+        lowered = season.lower()
+        for name, equals, contains in self.season_rules:
+            if season in equals or any(word in lowered for word in contains):
+                return name
+        return ''
+
+    def _match_region(self, location):
+        lowered = location.lower()
+        for name, pattern, districts in self.region_rules:
+            if pattern.search(lowered):
+                for key, district_pattern in districts:
+                    if district_pattern.search(lowered):
+                        return key
+                return name
+        return ''
+
+    def band_of(self, soil_temp):
+        """Index of the merged temperature band containing soil_temp"""
+        if soil_temp != soil_temp:
+            # NaN fails every comparison, which the if/elif tables treated as the last band
+            return self.band_count - 1
+        return bisect_right(self.closed_edges, soil_temp) + bisect_left(self.open_edges, soil_temp)
+
+    def band_array(self, temperatures):
+        """Vectorized band_of for many temperatures at once"""
+        temperatures = np.asarray(temperatures, dtype=float)
+        bands = np.digitize(temperatures, self.closed_edges) + np.digitize(temperatures, self.open_edges, right=True)
+        bands[np.isnan(temperatures)] = self.band_count - 1
+        return bands
+
+    def soil_key(self, soil_type):
+        """Soil table entry used for a soil type"""
+        return soil_type if soil_type in self.soils and soil_type != DEFAULT_SOIL else DEFAULT_SOIL
+
+    def rule_key(self, soil_temp, soil_type, season, location, month=None):
+        """Quantize the inputs to the tuple that fully determines the rule output"""
+        return (
+            self.band_of(soil_temp),
+            self.soil_key(soil_type),
+            self.season_kind(season),
+            self.region_of(location),
+            month or datetime.now().month,
+        )
+
+    def build(self, key):
+        """Assemble the recommendation for a rule key; the explanation keeps its {soil_temp} placeholder"""
+        band, soil_name, season_name, region_name, month = key
+        temp = self.temperature[band]
+        soil = self.soils[soil_name]
+        season = self.seasons.get(season_name)
+        region = self.regions.get(region_name)
+
+        primary = temp['primary_varieties'] + (region['primary_varieties'] if region else ())
+        planting_timing = temp['planting_timing']
+        water_management = temp['water_management']
+        immediate_actions = temp['immediate_actions'] + soil['immediate_actions']
+        if season:
+            planting_timing += season['planting_timing']
+            water_management += season['water_management']
+            immediate_actions += season['immediate_actions']
+
+        optimal_conditions = dict(temp['optimal_conditions'])
+        explanation = ''
+        seasonal_varieties = ()
+        if region:
+            optimal_conditions.update(region['optimal_conditions'])
+            explanation = region['explanation'].replace('{suitability}', self.suitability[band])
+            if region.get('seasonal_varieties'):
+                seasonal_varieties = self.by_month['seasonal_varieties'][band][month]
+        if temp['risk_factors']:
+            explanation += self.risks_template.format(risks=', '.join(temp['risk_factors']))
+        explanation += self.varieties_template.format(varieties=', '.join(primary[:self.top_varieties]))
+
+        return {
+            'primary_varieties': primary,
+            'secondary_varieties': temp['secondary_varieties'],
+            'planting_timing': planting_timing,
+            'soil_preparation': soil['soil_preparation'],
+            'water_management': water_management,
+            'fertilizer_tips': soil['fertilizer_tips'],
+            'risk_factors': temp['risk_factors'],
+            'optimal_conditions': optimal_conditions,
+            'explanation': explanation,
+            'current_time_recommendations': self.by_month['current_time_recommendations'][band][month],
+            'seasonal_varieties': seasonal_varieties,
+            'immediate_actions': immediate_actions,
+        }
+
+    @staticmethod
+    def finalize(compiled, soil_temp):
+        """Copy a compiled recommendation and fill in the temperature specific text"""
+        result = {}
+        for field in RESULT_FIELDS:
+            value = compiled[field]
+            if isinstance(value, tuple):
+                value = list(value)
+            elif isinstance(value, dict):
+                value = dict(value)
+            result[field] = value
+        result['explanation'] = RuleSet.fill_explanation(compiled, soil_temp)
+        return result
+
+    @staticmethod
+    def fill_explanation(compiled, soil_temp):
+        """The explanation of a compiled recommendation for one soil temperature"""
+        return compiled['explanation'].replace('{soil_temp}', f'{soil_temp}')
+
+    def evaluate(self, soil_temp, soil_type, season, location, month=None):
+        """Recommendations for one submission; month defaults to the current month"""
+        key = self.rule_key(soil_temp, soil_type, season, location, month)
+        return self.finalize(self.build(key), soil_temp)
+
+
+def load_rule_set(path):
+    """Read and compile a rule file"""
+    with open(path, encoding='utf-8') as handle:
+        return RuleSet(json.load(handle))
+
+
+class RuleSetLoader:
+    """Keeps the compiled rule set for a file and recompiles it when the file changes
+
+    The file's modification time is checked at most once per reload interval. A
+    broken edit keeps the previous rule set in service.
+    """
+
+    def __init__(self, path, reload_interval=PADDY_RULES_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.rule_set = None
+        self._mtime = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.rule_set is not None and time.monotonic() - self._checked_at < self.reload_interval:
+            return self.rule_set
+        with self._lock:
+            if self.rule_set is None or time.monotonic() - self._checked_at >= self.reload_interval:
+                self._reload()
+        return self.rule_set
+
+    def _reload(self):
+        self._checked_at = time.monotonic()
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime:
+                return
+            rule_set = load_rule_set(self.path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            if self.rule_set is None:
+                raise
+            print(f"Keeping paddy rules version {self.rule_set.version}, reload failed: {e}")
+            return
+        if self.rule_set is not None:
+            print(f"Paddy rules reloaded: version {self.rule_set.version} -> {rule_set.version}")
+        self.rule_set = rule_set
+        self._mtime = mtime
+
+
+_loader = RuleSetLoader(PADDY_RULES_PATH)
+
+# Compiled recommendations keyed on (rule revision, band, soil, season, region, month)
+_memo = LRUCache(PADDY_RULES_MEMO_SIZE)
+
+
+def get_rule_set():
+    """The current compiled rule set, reloaded when the rule file changes"""
+    return _loader.get()
+
+
+def evaluate(soil_temp, soil_type, season, location, month=None):
+    """Evaluate the current rule set for one submission, memoized on the quantized inputs"""
+    rule_set = get_rule_set()
+    key = rule_set.rule_key(soil_temp, soil_type, season, location, month)
+    return rule_set.finalize(compiled_recommendation(rule_set, key), soil_temp)
+
+
+def compiled_recommendation(rule_set, key):
+    """Memoized RuleSet.build; callers must pass the result through RuleSet.finalize"""
+    return _memo.get_or_set((rule_set.revision,) + key, lambda: rule_set.build(key))
+
+
+def get_memo_stats():
+    """Hit, miss and eviction counters of the recommendation memo"""
+    rule_set = get_rule_set()
+    return dict(_memo.stats(), rule_version=rule_set.version, rule_revision=rule_set.revision)
@@ -0,0 +1,44 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, rollup
+from .models import PaddyRecommendation
+
+# Bulk writers (batch, write-behind, portfolio) bypass these and call
+# rollup.record_inserted and counters.record_inserted themselves.
+
+
+@receiver(pre_save, sender=PaddyRecommendation)
+def remember_previous_row(sender, instance, raw=False, **kwargs):
+    """Keep the counted values of an edited recommendation from before the save"""
+    if raw or instance._state.adding:
+        return
+    instance._previous_row = sender.objects.filter(pk=instance.pk).only(
+        'timestamp', 'soil_temperature', 'success', 'field_name', *rollup.KEY_FIELDS
+    ).first()
+
+
+@receiver(post_save, sender=PaddyRecommendation)
+def update_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return  # fixtures: run rebuild_recommendation_stats afterwards
+    if created:
+        rollup.record_inserted([instance])
+        counters.record_inserted([instance])
+        return
+    keys = [rollup.stats_key(instance)]
+    previous = getattr(instance, '_previous_row', None)
+    if previous is not None:
+        keys.append(rollup.stats_key(previous))
+        counters.record_deleted([previous])
+        if previous.field_name != instance.field_name:
+            rollup.count_fields({previous.field_name: -1, instance.field_name: 1})
+    counters.record_inserted([instance])
+    rollup.refresh(keys)
+
+
+@receiver(post_delete, sender=PaddyRecommendation)
+def update_stats_on_delete(sender, instance, **kwargs):
+    counters.record_deleted([instance])
+    rollup.count_fields({instance.field_name: -1})
+    rollup.refresh([rollup.stats_key(instance)])
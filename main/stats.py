@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Min, Sum
+
+from . import rollup
+from .caching import SingleFlight
+from .dataversion import get_data_version
+from .models import RecommendationDailyStats, RecommendationFieldStats
+
+RECOMMENDATION_STATS_TTL = getattr(settings, 'RECOMMENDATION_STATS_TTL', 300)
+
+TEMPERATURE_BANDS = ['cold', 'optimal', 'warm', 'hot']
+
+_stats_flights = SingleFlight()
+
+
+def compute_recommendation_stats():
+    """Headline recommendation numbers from the daily and per-field rollups"""
+    totals = RecommendationDailyStats.objects.aggregate(
+        total=Sum('recommendation_count'),
+        successful=Sum('success_count'),
+        locations=Count('location', distinct=True),
+        avg=rollup.average_temperature(),
+        min=Min('temperature_min'),
+        max=Max('temperature_max'),
+        **{band: Sum(f'{band}_count') for band in TEMPERATURE_BANDS},
+    )
+    return {
+        'total': totals['total'] or 0,
+        'successful': totals['successful'] or 0,
+        'locations': totals['locations'],
+        'fields': RecommendationFieldStats.objects.count(),
+        'temperature': {'avg': totals['avg'], 'min': totals['min'], 'max': totals['max']},
+        'bands': {band: totals[band] or 0 for band in TEMPERATURE_BANDS},
+    }
+
+
+def get_recommendation_stats():
+    """Shared stats for the dashboard, notifications and analytics, cached per data version"""
+    key = f"recommendations:stats:{get_data_version()}"
+    stats = cache.get(key)
+    if stats is None:
+        stats = _stats_flights.do(key, lambda: cache.get(key) or _cache_stats(key))
+    return stats
+
+
+def _cache_stats(key):
+    stats = compute_recommendation_stats()
+    cache.set(key, stats, RECOMMENDATION_STATS_TTL)
+    return stats
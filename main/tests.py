@@ -1,3 +1,1207 @@
-from django.test import TestCase
+import gzip
+import itertools
+import json
+import os
+import queue
+import shutil
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from . import batch, counters, geocoding, portfolio, prefetch, ratelimit, rollup, rules, upstream, weather_service, writebehind
+from .batch import build_recommendations, save_recommendations
+from .benchmarks import find_regressions
+from .caching import LRUCache
+from .dataversion import get_data_version
+from .gazetteer import get_gazetteer, lookup_place
+from .models import (
+    PAYLOAD_FIELDS, Farm, GeocodeCache, PaddyRecommendation, RecommendationDailyStats, RecommendationFieldStats,
+    RecommendationPayload, WeatherHotspot
+)
+from .regenerate import regenerate_outdated
+from .regions import resolve_region, strip_street_terms
+from .rules import PADDY_RULES_PATH, RuleSetLoader, load_rule_set
+from .stats import compute_recommendation_stats, get_recommendation_stats
+from .views import get_analytics_context, monthly_yield_trend
+
+
+def legacy_paddy_recommendations(soil_temp, soil_type, season, location, current_month):
+    """Frozen copy of the if/elif implementation the rule tables replaced"""
+
+    recommendations = {
+        'primary_varieties': [],
+        'secondary_varieties': [],
+        'planting_timing': '',
+        'soil_preparation': '',
+        'water_management': '',
+        'fertilizer_tips': '',
+        'risk_factors': [],
+        'optimal_conditions': {},
+        'explanation': '',
+        'current_time_recommendations': '',
+        'seasonal_varieties': [],
+        'immediate_actions': []
+    }
+
+    # Current time recommendations
+    recommendations['current_time_recommendations'] = legacy_current_time_recommendations(current_month, soil_temp)
+
+    # Temperature-based recommendations
+    if soil_temp < 20:
+        recommendations['risk_factors'].append('Soil temperature is too cold for optimal paddy growth')
+        recommendations['planting_timing'] = 'Wait for soil to warm up to 22-30°C'
+        recommendations['water_management'] = 'Use warm water for irrigation if possible'
+        recommendations['immediate_actions'].append('Delay planting until soil warms up')
+        recommendations['immediate_actions'].append('Prepare nursery beds for early varieties')
+
+        # Cold-tolerant varieties for current conditions
+        recommendations['primary_varieties'] = [
+            'IR64 (Cold-tolerant, High yielding)',
+            'Swarna (Cold-resistant, Popular)',
+            'Pusa Basmati 1 (Cold-adapted, Aromatic)',
+            'IR36 (Early maturing, Cold-hardy)'
+        ]
+        recommendations['secondary_varieties'] = [
+            'Pusa 44 (Cold-hardy, Disease resistant)',
+            'IR8 (High yield potential, Quick maturing)'
+        ]
+
+    elif 20 <= soil_temp <= 30:
+        recommendations['optimal_conditions']['temperature'] = 'Optimal temperature range for paddy'
+        recommendations['planting_timing'] = 'Ideal time for planting'
+        recommendations['water_management'] = 'Standard irrigation practices'
+        recommendations['immediate_actions'].append('Proceed with planting - conditions are perfect')
+        recommendations['immediate_actions'].append('Prepare field for direct seeding')
+
+        # Standard varieties for optimal conditions
+        recommendations['primary_varieties'] = [
+            'IR64 (High yielding, Disease resistant)',
+            'Swarna (Popular, High quality)',
+            'Pusa Basmati 1 (Aromatic, Premium quality)',
+            'IR36 (Early maturing, Quick harvest)'
+        ]
+        recommendations['secondary_varieties'] = [
+            'Pusa 44 (Disease resistant, High yield)',
+            'IR8 (High yield potential, Popular)'
+        ]
+
+    elif 30 < soil_temp <= 35:
+        recommendations['risk_factors'].append('Soil temperature is getting warm')
+        recommendations['planting_timing'] = 'Plant early morning or evening'
+        recommendations['water_management'] = 'Increase irrigation frequency to cool soil'
+        recommendations['immediate_actions'].append('Plant during cooler hours')
+        recommendations['immediate_actions'].append('Increase irrigation frequency')
+
+        # Heat-tolerant varieties
+        recommendations['primary_varieties'] = [
+            'IR64 (Heat-tolerant, High yielding)',
+            'Swarna (Adaptable, Heat-resistant)',
+            'Pusa Basmati 1 (Heat-resistant, Aromatic)',
+            'IR36 (Quick maturing, Heat-adapted)'
+        ]
+        recommendations['secondary_varieties'] = [
+            'Pusa 44 (Heat-adapted, Disease resistant)',
+            'IR8 (Quick cycle, Heat-tolerant)'
+        ]
+
+    else:  # > 35°C
+        recommendations['risk_factors'].append('Soil temperature is too hot for optimal growth')
+        recommendations['planting_timing'] = 'Avoid planting during peak heat hours'
+        recommendations['water_management'] = 'Frequent irrigation and shade management needed'
+        recommendations['immediate_actions'].append('Consider delaying planting until cooler weather')
+        recommendations['immediate_actions'].append('Use shade nets if planting is necessary')
+
+        # Heat-resistant varieties
+        recommendations['primary_varieties'] = [
+            'IR64 (Heat-resistant, High yielding)',
+            'Swarna (Stress-tolerant, Adaptable)'
+        ]
+        recommendations['secondary_varieties'] = [
+            'IR36 (Quick cycle, Heat-adapted)',
+            'Pusa 44 (Stress-adapted, Quick maturing)'
+        ]
+
+    # Soil type considerations
+    if soil_type == 'clay':
+        recommendations['soil_preparation'] = 'Clay soil holds water well but needs good drainage'
+        recommendations['fertilizer_tips'] = 'Add organic matter to improve structure'
+        recommendations['immediate_actions'].append('Improve drainage with raised beds')
+    elif soil_type == 'sandy':
+        recommendations['soil_preparation'] = 'Sandy soil needs more frequent irrigation and fertilization'
+        recommendations['fertilizer_tips'] = 'Use slow-release fertilizers and organic matter'
+        recommendations['immediate_actions'].append('Add organic matter to improve water retention')
+    elif soil_type == 'loamy':
+        recommendations['soil_preparation'] = 'Loamy soil is ideal for paddy cultivation'
+        recommendations['fertilizer_tips'] = 'Standard fertilization practices work well'
+        recommendations['immediate_actions'].append('Maintain current soil structure')
+    else:
+        recommendations['soil_preparation'] = 'Ensure proper soil preparation and drainage'
+        recommendations['fertilizer_tips'] = 'Test soil pH and add appropriate amendments'
+        recommendations['immediate_actions'].append('Test soil pH and add amendments')
+
+    # Location-based adjustments
+    if 'sri lanka' in location.lower() or 'srilanka' in location.lower():
+        recommendations['explanation'] = f'Based on Sri Lankan conditions: Soil temp {soil_temp}°C is {"optimal" if 22 <= soil_temp <= 30 else "suboptimal"} for paddy cultivation.'
+        recommendations['optimal_conditions']['region'] = 'Sri Lanka - Tropical climate suitable for paddy'
+
+        # Add Sri Lankan specific varieties based on current season
+        seasonal_varieties = legacy_seasonal_varieties(current_month, soil_temp)
+        recommendations['seasonal_varieties'] = seasonal_varieties
+
+        # Add location-specific varieties
+        if 'jaffna' in location.lower():
+            recommendations['primary_varieties'].extend(['Jaffna Local (Traditional, Local adapted)', 'Northern Red (Local variety, High quality)'])
+        elif 'colombo' in location.lower() or 'western' in location.lower():
+            recommendations['primary_varieties'].extend(['Western White (Local variety, High yield)', 'Colombo Special (Adapted, Disease resistant)'])
+        elif 'kandy' in location.lower() or 'central' in location.lower():
+            recommendations['primary_varieties'].extend(['Central Highland (Local variety, Cool climate)', 'Kandy Traditional (Adapted, Aromatic)'])
+
+    # Season considerations
+    if season == 'yala' or 'summer' in season.lower():
+        recommendations['planting_timing'] += ' - Yala season (Feb-May)'
+        recommendations['water_management'] += ' - Higher irrigation needs during dry season'
+        recommendations['immediate_actions'].append('Prepare for higher irrigation needs')
+    elif season == 'maha' or 'winter' in season.lower():
+        recommendations['planting_timing'] += ' - Maha season (Sep-Mar)'
+        recommendations['water_management'] += ' - Monitor rainfall patterns'
+        recommendations['immediate_actions'].append('Monitor rainfall and adjust irrigation')
+
+    # Final recommendations summary
+    if recommendations['risk_factors']:
+        recommendations['explanation'] += f" ⚠️ Risks: {', '.join(recommendations['risk_factors'])}"
+
+    recommendations['explanation'] += f" 🌱 Best varieties: {', '.join(recommendations['primary_varieties'][:2])}"
+
+    return recommendations
+
+
+def legacy_current_time_recommendations(month, soil_temp):
+    """Get recommendations based on current time of year"""
+    if month in [2, 3]:  # February-March
+        if soil_temp < 22:
+            return "🌱 Early Yala Season: Prepare nursery beds, wait for soil to warm up"
+    else:
+        return "🌱 Early Yala Season: Perfect time to start planting early varieties"
+
+    if month in [4, 5]:  # April-May
+        if soil_temp > 32:
+            return "🌱 Late Yala Season: High temperatures - use heat-tolerant varieties"
+        else:
+            return "🌱 Late Yala Season: Good conditions for late Yala planting"
+
+    elif month in [9, 10]:  # September-October
+        if soil_temp < 20:
+            return "🌱 Early Maha Season: Cool conditions - use cold-tolerant varieties"
+        else:
+            return "🌱 Early Maha Season: Excellent conditions for Maha season start"
+
+    elif month in [11, 12, 1]:  # November-January
+        if soil_temp < 18:
+            return "🌱 Peak Maha Season: Cold conditions - delay planting or use cold-hardy varieties"
+        else:
+            return "🌱 Peak Maha Season: Good conditions for main Maha crop"
+
+    else:  # June-August (transition)
+        return "🌱 Transition Period: Prepare fields for next season, test soil conditions"
+
+
+def legacy_seasonal_varieties(month, soil_temp):
+    """Get Sri Lankan paddy varieties best suited for current season and conditions"""
+    seasonal_varieties = []
+
+    if month in [2, 3, 4, 5]:  # Yala Season
+        if soil_temp < 22:
+            seasonal_varieties.extend([
+                'BG 300 (Early Yala, Cold-tolerant)',
+                'BG 352 (Early Yala, Quick maturing)',
+                'AT 306 (Early Yala, High yield)'
+            ])
+        else:
+            seasonal_varieties.extend([
+                'BG 300 (Early Yala, High yielding)',
+                'BG 352 (Early Yala, Disease resistant)',
+                'AT 306 (Early Yala, Popular)'
+            ])
+
+    elif month in [9, 10, 11, 12, 1]:  # Maha Season
+        if soil_temp < 20:
+            seasonal_varieties.extend([
+                'BG 94-1 (Maha, Cold-hardy)',
+                'BG 250 (Maha, Cold-tolerant)',
+                'AT 308 (Maha, Cold-resistant)'
+            ])
+    else:
+            seasonal_varieties.extend([
+                'BG 94-1 (Maha, High yielding)',
+                'BG 250 (Maha, Popular variety)',
+                'AT 308 (Maha, Disease resistant)'
+            ])
+
+    return seasonal_varieties
+
+
+class GeocodeCacheTests(TestCase):
+
+    def age_entry(self, query, seconds):
+        GeocodeCache.objects.filter(query=query).update(created_at=timezone.now() - timedelta(seconds=seconds))
+
+    def test_negative_entries_expire_after_their_own_ttl(self):
+        place = {'latitude': 9.66, 'longitude': 80.02, 'display_name': 'Jaffna', 'source': 'OpenStreetMap'}
+        geocoding.cache_location('found place', place)
+        geocoding.cache_location('missing place', None)
+        self.assertEqual(geocoding.get_cached_location('missing place'), (True, None))
+
+        for query in ['found place', 'missing place']:
+            self.age_entry(query, geocoding.GEOCODE_NEGATIVE_CACHE_TTL + 1)
+        self.assertEqual(geocoding.get_cached_location('missing place'), (False, None))
+        self.assertFalse(GeocodeCache.objects.filter(query='missing place').exists())
+        self.assertEqual(geocoding.get_cached_location('found place'), (True, place))
+
+    def test_resolve_location_uses_normalized_cache(self):
+        with mock.patch.object(geocoding, 'geocode_location', return_value=None) as geocode:
+            self.assertIsNone(geocoding.resolve_location('Unknown   Paddy Tract , Nowhere'))
+            self.assertIsNone(geocoding.resolve_location('unknown paddy tract, nowhere'))
+        geocode.assert_called_once()
+
+
+class ConcurrentGeocodingTests(SimpleTestCase):
+
+    def strategies(self, *behaviours):
+        def strategy(delay, result):
+            def run(location, cancelled=None):
+                time.sleep(delay)
+                if isinstance(result, Exception):
+                    raise result
+                return result
+            return run
+        return mock.patch.object(geocoding, 'GEOCODING_STRATEGIES', [
+            (f'Source {index}', strategy(delay, result)) for index, (delay, result) in enumerate(behaviours)
+        ])
+
+    def place(self, name):
+        return {'latitude': 7.0, 'longitude': 80.0, 'display_name': name}
+
+    def test_higher_priority_answer_wins_over_faster_one(self):
+        with self.strategies((0.2, self.place('exact')), (0, self.place('fallback'))):
+            self.assertEqual(geocoding.geocode_location('x', deadline=2)['source'], 'Source 0')
+
+    def test_falls_through_empty_answers(self):
+        with self.strategies((0, None), (0.05, self.place('second')), (0.5, self.place('third'))):
+            started = time.monotonic()
+            place = geocoding.geocode_location('x', deadline=2)
+        self.assertEqual(place['display_name'], 'second')
+        self.assertLess(time.monotonic() - started, 0.4)
+
+    def test_deadline_returns_best_answer_so_far(self):
+        with self.strategies((0.5, self.place('slow')), (0, self.place('fast'))):
+            self.assertEqual(geocoding.geocode_location('x', deadline=0.1)['display_name'], 'fast')
+
+    def test_errors_and_timeouts_are_not_reported_as_not_found(self):
+        with self.strategies((0, None), (0, requests.ConnectionError('down'))):
+            with self.assertRaises(requests.ConnectionError):
+                geocoding.geocode_location('x', deadline=1)
+        with self.strategies((0, None), (0.5, None)):
+            with self.assertRaises(requests.Timeout):
+                geocoding.geocode_location('x', deadline=0.1)
+
+
+    def test_strategies_still_running_send_nothing_after_a_winner(self):
+        finished = []
+
+        def lower_priority(location, cancelled):
+            cancelled.wait(1)
+            try:
+                return upstream.get('https://nominatim.openstreetmap.org/search?q=x', cancelled=cancelled)
+            finally:
+                finished.append(True)
+
+        strategies = [('Source 0', lambda location, cancelled: self.place('exact'))]
+        strategies += [(f'Source {index}', lower_priority) for index in range(1, 5)]
+        session = mock.Mock()
+        with mock.patch.object(geocoding, 'GEOCODING_STRATEGIES', strategies), \
+                mock.patch.object(upstream, 'get_session', return_value=session):
+            self.assertEqual(geocoding.geocode_location('x', deadline=2)['source'], 'Source 0')
+            deadline = time.monotonic() + 2
+            while len(finished) < 4 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(len(finished), 4)
+        session.get.assert_not_called()
+
+
+class WeatherGridCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        patcher = mock.patch.object(weather_service, 'record_hits')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def forecast(self, lat, lon):
+        return {'current': {'time': '2025-08-01T10:00', 'temperature_2m': 28.0}, 'latitude': lat, 'longitude': lon}
+
+    def test_nearby_points_share_a_grid_cell(self):
+        with mock.patch.object(weather_service, 'fetch_forecast', side_effect=self.forecast) as fetch:
+            first = weather_service.get_forecast(6.9271, 79.8612)
+            second = weather_service.get_forecast(6.9301, 79.8588)
+        self.assertEqual(first, second)
+        fetch.assert_called_once_with(*weather_service.snap_to_grid(6.9271, 79.8612))
+
+    def test_concurrent_misses_share_one_upstream_call(self):
+        def slow_forecast(lat, lon):
+            time.sleep(0.1)
+            return self.forecast(lat, lon)
+
+        with mock.patch.object(weather_service, 'fetch_forecast', side_effect=slow_forecast) as fetch:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(executor.map(lambda _: weather_service.get_forecast(7.2906, 80.6337), range(8)))
+        self.assertEqual(fetch.call_count, 1)
+        self.assertTrue(all(result == results[0] for result in results))
+
+
+class UpstreamRetryTests(SimpleTestCase):
+
+    def responses(self, *statuses, retry_after='0'):
+        session = mock.Mock()
+        session.get.side_effect = [
+            mock.Mock(status_code=status, headers={'Retry-After': retry_after}) for status in statuses
+        ]
+        return mock.patch.object(upstream, 'get_session', return_value=session)
+
+    def test_adapter_does_not_retry_rate_limited_responses(self):
+        self.assertNotIn(429, upstream._build_session().get_adapter('https://example.com').max_retries.status_forcelist)
+
+    def test_429_is_retried_through_the_rate_limiter(self):
+        with self.responses(429, 200), mock.patch.object(upstream.ratelimit, 'acquire', return_value=0.0) as acquire:
+            response = upstream._send('example.com', 'https://example.com/', {})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(acquire.call_count, 2)
+
+    def test_gives_up_when_retry_after_exceeds_queue_limit(self):
+        with self.responses(429, 200, retry_after='3600'), mock.patch.object(upstream.ratelimit, 'acquire', return_value=0.0):
+            self.assertEqual(upstream._send('example.com', 'https://example.com/', {}).status_code, 429)
+
+
+class WeatherBatchTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        patcher = mock.patch.object(weather_service, 'record_hits')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fetches_each_cell_once_and_keeps_input_order(self):
+        def forecasts(cells):
+            return [{'current': {'time': '2025-08-01T10:00', 'temperature_2m': lat}} for lat, lon in cells]
+
+        coordinates = [
+            {'lat': 6.9271, 'lon': 79.8612}, {'lat': 'north', 'lon': 80}, {'lat': 6.9301, 'lon': 79.8588},
+            {'lat': 9.6615, 'lon': 80.0255},
+        ]
+        with mock.patch.object(weather_service, 'fetch_forecasts', side_effect=forecasts) as fetch:
+            response = self.client.post('/api/weather-batch/', json.dumps({'coordinates': coordinates}),
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        fetch.assert_called_once()
+        self.assertEqual(len(fetch.call_args.args[0]), 2)
+        self.assertEqual(data['cells'], 2)
+        self.assertEqual(data['results'][1]['error'], 'Invalid coordinates')
+        self.assertEqual(data['results'][0]['cell'], data['results'][2]['cell'])
+        self.assertEqual(data['results'][3]['current_weather']['temperature'], data['results'][3]['cell']['lat'])
+
+    def test_out_of_range_points_are_not_sent_upstream(self):
+        def forecasts(cells):
+            return [{'current': {'time': '2025-08-01T10:00', 'temperature_2m': lat}} for lat, lon in cells]
+
+        coordinates = [{'lat': 6.9271, 'lon': 79.8612}, {'lat': 1000, 'lon': 0}, {'lat': 0, 'lon': -200}]
+        with mock.patch.object(weather_service, 'fetch_forecasts', side_effect=forecasts) as fetch:
+            response = self.client.post('/api/weather-batch/', json.dumps({'coordinates': coordinates}),
+                                        content_type='application/json')
+        self.assertEqual(fetch.call_args.args[0], [(6.95, 79.85)])
+        results = response.json()['results']
+        self.assertEqual([result.get('error') for result in results], [None, 'Invalid coordinates', 'Invalid coordinates'])
+
+    def test_rejects_missing_coordinates(self):
+        response = self.client.post('/api/weather-batch/', json.dumps({}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class WeatherPrefetchTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_hit_counts_are_flushed_off_the_request_path(self):
+        with mock.patch.object(prefetch, '_last_flush', 0), \
+                mock.patch.object(prefetch, 'flush_hits') as flush, \
+                mock.patch.object(prefetch.threading, 'Thread') as thread:
+            prefetch.record_hits([(6.95, 79.85)])
+        flush.assert_not_called()
+        thread.assert_called_once_with(target=prefetch._background_flush, name='weather-hotspot-flush', daemon=True)
+        prefetch.flush_hits()
+        self.assertEqual(WeatherHotspot.objects.get(latitude=6.95, longitude=79.85).hits, 1)
+
+    def test_skips_cells_refreshed_by_requests(self):
+        WeatherHotspot.objects.create(latitude=6.95, longitude=79.85, hits=5)
+        WeatherHotspot.objects.create(latitude=9.65, longitude=80.0, hits=3)
+        weather_service._store({(6.95, 79.85): {'current': {}}})
+        self.assertEqual([(spot.latitude, spot.longitude) for spot in prefetch.due_hotspots()], [(9.65, 80.0)])
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    def test_local_bucket_queues_then_refuses(self):
+        bucket = ratelimit.LocalTokenBucket(rate=1, burst=2)
+        self.assertEqual([bucket.reserve(5), bucket.reserve(5)], [0.0, 0.0])
+        self.assertAlmostEqual(bucket.reserve(5), 1.0, delta=0.05)
+        self.assertAlmostEqual(bucket.reserve(5), 2.0, delta=0.05)
+        with self.assertRaises(ratelimit.QueueTimeout):
+            bucket.reserve(1)
+
+    def test_shared_bucket_spreads_requests_over_windows(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        bucket = ratelimit.SharedTokenBucket('tests.example', rate=1, burst=1)
+        waits = [bucket.reserve(2) for _ in range(3)]
+        self.assertEqual(waits[0], 0.0)
+        self.assertTrue(0 < waits[1] <= 1 < waits[2] <= 2)
+        with self.assertRaises(ratelimit.QueueTimeout):
+            bucket.reserve(2)
+
+    def test_unlimited_hosts_do_not_wait(self):
+        self.assertEqual(ratelimit.acquire('not-rate-limited.example'), 0.0)
+
+
+class GazetteerTests(SimpleTestCase):
+
+    def test_folds_romanization_variants(self):
+        self.assertEqual(lookup_place('Yaalpaanam')['display_name'], 'Jaffna')
+        self.assertEqual(lookup_place('Kozhumbu')['display_name'], 'Colombo')
+        self.assertEqual(lookup_place('Jaffna Sri Lanka')['display_name'], 'Jaffna')
+
+    def test_context_parts_disambiguate_or_defer_to_geocoders(self):
+        self.assertEqual(lookup_place('Kandy, Central Province, Sri Lanka')['source'], 'Local Gazetteer')
+        self.assertIsNone(lookup_place('Kandy, India'))
+        self.assertIsNone(lookup_place('Kandy, Temple Street'))
+
+    def test_autocomplete_by_prefix(self):
+        self.assertIn('Kandy', [place['name'] for place in get_gazetteer().autocomplete('kan')])
+        self.assertEqual(get_gazetteer().autocomplete('zzz'), [])
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def failing(self):
+        raise requests.ConnectionError('down')
+
+    def test_opens_then_lets_one_probe_through(self):
+        breaker = upstream.CircuitBreaker('test', failure_threshold=2, reset_timeout=30)
+        for _ in range(2):
+            with self.assertRaises(requests.ConnectionError):
+                breaker.call(self.failing)
+        self.assertEqual(breaker.state, 'open')
+        with self.assertRaises(upstream.CircuitOpenError):
+            breaker.call(lambda: 'not called')
+        self.assertGreater(breaker.retry_after(), 0)
+
+        breaker.opened_at -= 30
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, 'half_open')
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual((breaker.state, breaker.retry_after()), ('closed', 0))
+
+    def test_failed_probe_reopens(self):
+        breaker = upstream.CircuitBreaker('test', failure_threshold=1, reset_timeout=30)
+        with self.assertRaises(requests.ConnectionError):
+            breaker.call(self.failing)
+        breaker.opened_at -= 30
+        with self.assertRaises(requests.ConnectionError):
+            breaker.call(self.failing)
+        self.assertEqual(breaker.state, 'open')
+
+    def test_weather_update_reports_outage_as_503(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        breaker = upstream.CircuitBreaker('test', failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        with mock.patch.object(weather_service, 'breaker', breaker), \
+                mock.patch('main.views.weather_breaker', breaker), \
+                mock.patch.object(weather_service, 'record_hits'):
+            response = self.client.get('/api/weather-update/', {'lat': 6.9, 'lon': 79.8})
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(0 < int(response['Retry-After']) <= 30)
+
+    def test_only_provider_faults_trip_the_weather_breaker(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        breaker = upstream.CircuitBreaker('test', failure_threshold=2, reset_timeout=30,
+                                          is_failure=weather_service.is_provider_fault)
+        replies = [mock.Mock(status_code=400)] * 3 + [mock.Mock(status_code=503)] * 2
+        with mock.patch.object(weather_service, 'breaker', breaker), \
+                mock.patch.object(weather_service.upstream, 'get', side_effect=replies):
+            for lat in [1.0, 2.0, 3.0]:
+                with self.assertRaises(weather_service.WeatherServiceError):
+                    weather_service.refresh_cell((lat, 0.0))
+            self.assertEqual(breaker.state, 'closed')
+            for lat in [4.0, 5.0]:
+                with self.assertRaises(weather_service.WeatherServiceError):
+                    weather_service.refresh_cell((lat, 0.0))
+        self.assertEqual(breaker.state, 'open')
+
+    def test_weather_update_rejects_out_of_range_coordinates(self):
+        with mock.patch.object(weather_service, 'fetch_forecast') as fetch:
+            for lat, lon in [(1000, 0), (0, 180.5), ('nan', 0)]:
+                response = self.client.get('/api/weather-update/', {'lat': lat, 'lon': lon})
+                self.assertEqual(response.status_code, 400)
+        fetch.assert_not_called()
+
+
+class NotificationsETagTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        rows = [
+            {'location': 'Kandy', 'field_name': f'F{index}', 'soil_temperature': 20 + index,
+             'soil_type': 'clay', 'season': 'yala'}
+            for index in range(3)
+        ]
+        objects, groups = build_recommendations(rows)
+        with self.captureOnCommitCallbacks(execute=True):
+            save_recommendations(objects)
+
+    def revalidate(self):
+        response = self.client.get('/api/notifications/')
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        return etag
+
+    def test_edits_and_deletes_change_the_etag(self):
+        etag = self.revalidate()
+        rec = PaddyRecommendation.objects.get(field_name='F0')
+        rec.soil_temperature = 40
+        with self.captureOnCommitCallbacks(execute=True):
+            rec.save()
+        self.assertEqual(self.client.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.revalidate()
+        with self.captureOnCommitCallbacks(execute=True):
+            PaddyRecommendation.objects.filter(field_name='F1').delete()
+        response = self.client.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 2)
+
+    def test_revalidation_runs_no_queries(self):
+        with mock.patch.object(counters, 'reconcile_in_background'):
+            for url in ['/api/notifications/', '/api/dashboard-data/']:
+                response = self.client.get(url)
+                self.assertIn('Last-Modified', response)
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+                    self.assertEqual(
+                        self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304
+                    )
+
+
+class RuleEngineParityTests(SimpleTestCase):
+    """The compiled rule tables must reproduce the hand written rules exactly"""
+
+    temperatures = [
+        -5, 0, 17.9, 18, 19.99, 20, 20.5, 21.99, 22, 25, 29.99, 30, 30.01, 32, 32.5,
+        34.99, 35, 35.01, 40, 55, float('nan'),
+    ]
+    soil_types = ['clay', 'sandy', 'loamy', 'silt', 'default', '']
+    seasons = ['yala', 'maha', 'Summer', 'winter crop', 'YALA', 'kharif', '']
+    locations = [
+        'Jaffna, Sri Lanka', 'Colombo, Sri Lanka', 'Western Province, SriLanka', 'Kandy srilanka',
+        'Central, Sri Lanka', 'Galle, Sri Lanka', 'Chennai, India', 'jaffna', 'Colombo', '',
+    ]
+
+    def test_matches_legacy_rules(self):
+        rule_set = load_rule_set(PADDY_RULES_PATH)
+        for soil_temp, soil_type, season, location, month in itertools.product(
+            self.temperatures, self.soil_types, self.seasons, self.locations, range(1, 13)
+        ):
+            expected = legacy_paddy_recommendations(soil_temp, soil_type, season, location, month)
+            actual = rule_set.evaluate(soil_temp, soil_type, season, location, month)
+            if expected != actual:
+                self.fail(f'Mismatch for {(soil_temp, soil_type, season, location, month)}: {actual} != {expected}')
+
+    def test_band_array_matches_band_of(self):
+        rule_set = load_rule_set(PADDY_RULES_PATH)
+        bands = rule_set.band_array(self.temperatures).tolist()
+        self.assertEqual(bands, [rule_set.band_of(soil_temp) for soil_temp in self.temperatures])
+
+    def test_results_are_independent_copies(self):
+        rule_set = load_rule_set(PADDY_RULES_PATH)
+        first = rule_set.evaluate(25, 'clay', 'yala', 'Colombo, Sri Lanka', 3)
+        first['primary_varieties'].append('Mutated')
+        first['optimal_conditions']['extra'] = True
+        second = rule_set.evaluate(25, 'clay', 'yala', 'Colombo, Sri Lanka', 3)
+        self.assertNotIn('Mutated', second['primary_varieties'])
+        self.assertNotIn('extra', second['optimal_conditions'])
+
+
+class RecommendationMemoTests(SimpleTestCase):
+
+    def setUp(self):
+        memo = LRUCache(4)
+        patcher = mock.patch.object(rules, '_memo', memo)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.memo = memo
+
+    def test_memoized_results_fill_in_temperature(self):
+        for soil_temp in [22, 23.5, 29.9]:
+            expected = legacy_paddy_recommendations(soil_temp, 'clay', 'yala', 'Kandy, Sri Lanka', 4)
+            self.assertEqual(rules.evaluate(soil_temp, 'clay', 'yala', 'Kandy, Sri Lanka', 4), expected)
+        stats = self.memo.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+
+    def test_evicts_least_recently_used(self):
+        for month in range(1, 7):
+            rules.evaluate(25, 'clay', 'yala', '', month)
+        stats = self.memo.stats()
+        self.assertEqual((stats['entries'], stats['evictions']), (4, 2))
+
+
+class RuleSetReloadTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'rules.json')
+        shutil.copy(PADDY_RULES_PATH, self.path)
+        with open(self.path, encoding='utf-8') as handle:
+            self.rules = json.load(handle)
+
+    def write_rules(self, text, mtime):
+        with open(self.path, 'w', encoding='utf-8') as handle:
+            handle.write(text)
+        os.utime(self.path, (mtime, mtime))
+
+    def test_reloads_changed_file(self):
+        loader = RuleSetLoader(self.path, reload_interval=0)
+        self.assertEqual(loader.get().version, self.rules['version'])
+        self.rules['version'] = 'next'
+        self.rules['soil_types']['clay']['fertilizer_tips'] = 'Changed'
+        self.write_rules(json.dumps(self.rules), os.stat(self.path).st_mtime + 10)
+        rule_set = loader.get()
+        self.assertEqual(rule_set.version, 'next')
+        self.assertEqual(rule_set.evaluate(25, 'clay', 'maha', '', 1)['fertilizer_tips'], 'Changed')
+
+    def test_edit_without_version_bump_is_not_served_from_memo(self):
+        loader = RuleSetLoader(self.path, reload_interval=0)
+        with mock.patch.object(rules, '_loader', loader), mock.patch.object(rules, '_memo', LRUCache(16)):
+            before = rules.evaluate(25, 'clay', 'maha', '', 1)['fertilizer_tips']
+            self.rules['soil_types']['clay']['fertilizer_tips'] = 'Changed'
+            self.write_rules(json.dumps(self.rules), os.stat(self.path).st_mtime + 10)
+            self.assertEqual(loader.get().version, self.rules['version'])
+            self.assertNotEqual(before, 'Changed')
+            self.assertEqual(rules.evaluate(25, 'clay', 'maha', '', 1)['fertilizer_tips'], 'Changed')
+
+    def test_keeps_previous_rules_when_edit_is_broken(self):
+        loader = RuleSetLoader(self.path, reload_interval=0)
+        rule_set = loader.get()
+        self.write_rules('{"version": ', os.stat(self.path).st_mtime + 10)
+        self.assertIs(loader.get(), rule_set)
+
+    def test_rejects_unordered_bands(self):
+        self.rules['temperature_bands'][0]['max'] = 40
+        self.write_rules(json.dumps(self.rules), os.stat(self.path).st_mtime + 10)
+        with self.assertRaises(ValueError):
+            load_rule_set(self.path)
+
+
+class RegenerateRecommendationsTests(TestCase):
+
+    def setUp(self):
+        rows = [
+            {'location': 'Kandy', 'field_name': soil_type, 'soil_temperature': 25, 'soil_type': soil_type, 'season': 'maha'}
+            for soil_type in ['clay', 'sandy']
+        ]
+        objects, groups = build_recommendations(rows)
+        save_recommendations(objects)
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'rules.json')
+        with open(PADDY_RULES_PATH, encoding='utf-8') as handle:
+            edited = json.load(handle)
+        edited['soil_types']['clay']['fertilizer_tips'] = 'Changed'
+        with open(path, 'w', encoding='utf-8') as handle:
+            json.dump(edited, handle)
+        patcher = mock.patch.object(rules, '_loader', RuleSetLoader(path, reload_interval=60))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rule_edit_without_version_bump_is_regenerated(self):
+        rule_set = rules.get_rule_set()
+        self.assertEqual(rule_set.version, load_rule_set(PADDY_RULES_PATH).version)
+        result = regenerate_outdated(pause=0)
+        self.assertEqual((result['scanned'], result['rewritten']), (2, 1))
+        self.assertEqual(PaddyRecommendation.objects.get(field_name='clay').payload.fertilizer_tips, 'Changed')
+        self.assertEqual(set(PaddyRecommendation.objects.values_list('rule_version', flat=True)), {rule_set.revision})
+        self.assertEqual(regenerate_outdated(pause=0)['scanned'], 0)
+
+
+class RegionMatcherTests(SimpleTestCase):
+
+    def test_resolves_most_specific_region(self):
+        self.assertEqual(resolve_region('Anuradhapura, North Central, Sri Lanka'), 'LK-71')
+        self.assertEqual(resolve_region('North Central Province'), 'LK-7')
+        self.assertEqual(resolve_region('Yaalpaanam'), 'LK-41')
+        self.assertEqual(resolve_region('Sri Lanka'), 'LK')
+        self.assertEqual(resolve_region('Chennai, India'), 'IN-TN')
+        self.assertEqual(resolve_region('Paris'), '')
+
+    def test_strip_street_terms(self):
+        self.assertEqual(strip_street_terms('Temple Road, Jaffna'), 'Temple, Jaffna')
+        self.assertEqual(strip_street_terms('Broadway'), 'Broadway')
+
+
+class RecommendationPayloadTests(TestCase):
+
+    def test_intern_many_stores_each_distinct_payload_once(self):
+        first = rules.evaluate(25, 'clay', 'yala', 'Kandy, Sri Lanka', 4)
+        same = rules.evaluate(26, 'clay', 'yala', 'Kandy, Sri Lanka', 4)
+        other = rules.evaluate(36, 'sandy', 'maha', 'Jaffna', 10)
+        self.assertNotEqual(first['explanation'], same['explanation'])
+
+        payloads = RecommendationPayload.objects.intern_many([first, same, other])
+        self.assertEqual(payloads[0].pk, payloads[1].pk)
+        self.assertNotEqual(payloads[0].pk, payloads[2].pk)
+        self.assertEqual(RecommendationPayload.objects.count(), 2)
+
+        again = RecommendationPayload.objects.intern(dict(other))
+        self.assertEqual(again.pk, payloads[2].pk)
+        self.assertEqual(RecommendationPayload.objects.count(), 2)
+        self.assertEqual(again.content(), {field: other[field] for field in PAYLOAD_FIELDS})
+
+
+class RecommendationBatchTests(TestCase):
+
+    def post(self, body, content_type='application/json'):
+        return self.client.post('/api/recommendations/batch/', body, content_type=content_type)
+
+    def test_saves_valid_rows_and_reports_bad_ones(self):
+        rows = [
+            {'location': 'Kandy', 'field_name': 'A', 'soil_temperature': 25},
+            {'location': '', 'soil_temperature': 25},
+            {'location': 'Kandy', 'soil_temperature': 'warm'},
+            {'location': 'Kandy', 'soil_temperature': 'nan'},
+            'not a row',
+            {'location': 'Galle', 'field_name': 'B', 'soil_temperature': '26.5', 'soil_type': 'clay'},
+        ]
+        response = self.post(json.dumps({'rows': rows}))
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data['created'], 2)
+        self.assertEqual([error['row'] for error in data['errors']], [1, 2, 3, 4])
+        self.assertEqual(PaddyRecommendation.objects.get(field_name='A').soil_type, batch.DEFAULT_SOIL_TYPE)
+
+    def test_rejects_unusable_bodies(self):
+        self.assertEqual(self.post('{"rows": []}').status_code, 400)
+        self.assertEqual(self.post('not json').status_code, 400)
+        self.assertEqual(self.post('field_name\nA\n', 'text/csv').status_code, 400)
+        response = self.post(json.dumps([{'location': ''}]))
+        self.assertEqual((response.status_code, response.json()['created']), (400, 0))
+        self.assertFalse(PaddyRecommendation.objects.exists())
+
+    def test_accepts_csv(self):
+        body = 'location,field_name,soil_temperature,season\nJaffna,North,31,yala\nJaffna,South,18,maha\n'
+        response = self.post(body, 'text/csv')
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(PaddyRecommendation.objects.filter(location='Jaffna').count(), 2)
+
+
+class MonthlyYieldTrendTests(TestCase):
+
+    def add_day(self, day, count, temperature_sum):
+        RecommendationDailyStats.objects.create(
+            date=day, location='Kandy', soil_type='clay', planting_season='yala',
+            recommendation_count=count, temperature_sum=temperature_sum, temperature_min=20, temperature_max=30,
+        )
+
+    def test_groups_the_last_months_across_a_year_boundary(self):
+        self.add_day(date(2025, 8, 31), 1, 40)  # outside the window
+        self.add_day(date(2025, 9, 1), 2, 50)
+        self.add_day(date(2025, 12, 31), 1, 18)
+        self.add_day(date(2026, 2, 10), 1, 26)
+        self.add_day(date(2026, 2, 14), 3, 78)
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2026, 2, 15)):
+            trend = monthly_yield_trend(RecommendationDailyStats.objects.all(), months=6)
+        self.assertEqual([month['month'] for month in trend], ['February', 'December', 'September'])
+        self.assertEqual(trend[0], {'month': 'February', 'actual_yield': 4300, 'target_yield': 3000, 'performance': 143.3})
+        self.assertEqual(trend[1]['target_yield'], 2500)
+
+    def test_empty_rollup(self):
+        self.assertEqual(monthly_yield_trend(RecommendationDailyStats.objects.all()), [])
+
+
+class WriteBehindTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.directory = directory
+        journal = writebehind.Journal(directory)
+        self.addCleanup(lambda: [handle.close() for handle in journal._handles.values()])
+        patcher = mock.patch.object(writebehind, '_journal', journal)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.journal = journal
+
+    def entry(self, field_name):
+        fields = {'location': 'Kandy', 'region': 'LK-21', 'field_name': field_name, 'soil_temperature': 25.0,
+                  'soil_type': 'clay', 'planting_season': 'yala'}
+        return writebehind.build_entry(fields, rules.evaluate(25.0, 'clay', 'yala', 'Kandy'), 'test')
+
+    def test_write_entries_skips_stored_submissions(self):
+        first, second = self.entry('A'), self.entry('B')
+        writebehind.write_entries([first])
+        writebehind.write_entries([first, second])
+        self.assertEqual(PaddyRecommendation.objects.count(), 2)
+        self.assertEqual(RecommendationDailyStats.objects.get().recommendation_count, 2)
+
+    def test_replays_orphaned_segments_once(self):
+        stored, lost = self.entry('stored'), self.entry('lost')
+        writebehind.write_entries([stored])
+        path = os.path.join(self.directory, '1-1-000001.jsonl')
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(json.dumps(stored) + '\n' + json.dumps(lost) + '\n{"torn')
+        self.assertEqual(writebehind.replay_journal(), 2)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(sorted(PaddyRecommendation.objects.values_list('field_name', flat=True)), ['lost', 'stored'])
+        self.assertEqual(writebehind.replay_journal(), 0)
+
+    def test_failed_inline_write_stays_journaled_for_the_writer(self):
+        full = queue.Queue(maxsize=1)
+        full.put_nowait(None)
+        with mock.patch.object(writebehind, 'start'), mock.patch.object(writebehind, '_queue', full), \
+                mock.patch.object(writebehind, '_retry', deque()), \
+                mock.patch.object(writebehind, 'write_entries', side_effect=RuntimeError('database is locked')):
+            entry = writebehind.submit(self.entry('A')['fields'], rules.evaluate(25.0, 'clay', 'yala', 'Kandy'), 'test')
+            segment, retried = writebehind._take_batch(block=False)[0]
+        self.assertEqual(retried['submission_id'], entry['submission_id'])
+        self.assertEqual(self.journal._pending[segment], 1)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, segment)))
+
+
+class InlineExecutor:
+    """Synchronous stand-in for ProcessPoolExecutor"""
+
+    def __init__(self, max_workers=None, initializer=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class PortfolioTests(TestCase):
+
+    def setUp(self):
+        owner = User.objects.create(username='farmer')
+        self.farms = []
+        for name, location in [('North', 'Jaffna, Sri Lanka ' + 'x' * 400), ('Hill', 'Kandy, Sri Lanka')]:
+            farm = Farm.objects.create(name=name, owner=owner, location=location, area_hectares=2, soil_type='Clay loam')
+            for field_name, temperature in [('A', 24), ('B', 33), ('C', None)]:
+                field = farm.fields.create(name=field_name, area_hectares=1, field_type='paddy', status='active')
+                field.sensor_data.create(temperature=temperature)
+            self.farms.append(farm)
+
+    def test_evaluates_and_saves_a_partition_in_process(self):
+        result = portfolio.evaluate_partition([farm.id for farm in self.farms], 'yala', 5)
+        self.assertEqual((len(result['records']), result['skipped']), (4, 2))
+        self.assertEqual(portfolio.save_partition(result, 'yala'), 4)
+
+        rec = PaddyRecommendation.objects.filter(region='LK-41').first()
+        self.assertEqual(len(rec.location), PaddyRecommendation._meta.get_field('location').max_length)
+        self.assertEqual((rec.soil_type, rec.planting_season), ('clay', 'yala'))
+        self.assertEqual(RecommendationDailyStats.objects.aggregate(total=Sum('recommendation_count'))['total'], 4)
+
+    def test_failed_partition_does_not_abort_the_run(self):
+        evaluate = portfolio.evaluate_partition
+
+        def flaky(farm_ids, season, month):
+            if self.farms[0].id in farm_ids:
+                raise RuntimeError('worker died')
+            return evaluate(farm_ids, season, month)
+
+        with mock.patch.object(portfolio, 'ProcessPoolExecutor', InlineExecutor), \
+                mock.patch.object(portfolio, 'evaluate_partition', flaky):
+            result = portfolio.run_portfolio(season='yala', month=5, workers=1, chunk_size=3)
+        self.assertEqual((result['partitions'], result['written']), (2, 2))
+        self.assertEqual(result['failed'], [{'farm_ids': [self.farms[0].id], 'fields': 3, 'error': 'worker died'}])
+
+
+class BenchmarkRegressionTests(SimpleTestCase):
+
+    def test_new_failures_and_slower_views_are_regressions(self):
+        baseline = {'engine': {'p95_ms': 1.0}, 'views': {'10': {
+            'analytics': {'p95_ms': 10.0, 'queries': 3}, 'notifications': {'p95_ms': 5.0}, 'paddy_history': {'error': 'x'},
+        }}}
+        results = {'engine': {'p95_ms': 1.1}, 'views': {'10': {
+            'analytics': {'p95_ms': 20.0, 'queries': 3}, 'notifications': {'error': 'boom'}, 'paddy_history': {'error': 'x'},
+        }}}
+        self.assertEqual(find_regressions(results, baseline, threshold=0.25), [
+            '10 analytics p95_ms: 10.0 -> 20.0',
+            '10 notifications failed: boom',
+        ])
+
+
+class RecommendationRollupTests(TestCase):
+
+    def setUp(self):
+        rows = [
+            {'location': location, 'field_name': 'A', 'soil_temperature': temperature,
+             'soil_type': soil_type, 'season': 'yala'}
+            for location in ['Kandy', 'Jaffna']
+            for soil_type in ['clay', 'sandy']
+            for temperature in [18.5, 25.0, 33.0, 36.5]
+        ]
+        objects, groups = build_recommendations(rows)
+        save_recommendations(objects)
+
+    def snapshot(self):
+        return sorted(
+            tuple(sorted(row.items()))
+            for row in RecommendationDailyStats.objects.values(*[
+                field.name for field in RecommendationDailyStats._meta.fields if field.name != 'id'
+            ])
+        )
+
+    def test_incremental_updates_match_rebuild(self):
+        rec = PaddyRecommendation.objects.filter(location='Kandy', soil_type='clay').first()
+        rec.soil_type = 'sandy'
+        rec.save()
+        PaddyRecommendation.objects.filter(location='Jaffna', soil_temperature=36.5).delete()
+        incremental = self.snapshot()
+        rollup.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_field_counts_follow_renames_and_deletes(self):
+        rec = PaddyRecommendation.objects.filter(location='Kandy').first()
+        rec.field_name = 'B'
+        rec.save()
+        PaddyRecommendation.objects.filter(location='Jaffna', soil_temperature=36.5).delete()
+        counts = dict(RecommendationFieldStats.objects.values_list('field_name', 'recommendation_count'))
+        self.assertEqual(counts, {'A': 13, 'B': 1})
+        self.assertEqual(compute_recommendation_stats()['fields'], 2)
+
+        rec.field_name = 'A'
+        rec.save()
+        self.assertEqual(list(RecommendationFieldStats.objects.values_list('field_name', flat=True)), ['A'])
+        rollup.rebuild_fields()
+        self.assertEqual(RecommendationFieldStats.objects.get().recommendation_count, 14)
+
+    def test_counts_temperature_categories(self):
+        stats = RecommendationDailyStats.objects.get(location='Kandy', soil_type='clay')
+        self.assertEqual(stats.recommendation_count, 4)
+        self.assertEqual((stats.cold_count, stats.optimal_count, stats.warm_count, stats.hot_count), (1, 1, 1, 1))
+        self.assertEqual((stats.temperature_min, stats.temperature_max), (18.5, 36.5))
+
+
+class DataVersionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        rows = [
+            {'location': 'Kandy', 'field_name': name, 'soil_temperature': 25, 'soil_type': 'clay', 'season': 'yala'}
+            for name in 'ABC'
+        ]
+        objects, groups = build_recommendations(rows)
+        save_recommendations(objects)
+
+    def test_save_and_delete_retire_the_analytics_context(self):
+        version = get_data_version()
+        self.assertEqual(get_analytics_context()['total_recommendations'], 3)
+
+        rec = PaddyRecommendation.objects.get(field_name='A')
+        with self.captureOnCommitCallbacks(execute=True):
+            rec.soil_temperature = 36
+            rec.save()
+        self.assertGreater(get_data_version(), version)
+        self.assertEqual(get_analytics_context()['temp_stats']['max_temp'], 36)
+
+        version = get_data_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            rec.delete()
+        self.assertGreater(get_data_version(), version)
+        self.assertEqual(get_analytics_context()['total_recommendations'], 2)
+
+    def test_recommendation_stats_follow_saves_and_deletes(self):
+        stats = get_recommendation_stats()
+        self.assertEqual((stats['total'], stats['bands']['optimal'], stats['bands']['hot']), (3, 3, 0))
+
+        rec = PaddyRecommendation.objects.get(field_name='A')
+        with self.captureOnCommitCallbacks(execute=True):
+            rec.soil_temperature = 36
+            rec.save()
+        stats = get_recommendation_stats()
+        self.assertEqual((stats['total'], stats['bands']['optimal'], stats['bands']['hot']), (3, 2, 1))
+        self.assertEqual(stats['temperature']['max'], 36)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PaddyRecommendation.objects.filter(field_name='B').delete()
+        stats = get_recommendation_stats()
+        self.assertEqual((stats['total'], stats['bands']['optimal']), (2, 1))
+
+
+class LiveCounterTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        rows = [
+            {'location': 'Kandy', 'field_name': name, 'soil_temperature': 25, 'soil_type': 'clay', 'season': 'yala'}
+            for name in 'ABC'
+        ]
+        self.objects, groups = build_recommendations(rows)
+
+    def test_writes_move_the_counters(self):
+        counters.reconcile()
+        with self.captureOnCommitCallbacks(execute=True):
+            save_recommendations(self.objects)
+        kpis = counters.get_counters()
+        self.assertEqual((kpis['total'], kpis['successful'], kpis['locations'], kpis['fields']), (3, 3, 1, 3))
+
+        rec = PaddyRecommendation.objects.get(field_name='A')
+        with self.captureOnCommitCallbacks(execute=True):
+            rec.soil_temperature = 36
+            rec.save()
+        self.assertEqual(counters.get_counters()['bands'], {'cold': 0, 'optimal': 2, 'warm': 0, 'hot': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rec.delete()
+        kpis = counters.get_counters()
+        self.assertEqual((kpis['total'], kpis['bands']['hot']), (2, 0))
+
+    def test_reconcile_reports_and_corrects_drift(self):
+        save_recommendations(self.objects)
+        first = counters.reconcile()
+        self.assertIsNone(first['drift'])
+        cache.incr(counters.counter_key('total'), 5)
+        cache.decr(counters.counter_key('optimal'), 1)
+
+        report = counters.reconcile()
+        self.assertEqual(report['drift']['total'], 5)
+        self.assertEqual(report['drift']['bands']['optimal'], -1)
+        self.assertEqual(counters.get_drift(), report)
+        self.assertEqual(counters.get_counters()['total'], 3)
+
+    def test_rows_committed_while_reconciling_are_counted_once(self):
+        save_recommendations(self.objects)
+        counters.reconcile()
+        aggregate = PaddyRecommendation.objects.aggregate
+        more, groups = build_recommendations([
+            {'location': 'Galle', 'field_name': 'D', 'soil_temperature': 25, 'soil_type': 'clay', 'season': 'yala'}
+        ])
+
+        def concurrent_insert(**kwargs):
+            with self.captureOnCommitCallbacks(execute=True):
+                save_recommendations(more)
+            return aggregate(**kwargs)
+
+        with mock.patch.object(PaddyRecommendation.objects, 'aggregate', side_effect=concurrent_insert):
+            report = counters.reconcile()
+        self.assertEqual(report['drift']['total'], 0)
+        self.assertEqual(counters.get_counters()['total'], 4)
+
+    def test_increments_during_the_sketch_scans_are_kept(self):
+        save_recommendations(self.objects)
+        counters.reconcile()
+        add = counters.HyperLogLog.add
+
+        def concurrent_increment(sketch, value):
+            cache.incr(counters.counter_key('total'))
+            return add(sketch, value)
+
+        with mock.patch.object(counters.HyperLogLog, 'add', autospec=True, side_effect=concurrent_increment):
+            counters.reconcile()
+        # one location and three fields were scanned
+        self.assertEqual(counters.get_counters()['total'], 3 + 4)
+
+    def test_reads_never_reconcile_inline(self):
+        save_recommendations(self.objects)
+        with mock.patch.object(counters, 'reconcile_in_background') as start:
+            self.assertEqual(counters.get_counters()['total'], 3)  # rollup totals until reconciled
+            start.assert_called_once()
+
+            counters.reconcile()
+            start.reset_mock()
+            with self.assertNumQueries(0):
+                self.assertEqual(counters.get_counters()['total'], 3)
+            start.assert_not_called()
+
+            cache.set(counters.RECONCILED_AT_KEY, 0, timeout=None)
+            with self.assertNumQueries(0):
+                counters.get_counters()
+            start.assert_called_once()
+
+
+class RecommendationExportTests(TestCase):
+
+    def setUp(self):
+        rows = [
+            {'location': location, 'field_name': 'A', 'soil_temperature': temperature,
+             'soil_type': soil_type, 'season': 'yala'}
+            for location in ['Kandy', 'Jaffna']
+            for soil_type in ['clay', 'sandy']
+            for temperature in [18.5, 25.0]
+        ]
+        objects, groups = build_recommendations(rows)
+        save_recommendations(objects)
+
+    def export(self, fmt, **params):
+        response = self.client.get(f'/api/export/recommendations.{fmt}', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_applies_history_filters_and_projection(self):
+        body = self.export('csv', location='kandy', soil_type='clay', fields='location,soil_temperature,primary_varieties')
+        lines = body.splitlines()
+        self.assertEqual(lines[0], 'location,soil_temperature,primary_varieties')
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(all(line.startswith('Kandy,') for line in lines[1:]))
+
+    def test_ndjson_rows(self):
+        rows = [json.loads(line) for line in self.export('ndjson', fields='id,success').splitlines()]
+        self.assertEqual(len(rows), PaddyRecommendation.objects.count())
+        self.assertEqual(set(rows[0]), {'id', 'success'})
+
+    def test_gzip_when_accepted(self):
+        response = self.client.get('/api/export/recommendations.ndjson', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+        self.assertEqual(len(body.splitlines()), PaddyRecommendation.objects.count())
+
+    def test_rejects_unknown_fields_and_bad_dates(self):
+        self.assertEqual(self.client.get('/api/export/recommendations.csv', {'fields': 'password'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/export/recommendations.csv', {'date_from': 'soon'}).status_code, 400)
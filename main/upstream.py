@@ -0,0 +1,246 @@
+import math
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.utils.http import parse_http_date_safe
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import ratelimit
+from .caching import SingleFlight
+
+USER_AGENT = 'PaddySense/1.0 (https://paddysense.com; contact@example.com)'
+
+UPSTREAM_POOL_SIZE = getattr(settings, 'UPSTREAM_POOL_SIZE', 10)
+UPSTREAM_RETRIES = getattr(settings, 'UPSTREAM_RETRIES', 2)
+UPSTREAM_BACKOFF = getattr(settings, 'UPSTREAM_BACKOFF', 0.3)
+UPSTREAM_DEFAULT_TIMEOUT = getattr(settings, 'UPSTREAM_DEFAULT_TIMEOUT', 10)
+UPSTREAM_TIMEOUTS = getattr(settings, 'UPSTREAM_TIMEOUTS', {})
+
+_session = None
+_session_lock = threading.Lock()
+_stats = {}
+_flights = SingleFlight()
+_stats_lock = threading.Lock()
+
+
+def get_session():
+    """Return the per-process pooled keep-alive session"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def _build_session():
+    """Create a session with bounded connection pools and jittered retries
+
+    429 is left out of the adapter's retries: those are retried in _send so
+    they wait for Retry-After and go through the host's token bucket again.
+    """
+    retry = Retry(
+        total=UPSTREAM_RETRIES,
+        backoff_factor=UPSTREAM_BACKOFF,
+        backoff_jitter=UPSTREAM_BACKOFF,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=('GET',),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=UPSTREAM_POOL_SIZE, pool_maxsize=UPSTREAM_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'User-Agent': USER_AGENT,
+        'Accept': 'application/json',
+    })
+    return session
+
+
+class RequestCancelled(Exception):
+    """Raised instead of sending a request whose caller no longer needs it"""
+
+
+def get(url, cancelled=None, **kwargs):
+    """GET an upstream URL through the shared session, recording per-host stats
+
+    Identical requests already in flight are merged into one upstream call,
+    and rate limited hosts are queued through their token bucket first.
+    cancelled is an optional threading.Event; once it is set the request is
+    not sent and RequestCancelled is raised. Only calls sharing the event are
+    merged with a cancellable request.
+    """
+    host = urlsplit(url).hostname or ''
+    kwargs.setdefault('timeout', UPSTREAM_TIMEOUTS.get(host, UPSTREAM_DEFAULT_TIMEOUT))
+    sent = []
+    key = (url, repr(sorted(kwargs.items())), cancelled)
+    response = _flights.do(key, lambda: sent.append(True) or _send(host, url, kwargs, cancelled))
+    if not sent:
+        _record(host, merged=True)
+    return response
+
+
+def _send(host, url, kwargs, cancelled=None):
+    """Wait for the host's rate limit, then perform the request
+
+    A 429 is retried after its Retry-After delay (bounded by the rate limit
+    queue wait), taking a new token for each attempt. Cancellation is checked
+    before queueing and again right before sending.
+    """
+    for attempt in range(UPSTREAM_RETRIES + 1):
+        _check_cancelled(cancelled, url)
+        waited = ratelimit.acquire(host)
+        _check_cancelled(cancelled, url)
+        started = time.monotonic()
+        try:
+            response = get_session().get(url, **kwargs)
+        except requests.RequestException:
+            _record(host, time.monotonic() - started, error=True, waited=waited)
+            raise
+        _record(host, time.monotonic() - started, error=response.status_code >= 400, waited=waited)
+        if response.status_code != 429 or attempt == UPSTREAM_RETRIES:
+            return response
+        delay = retry_after(response, UPSTREAM_BACKOFF * 2 ** attempt)
+        if delay > ratelimit.UPSTREAM_RATE_LIMIT_MAX_WAIT:
+            return response
+        print(f"{host} answered 429, retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def _check_cancelled(cancelled, url):
+    if cancelled is not None and cancelled.is_set():
+        raise RequestCancelled(f"Request to {url} cancelled")
+
+
+def retry_after(response, default):
+    """Seconds to wait from a Retry-After header (seconds or HTTP date), or default"""
+    value = response.headers.get('Retry-After', '').strip()
+    if value.isdigit():
+        return float(value)
+    retry_at = parse_http_date_safe(value) if value else None
+    if retry_at is None:
+        return default
+    return max(0.0, retry_at - time.time())
+
+
+def _record(host, elapsed=0.0, error=False, waited=0.0, merged=False):
+    """Add one call to the host's latency, queue and error counters"""
+    with _stats_lock:
+        stats = _stats.setdefault(host, {
+            'requests': 0, 'errors': 0, 'merged': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            'queued': 0, 'wait_total_ms': 0.0, 'max_wait_ms': 0.0,
+        })
+        if merged:
+            stats['merged'] += 1
+            return
+        elapsed_ms = elapsed * 1000
+        waited_ms = waited * 1000
+        stats['requests'] += 1
+        stats['errors'] += int(error)
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+        if waited:
+            stats['queued'] += 1
+            stats['wait_total_ms'] += waited_ms
+            stats['max_wait_ms'] = max(stats['max_wait_ms'], waited_ms)
+
+
+def get_stats():
+    """Snapshot of per-host upstream counters for this process"""
+    with _stats_lock:
+        return {
+            host: {
+                'requests': stats['requests'],
+                'errors': stats['errors'],
+                'merged': stats['merged'],
+                'avg_ms': round(stats['total_ms'] / stats['requests'], 1) if stats['requests'] else 0,
+                'max_ms': round(stats['max_ms'], 1),
+                'queued': stats['queued'],
+                'avg_wait_ms': round(stats['wait_total_ms'] / stats['requests'], 1) if stats['requests'] else 0,
+                'max_wait_ms': round(stats['max_wait_ms'], 1),
+            }
+            for host, stats in _stats.items()
+        }
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling an upstream whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Stop calling a failing upstream for a while, then probe it with one request
+
+    Closed: calls pass through. After failure_threshold consecutive failures
+    the breaker opens and calls are refused for reset_timeout seconds. It then
+    goes half-open and lets a single probe through; success closes it again,
+    failure re-opens it. is_failure decides which exceptions count as
+    failures; the others (e.g. a rejected request) show the upstream is up.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30, is_failure=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure or (lambda exc: True)
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go upstream now"""
+        with self.lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                return True
+            return False
+
+    def available(self):
+        """Whether allow() would let a call through, without claiming the probe"""
+        with self.lock:
+            if self.state == 'open':
+                return time.monotonic() - self.opened_at >= self.reset_timeout
+            return self.state == 'closed'
+
+    def retry_after(self):
+        """Seconds until an open breaker lets a probe through (0 when not open)"""
+        with self.lock:
+            if self.state != 'open':
+                return 0
+            return max(0, math.ceil(self.reset_timeout - (time.monotonic() - self.opened_at)))
+
+    def record_success(self):
+        with self.lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    print(f"Circuit breaker for {self.name} opened after {self.failures} failure(s)")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn through the breaker, counting exceptions accepted by is_failure as failures"""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} is temporarily unavailable")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as exc:
+            if self.is_failure(exc):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
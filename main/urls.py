@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import path, re_path
 from . import views
 
 app_name = 'main'
@@ -30,7 +30,14 @@ urlpatterns = [
     
     # API Endpoints
     path('api/weather-update/', views.weather_update, name='weather_update'),
+    path('api/weather-batch/', views.weather_batch, name='weather_batch'),
+    path('api/recommendations/batch/', views.recommendations_batch, name='recommendations_batch'),
+    path('api/locations/autocomplete/', views.location_autocomplete, name='location_autocomplete'),
     path('api/notifications/', views.notifications, name='notifications'),
+    path('api/upstream-stats/', views.upstream_stats, name='upstream_stats'),
+    path('api/recommendation-stats/', views.recommendation_stats, name='recommendation_stats'),
+    path('api/counter-drift/', views.counter_drift, name='counter_drift'),
+    re_path(r'^api/export/recommendations\.(?P<fmt>csv|ndjson)$', views.export_recommendations, name='export_recommendations'),
 ]
 
 
@@ -1,16 +1,49 @@
 from django.shortcuts import render, redirect
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_POST
+from django.views.decorators.vary import vary_on_cookie
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django.utils import timezone
 from django.utils import translation
 from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
 import requests
+import calendar
 import json
 import random
-from .models import PaddyRecommendation
-from django.db.models import Avg, Count, Max, Min, Q
-from django.utils import timezone
+import numpy as np
+from .models import PaddyRecommendation, RecommendationDailyStats, RecommendationPayload
+from .geocoding import resolve_location
+from .gazetteer import get_gazetteer
+from .regions import region_name, resolve_region
+from .rules import evaluate as evaluate_rules, get_memo_stats, get_rule_set
+from . import batch, rollup, writebehind
+from .weather_service import (
+    WeatherServiceError, breaker as weather_breaker, fetch_forecast, forecast_etag, get_forecast, get_forecasts,
+    is_provider_fault, observation_time, parse_current_weather, snap_to_grid, valid_coordinates
+)
+from . import upstream
+from .caching import SingleFlight
+from .dataversion import get_data_changed_at, get_data_version
+from .counters import get_counters, get_drift as get_counter_drift
+from .stats import get_recommendation_stats
+from .export import CONTENT_TYPES as EXPORT_CONTENT_TYPES, export_stream, filter_recommendations, history_filters, parse_fields
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
 from datetime import timedelta
 
+WEATHER_BATCH_MAX_POINTS = getattr(settings, 'WEATHER_BATCH_MAX_POINTS', 1000)
+WEATHER_RETRY_AFTER = getattr(settings, 'WEATHER_RETRY_AFTER', 30)
+ANALYTICS_CACHE_TTL = getattr(settings, 'ANALYTICS_CACHE_TTL', 300)
+COUNTRY_LABELS = {'LK': 'Sri Lanka', 'IN': 'India'}
+
+_analytics_flights = SingleFlight()
+
 def home(request):
     """Home page view"""
     return render(request, 'home.html')
@@ -27,134 +60,13 @@ def weather(request):
         location = request.POST.get('location', '').strip()
         print(f"Weather search requested for location: {location}")
         if location:
-            # Try multiple geocoding strategies for very specific locations
-            success = False
-            
-            # Strategy 1: Try with OpenStreetMap Nominatim (most comprehensive)
-            headers = {
-                'User-Agent': 'PaddySense/1.0 (https://paddysense.com; contact@example.com)',
-                'Accept': 'application/json'
-            }
-            
-            # Try exact search first
-            geocode_url = f"https://nominatim.openstreetmap.org/search?q={location}&format=json&limit=5&addressdetails=1"
-            print(f"Strategy 1 - Exact search URL: {geocode_url}")
-            
             try:
-                geocode_response = requests.get(geocode_url, headers=headers, timeout=10)
-                print(f"Strategy 1 response status: {geocode_response.status_code}")
-                
-                if geocode_response.status_code == 200 and geocode_response.text.strip():
-                    try:
-                        geocode_data = geocode_response.json()
-                        print(f"Strategy 1 response: {geocode_data}")
-                        
-                        if geocode_data and len(geocode_data) > 0:
-                            # Use the best match (highest importance or first result)
-                            best_match = geocode_data[0]
-                            lat = float(best_match['lat'])
-                            lon = float(best_match['lon'])
-                            display_name = best_match['display_name'].split(',')[0]
-                            print(f"Strategy 1 success - Coordinates: {lat}, {lon}, Display: {display_name}")
-                            
-                            success = get_weather_data(lat, lon, display_name, location, context, "OpenStreetMap")
-                            
-                    except json.JSONDecodeError as e:
-                        print(f"Strategy 1 JSON decode error: {e}")
-                
-                if not success:
-                    # Strategy 2: Try with more specific search parameters
-                    print("Strategy 1 failed, trying Strategy 2...")
-                    specific_url = f"https://nominatim.openstreetmap.org/search?q={location}&format=json&limit=10&addressdetails=1&extratags=1&namedetails=1"
-                    specific_response = requests.get(specific_url, headers=headers, timeout=10)
-                    
-                    if specific_response.status_code == 200 and specific_response.text.strip():
-                        try:
-                            specific_data = specific_response.json()
-                            if specific_data and len(specific_data) > 0:
-                                best_match = specific_data[0]
-                                lat = float(best_match['lat'])
-                                lon = float(best_match['lon'])
-                                display_name = best_match['display_name'].split(',')[0]
-                                print(f"Strategy 2 success - Coordinates: {lat}, {lon}, Display: {display_name}")
-                                
-                                success = get_weather_data(lat, lon, display_name, location, context, "OpenStreetMap (Detailed)")
-                        except json.JSONDecodeError as e:
-                            print(f"Strategy 2 JSON decode error: {e}")
-                
-                if not success:
-                    # Strategy 3: Try Open-Meteo Geocoding API
-                    print("Strategy 2 failed, trying Strategy 3...")
-                    fallback_url = f"https://geocoding-api.open-meteo.com/v1/search?name={location}&count=5&language=en&format=json"
-                    print(f"Strategy 3 URL: {fallback_url}")
-                    
-                    fallback_response = requests.get(fallback_url, timeout=10)
-                    if fallback_response.status_code == 200:
-                        try:
-                            fallback_data = fallback_response.json()
-                            if fallback_data.get('results') and len(fallback_data['results']) > 0:
-                                result = fallback_data['results'][0]
-                                lat = float(result['latitude'])
-                                lon = float(result['longitude'])
-                                display_name = result['name']
-                                print(f"Strategy 3 success - Coordinates: {lat}, {lon}, Display: {display_name}")
-                                
-                                success = get_weather_data(lat, lon, display_name, location, context, "Open-Meteo Geocoding")
-                        except Exception as e:
-                            print(f"Strategy 3 error: {e}")
-                
-                if not success:
-                    # Strategy 4: Try with location parts (split by commas)
-                    print("Strategy 3 failed, trying Strategy 4...")
-                    location_parts = [part.strip() for part in location.split(',') if part.strip()]
-                    if len(location_parts) > 1:
-                        # Try with just the main part (first part)
-                        main_location = location_parts[0]
-                        print(f"Strategy 4 - Trying main part: {main_location}")
-                        
-                        main_url = f"https://nominatim.openstreetmap.org/search?q={main_location}&format=json&limit=3"
-                        main_response = requests.get(main_url, headers=headers, timeout=10)
-                        
-                        if main_response.status_code == 200 and main_response.text.strip():
-                            try:
-                                main_data = main_response.json()
-                                if main_data and len(main_data) > 0:
-                                    best_match = main_data[0]
-                                    lat = float(best_match['lat'])
-                                    lon = float(best_match['lon'])
-                                    display_name = best_match['display_name'].split(',')[0]
-                                    print(f"Strategy 4 success - Coordinates: {lat}, {lon}, Display: {display_name}")
-                                    
-                                    success = get_weather_data(lat, lon, display_name, location, context, "OpenStreetMap (Main Part)")
-                            except json.JSONDecodeError as e:
-                                print(f"Strategy 4 JSON decode error: {e}")
-                
-                if not success:
-                    # Strategy 5: Try with Google-style search (remove specific details)
-                    print("Strategy 4 failed, trying Strategy 5...")
-                    # Remove common specific terms and try again
-                    cleaned_location = location.replace('street', '').replace('road', '').replace('lane', '').replace('avenue', '').strip()
-                    if cleaned_location != location:
-                        print(f"Strategy 5 - Trying cleaned location: {cleaned_location}")
-                        
-                        cleaned_url = f"https://nominatim.openstreetmap.org/search?q={cleaned_location}&format=json&limit=3"
-                        cleaned_response = requests.get(cleaned_url, headers=headers, timeout=10)
-                        
-                        if cleaned_response.status_code == 200 and cleaned_response.text.strip():
-                            try:
-                                cleaned_data = cleaned_response.json()
-                                if cleaned_data and len(cleaned_data) > 0:
-                                    best_match = cleaned_data[0]
-                                    lat = float(best_match['lat'])
-                                    lon = float(best_match['lon'])
-                                    display_name = best_match['display_name'].split(',')[0]
-                                    print(f"Strategy 5 success - Coordinates: {lat}, {lon}, Display: {display_name}")
-                                    
-                                    success = get_weather_data(lat, lon, display_name, location, context, "OpenStreetMap (Cleaned)")
-                            except json.JSONDecodeError as e:
-                                print(f"Strategy 5 JSON decode error: {e}")
+                # Cached lookup; walks the geocoding strategies only on a miss
+                place = resolve_location(location)
                 
-                if not success:
+                if place:
+                    get_weather_data(place['latitude'], place['longitude'], place['display_name'], location, context, place['source'])
+                else:
                     # All strategies failed
                     print("All geocoding strategies failed")
                     context.update({
@@ -186,51 +98,29 @@ def weather(request):
 def get_weather_data(lat, lon, display_name, original_query, context, source):
     """Helper function to get weather data for given coordinates"""
     try:
-        # Get weather data from Open-Meteo API
-        weather_url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,relative_humidity_2m,precipitation,weather_code,wind_speed_10m&daily=temperature_2m_max,temperature_2m_min,weather_code&timezone=auto"
-        print(f"Weather URL: {weather_url}")
-        weather_response = requests.get(weather_url, timeout=10)
-        
-        # Check if weather request was successful
-        if weather_response.status_code != 200:
-            print(f"Weather API error: Status {weather_response.status_code}")
-            context.update({
-                'error': f'Weather service error (Status: {weather_response.status_code})',
-                'location_query': original_query
-            })
-            return False
-        
+        # Get weather data for the surrounding grid cell (cached)
         try:
-            weather_data = weather_response.json()
-        except json.JSONDecodeError as e:
-            print(f"Weather JSON decode error: {e}")
+            weather_data = get_forecast(lat, lon, display_name)
+        except WeatherServiceError as e:
             context.update({
-                'error': 'Invalid response from weather service. Please try again.',
+                'error': str(e),
                 'location_query': original_query
             })
             return False
         
         print(f"Weather response: {weather_data}")
         
-        if 'current' in weather_data:
-            current = weather_data['current']
+        current_weather = parse_current_weather(weather_data)
+        if current_weather:
             context.update({
                 'search_performed': True,
                 'location_query': original_query,
                 'display_name': display_name,
                 'latitude': lat,
                 'longitude': lon,
-                'current_weather': {
-                    'temperature': current.get('temperature_2m'),
-                    'humidity': current.get('relative_humidity_2m'),
-                    'rainfall': current.get('precipitation', 0),
-                    'wind_speed': current.get('wind_speed_10m'),
-                    'condition': 'Sunny' if current.get('weather_code') == 0 else 'Cloudy',
-                    'feels_like': current.get('temperature_2m'),
-                    'visibility': 10.0,
-                    'timestamp': current.get('time')
-                },
-                'source': source
+                'current_weather': current_weather,
+                'source': source,
+                'weather_stale': weather_data.get('stale', False)
             })
             print(f"Context updated with weather data: {context}")
             return True
@@ -253,81 +143,118 @@ def weather_analytics(request):
     """Weather analytics page view"""
     return render(request, 'weather_analytics.html')
 
+def monthly_yield_trend(daily_stats, months=6):
+    """Simulated yield per calendar month for the last few months, newest first
+
+    One GROUP BY over a bounded date range of the daily rollup; the yield
+    formulas are applied to all months at once.
+    """
+    today = timezone.localdate()
+    first_month = today.year * 12 + today.month - months  # months since year 0, zero based
+    start = today.replace(year=first_month // 12, month=first_month % 12 + 1, day=1)
+    rows = list(
+        daily_stats.filter(date__gte=start)
+        .annotate(month=TruncMonth('date'))
+        .values('month')
+        .annotate(avg_temp=rollup.average_temperature())
+        .order_by('-month')
+    )
+    if not rows:
+        return []
+
+    # Yield calculation based on temperature (optimal temp = higher yield)
+    avg_temp = np.array([row['avg_temp'] for row in rows], dtype=float)
+    optimal = (avg_temp >= 22) & (avg_temp <= 30)
+    cold = avg_temp < 22
+    actual_yield = np.select(
+        [optimal, cold],
+        [2800 + (30 - np.abs(avg_temp - 26)) * 50, 2000 + (avg_temp - 15) * 40],
+        2200 + (35 - avg_temp) * 30,  # Hot conditions
+    )
+    target_yield = np.select([optimal, cold], [3000, 2500], 2700)
+    performance = actual_yield / target_yield * 100
+
+    return [
+        {
+            'month': calendar.month_name[row['month'].month],
+            'actual_yield': round(float(actual)),
+            'target_yield': int(target),
+            'performance': round(float(percent), 1),
+        }
+        for row, actual, target, percent in zip(rows, actual_yield, target_yield, performance)
+    ]
+
 def analytics(request):
     """Comprehensive analytics view with intelligent data analysis"""
-    from django.db.models import Avg, Count, Max, Min
-    from django.utils import timezone
-    from datetime import timedelta
-    
-    # Get all stored recommendations
+    return render(request, 'analytics.html', get_analytics_context())
+
+def get_analytics_context():
+    """Analytics context for the current data version, computed once per version
+
+    Concurrent misses share one computation; the TTL bounds staleness when the
+    cache is per process and another worker bumped the version.
+    """
+    key = f"analytics:context:{get_data_version()}"
+    context = cache.get(key)
+    if context is None:
+        context = _analytics_flights.do(key, lambda: cache.get(key) or _cache_analytics_context(key))
+    return context
+
+def _cache_analytics_context(key):
+    context = build_analytics_context()
+    cache.set(key, context, ANALYTICS_CACHE_TTL)
+    return context
+
+def build_analytics_context():
+    """Compute the analytics context; QuerySets are materialized so it can be cached"""
+    # Get all stored recommendations; totals and groupings come from the daily rollup
     all_recommendations = PaddyRecommendation.objects.all()
+    daily_stats = RecommendationDailyStats.objects.all()
     
     # Calculate key performance indicators
-    total_recommendations = all_recommendations.count()
-    total_locations = all_recommendations.values('location').distinct().count()
-    total_fields = all_recommendations.values('field_name').distinct().count()
+    stats = get_recommendation_stats()
+    total_recommendations = stats['total']
+    total_locations = stats['locations']
+    total_fields = stats['fields']
     
     # Temperature analysis
-    temp_stats = all_recommendations.aggregate(
-        avg_temp=Avg('soil_temperature'),
-        max_temp=Max('soil_temperature'),
-        min_temp=Min('soil_temperature')
-    )
+    temp_stats = {
+        'avg_temp': stats['temperature']['avg'],
+        'max_temp': stats['temperature']['max'],
+        'min_temp': stats['temperature']['min']
+    }
     
 
     
     # Soil type analysis
-    soil_type_stats = all_recommendations.values('soil_type').annotate(
-        count=Count('id'),
-        avg_temp=Avg('soil_temperature')
-    ).order_by('-count')
+    soil_type_stats = list(daily_stats.values('soil_type').annotate(
+        count=Sum('recommendation_count'),
+        avg_temp=rollup.average_temperature()
+    ).order_by('-count'))
     
     # Season analysis
-    season_stats = all_recommendations.values('planting_season').annotate(
-        count=Count('id'),
-        avg_temp=Avg('soil_temperature')
-    ).order_by('-count')
+    season_stats = list(daily_stats.values('planting_season').annotate(
+        count=Sum('recommendation_count'),
+        avg_temp=rollup.average_temperature()
+    ).order_by('-count'))
     
     # Location performance
-    location_stats = all_recommendations.values('location').annotate(
-        count=Count('id'),
-        avg_temp=Avg('soil_temperature'),
-        success_rate=Count('id', filter=Q(success=True)) * 100.0 / Count('id')
-    ).order_by('-count')[:5]
-    
-    # Recent trends (last 30 days)
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    recent_recommendations = all_recommendations.filter(timestamp__gte=thirty_days_ago)
+    location_stats = list(daily_stats.values('location').annotate(
+        count=Sum('recommendation_count'),
+        avg_temp=rollup.average_temperature(),
+        success_rate=rollup.success_rate()
+    ).order_by('-count')[:5])
+    
+    # Region breakdown from the region code stored on each row
+    region_stats = list(daily_stats.exclude(region='').values('region').annotate(
+        count=Sum('recommendation_count'),
+        avg_temp=rollup.average_temperature()
+    ).order_by('-count')[:8])
+    for region in region_stats:
+        region['name'] = region_name(region['region'])
     
     # Monthly yield trends (simulated based on temperature conditions)
-    monthly_yield_data = []
-    current_month = timezone.now().month
-    for i in range(6):
-        month_num = (current_month - i) % 12 or 12
-        month_name = timezone.now().replace(month=month_num).strftime('%B')
-        
-        # Simulate yield based on temperature conditions for that month
-        month_recommendations = all_recommendations.filter(timestamp__month=month_num)
-        if month_recommendations.exists():
-            avg_temp = month_recommendations.aggregate(avg=Avg('soil_temperature'))['avg']
-            # Yield calculation based on temperature (optimal temp = higher yield)
-            if avg_temp and 22 <= avg_temp <= 30:
-                actual_yield = 2800 + (30 - abs(avg_temp - 26)) * 50  # Optimal range
-                target_yield = 3000
-            elif avg_temp and avg_temp < 22:
-                actual_yield = 2000 + (avg_temp - 15) * 40  # Cold conditions
-                target_yield = 2500
-            else:
-                actual_yield = 2200 + (35 - avg_temp) * 30  # Hot conditions
-                target_yield = 2700
-            
-            performance = (actual_yield / target_yield) * 100
-            monthly_yield_data.append({
-                'month': month_name,
-                'actual_yield': round(actual_yield),
-                'target_yield': target_yield,
-                'performance': round(performance, 1)
-            })
+    monthly_yield_data = monthly_yield_trend(daily_stats)
     
     # Weather impact score (based on temperature conditions)
     weather_impact_score = 0
@@ -394,6 +321,7 @@ def analytics(request):
         'soil_type_stats': soil_type_stats,
         'season_stats': season_stats,
         'location_stats': location_stats,
+        'region_stats': region_stats,
         'monthly_yield_data': monthly_yield_data,
         'weather_impact_score': weather_impact_score,
         'soil_conditions': soil_conditions,
@@ -406,7 +334,7 @@ def analytics(request):
         'insights': insights
     }
     
-    return render(request, 'analytics.html', context)
+    return context
 
 def user_input(request):
     """User input form view"""
@@ -426,30 +354,34 @@ def user_input(request):
                 # Get intelligent paddy recommendations
                 recommendations = get_paddy_recommendations(soil_temp, soil_type, season, location)
                 
-                # Save to database
-                paddy_rec = PaddyRecommendation.objects.create(
-                    location=location,
-                    field_name=field_name,
-                    soil_temperature=soil_temp,
-                    soil_type=soil_type,
-                    planting_season=season,
-                    primary_varieties=recommendations['primary_varieties'],
-                    secondary_varieties=recommendations['secondary_varieties'],
-                    planting_timing=recommendations['planting_timing'],
-                    soil_preparation=recommendations['soil_preparation'],
-                    water_management=recommendations['water_management'],
-                    fertilizer_tips=recommendations['fertilizer_tips'],
-                    risk_factors=recommendations['risk_factors'],
-                    optimal_conditions=recommendations['optimal_conditions'],
-                    current_time_recommendations=recommendations['current_time_recommendations'],
-                    seasonal_varieties=recommendations['seasonal_varieties'],
-                    immediate_actions=recommendations['immediate_actions'],
-                    explanation=recommendations['explanation'],
-                    success=True
-                )
+                fields = {
+                    'location': location,
+                    'region': resolve_region(location),
+                    'field_name': field_name,
+                    'soil_temperature': soil_temp,
+                    'soil_type': soil_type,
+                    'planting_season': season,
+                }
                 
-                # Get recent entries for display
-                recent_entries = PaddyRecommendation.objects.all()[:5]
+                if writebehind.RECOMMENDATION_WRITE_BEHIND:
+                    # Journal the submission and let the background writer save it
+                    writebehind.submit(fields, recommendations, get_rule_set().revision)
+                    entry_id = None
+                    recent_entries = writebehind.recent_entries()
+                else:
+                    # Save to database; the row and its daily rollup commit together
+                    with transaction.atomic():
+                        paddy_rec = PaddyRecommendation.objects.create(
+                            payload=RecommendationPayload.objects.intern(recommendations),
+                            explanation=recommendations['explanation'],
+                            rule_version=get_rule_set().revision,
+                            success=True,
+                            **fields
+                        )
+                    entry_id = paddy_rec.id
+                    
+                    # Get recent entries for display
+                    recent_entries = PaddyRecommendation.objects.all()[:5]
                 
                 context.update({
                     'success': True,
@@ -461,7 +393,7 @@ def user_input(request):
                     'recommendations': recommendations,
                     'message': f'Data received successfully! Location: {location}, Temperature: {soil_temp}°C',
                     'recent_entries': recent_entries,
-                    'entry_id': paddy_rec.id
+                    'entry_id': entry_id
                 })
                 
                 print(f"Paddy recommendations generated and saved to database: {recommendations}")
@@ -483,236 +415,20 @@ def user_input(request):
     
     # Get recent entries for display (even on GET request)
     if 'recent_entries' not in context:
-        context['recent_entries'] = PaddyRecommendation.objects.all()[:5]
+        if writebehind.RECOMMENDATION_WRITE_BEHIND:
+            writebehind.start()
+            context['recent_entries'] = writebehind.recent_entries()
+        else:
+            context['recent_entries'] = PaddyRecommendation.objects.all()[:5]
     
     return render(request, 'user_input.html', context)
 
 def get_paddy_recommendations(soil_temp, soil_type, season, location):
-    """Generate intelligent paddy recommendations based on multiple factors"""
-    
-    from datetime import datetime
-    
-    recommendations = {
-        'primary_varieties': [],
-        'secondary_varieties': [],
-        'planting_timing': '',
-        'soil_preparation': '',
-        'water_management': '',
-        'fertilizer_tips': '',
-        'risk_factors': [],
-        'optimal_conditions': {},
-        'explanation': '',
-        'current_time_recommendations': '',
-        'seasonal_varieties': [],
-        'immediate_actions': []
-    }
-    
-    # Get current month for seasonal recommendations
-    current_month = datetime.now().month
-    current_season = get_current_season(current_month)
-    
-    # Current time recommendations
-    recommendations['current_time_recommendations'] = get_current_time_recommendations(current_month, soil_temp)
-    
-    # Temperature-based recommendations
-    if soil_temp < 20:
-        recommendations['risk_factors'].append('Soil temperature is too cold for optimal paddy growth')
-        recommendations['planting_timing'] = 'Wait for soil to warm up to 22-30°C'
-        recommendations['water_management'] = 'Use warm water for irrigation if possible'
-        recommendations['immediate_actions'].append('Delay planting until soil warms up')
-        recommendations['immediate_actions'].append('Prepare nursery beds for early varieties')
-        
-        # Cold-tolerant varieties for current conditions
-        recommendations['primary_varieties'] = [
-            'IR64 (Cold-tolerant, High yielding)',
-            'Swarna (Cold-resistant, Popular)',
-            'Pusa Basmati 1 (Cold-adapted, Aromatic)',
-            'IR36 (Early maturing, Cold-hardy)'
-        ]
-        recommendations['secondary_varieties'] = [
-            'Pusa 44 (Cold-hardy, Disease resistant)',
-            'IR8 (High yield potential, Quick maturing)'
-        ]
-        
-    elif 20 <= soil_temp <= 30:
-        recommendations['optimal_conditions']['temperature'] = 'Optimal temperature range for paddy'
-        recommendations['planting_timing'] = 'Ideal time for planting'
-        recommendations['water_management'] = 'Standard irrigation practices'
-        recommendations['immediate_actions'].append('Proceed with planting - conditions are perfect')
-        recommendations['immediate_actions'].append('Prepare field for direct seeding')
-        
-        # Standard varieties for optimal conditions
-        recommendations['primary_varieties'] = [
-            'IR64 (High yielding, Disease resistant)',
-            'Swarna (Popular, High quality)',
-            'Pusa Basmati 1 (Aromatic, Premium quality)',
-            'IR36 (Early maturing, Quick harvest)'
-        ]
-        recommendations['secondary_varieties'] = [
-            'Pusa 44 (Disease resistant, High yield)',
-            'IR8 (High yield potential, Popular)'
-        ]
-        
-    elif 30 < soil_temp <= 35:
-        recommendations['risk_factors'].append('Soil temperature is getting warm')
-        recommendations['planting_timing'] = 'Plant early morning or evening'
-        recommendations['water_management'] = 'Increase irrigation frequency to cool soil'
-        recommendations['immediate_actions'].append('Plant during cooler hours')
-        recommendations['immediate_actions'].append('Increase irrigation frequency')
-        
-        # Heat-tolerant varieties
-        recommendations['primary_varieties'] = [
-            'IR64 (Heat-tolerant, High yielding)',
-            'Swarna (Adaptable, Heat-resistant)',
-            'Pusa Basmati 1 (Heat-resistant, Aromatic)',
-            'IR36 (Quick maturing, Heat-adapted)'
-        ]
-        recommendations['secondary_varieties'] = [
-            'Pusa 44 (Heat-adapted, Disease resistant)',
-            'IR8 (Quick cycle, Heat-tolerant)'
-        ]
-        
-    else:  # > 35°C
-        recommendations['risk_factors'].append('Soil temperature is too hot for optimal growth')
-        recommendations['planting_timing'] = 'Avoid planting during peak heat hours'
-        recommendations['water_management'] = 'Frequent irrigation and shade management needed'
-        recommendations['immediate_actions'].append('Consider delaying planting until cooler weather')
-        recommendations['immediate_actions'].append('Use shade nets if planting is necessary')
-        
-        # Heat-resistant varieties
-        recommendations['primary_varieties'] = [
-            'IR64 (Heat-resistant, High yielding)',
-            'Swarna (Stress-tolerant, Adaptable)'
-        ]
-        recommendations['secondary_varieties'] = [
-            'IR36 (Quick cycle, Heat-adapted)',
-            'Pusa 44 (Stress-adapted, Quick maturing)'
-        ]
-    
-    # Soil type considerations
-    if soil_type == 'clay':
-        recommendations['soil_preparation'] = 'Clay soil holds water well but needs good drainage'
-        recommendations['fertilizer_tips'] = 'Add organic matter to improve structure'
-        recommendations['immediate_actions'].append('Improve drainage with raised beds')
-    elif soil_type == 'sandy':
-        recommendations['soil_preparation'] = 'Sandy soil needs more frequent irrigation and fertilization'
-        recommendations['fertilizer_tips'] = 'Use slow-release fertilizers and organic matter'
-        recommendations['immediate_actions'].append('Add organic matter to improve water retention')
-    elif soil_type == 'loamy':
-        recommendations['soil_preparation'] = 'Loamy soil is ideal for paddy cultivation'
-        recommendations['fertilizer_tips'] = 'Standard fertilization practices work well'
-        recommendations['immediate_actions'].append('Maintain current soil structure')
-    else:
-        recommendations['soil_preparation'] = 'Ensure proper soil preparation and drainage'
-        recommendations['fertilizer_tips'] = 'Test soil pH and add appropriate amendments'
-        recommendations['immediate_actions'].append('Test soil pH and add amendments')
-    
-    # Location-based adjustments
-    if 'sri lanka' in location.lower() or 'srilanka' in location.lower():
-        recommendations['explanation'] = f'Based on Sri Lankan conditions: Soil temp {soil_temp}°C is {"optimal" if 22 <= soil_temp <= 30 else "suboptimal"} for paddy cultivation.'
-        recommendations['optimal_conditions']['region'] = 'Sri Lanka - Tropical climate suitable for paddy'
-        
-        # Add Sri Lankan specific varieties based on current season
-        seasonal_varieties = get_sri_lankan_seasonal_varieties(current_month, soil_temp)
-        recommendations['seasonal_varieties'] = seasonal_varieties
-        
-        # Add location-specific varieties
-        if 'jaffna' in location.lower():
-            recommendations['primary_varieties'].extend(['Jaffna Local (Traditional, Local adapted)', 'Northern Red (Local variety, High quality)'])
-        elif 'colombo' in location.lower() or 'western' in location.lower():
-            recommendations['primary_varieties'].extend(['Western White (Local variety, High yield)', 'Colombo Special (Adapted, Disease resistant)'])
-        elif 'kandy' in location.lower() or 'central' in location.lower():
-            recommendations['primary_varieties'].extend(['Central Highland (Local variety, Cool climate)', 'Kandy Traditional (Adapted, Aromatic)'])
-    
-    # Season considerations
-    if season == 'yala' or 'summer' in season.lower():
-        recommendations['planting_timing'] += ' - Yala season (Feb-May)'
-        recommendations['water_management'] += ' - Higher irrigation needs during dry season'
-        recommendations['immediate_actions'].append('Prepare for higher irrigation needs')
-    elif season == 'maha' or 'winter' in season.lower():
-        recommendations['planting_timing'] += ' - Maha season (Sep-Mar)'
-        recommendations['water_management'] += ' - Monitor rainfall patterns'
-        recommendations['immediate_actions'].append('Monitor rainfall and adjust irrigation')
-    
-    # Final recommendations summary
-    if recommendations['risk_factors']:
-        recommendations['explanation'] += f" ⚠️ Risks: {', '.join(recommendations['risk_factors'])}"
-    
-    recommendations['explanation'] += f" 🌱 Best varieties: {', '.join(recommendations['primary_varieties'][:2])}"
-    
-    return recommendations
-
-def get_current_season(month):
-    """Get current season based on month"""
-    if month in [2, 3, 4, 5]:
-        return 'yala'
-    elif month in [9, 10, 11, 12, 1]:
-        return 'maha'
-    else:
-        return 'transition'
-
-def get_current_time_recommendations(month, soil_temp):
-    """Get recommendations based on current time of year"""
-    if month in [2, 3]:  # February-March
-        if soil_temp < 22:
-            return "🌱 Early Yala Season: Prepare nursery beds, wait for soil to warm up"
-    else:
-        return "🌱 Early Yala Season: Perfect time to start planting early varieties"
-    
-    if month in [4, 5]:  # April-May
-        if soil_temp > 32:
-            return "🌱 Late Yala Season: High temperatures - use heat-tolerant varieties"
-        else:
-            return "🌱 Late Yala Season: Good conditions for late Yala planting"
-    
-    elif month in [9, 10]:  # September-October
-        if soil_temp < 20:
-            return "🌱 Early Maha Season: Cool conditions - use cold-tolerant varieties"
-        else:
-            return "🌱 Early Maha Season: Excellent conditions for Maha season start"
-    
-    elif month in [11, 12, 1]:  # November-January
-        if soil_temp < 18:
-            return "🌱 Peak Maha Season: Cold conditions - delay planting or use cold-hardy varieties"
-        else:
-            return "🌱 Peak Maha Season: Good conditions for main Maha crop"
-    
-    else:  # June-August (transition)
-        return "🌱 Transition Period: Prepare fields for next season, test soil conditions"
+    """Generate intelligent paddy recommendations based on multiple factors
 
-def get_sri_lankan_seasonal_varieties(month, soil_temp):
-    """Get Sri Lankan paddy varieties best suited for current season and conditions"""
-    seasonal_varieties = []
-    
-    if month in [2, 3, 4, 5]:  # Yala Season
-        if soil_temp < 22:
-            seasonal_varieties.extend([
-                'BG 300 (Early Yala, Cold-tolerant)',
-                'BG 352 (Early Yala, Quick maturing)',
-                'AT 306 (Early Yala, High yield)'
-            ])
-        else:
-            seasonal_varieties.extend([
-                'BG 300 (Early Yala, High yielding)',
-                'BG 352 (Early Yala, Disease resistant)',
-                'AT 306 (Early Yala, Popular)'
-            ])
-    
-    elif month in [9, 10, 11, 12, 1]:  # Maha Season
-        if soil_temp < 20:
-            seasonal_varieties.extend([
-                'BG 94-1 (Maha, Cold-hardy)',
-                'BG 250 (Maha, Cold-tolerant)',
-                'AT 308 (Maha, Cold-resistant)'
-            ])
-    else:
-            seasonal_varieties.extend([
-                'BG 94-1 (Maha, High yielding)',
-                'BG 250 (Maha, Popular variety)',
-                'AT 308 (Maha, Disease resistant)'
-            ])
-    
-    return seasonal_varieties
+    The decision tables live in main/data/paddy_rules.json and are compiled by main.rules.
+    """
+    return evaluate_rules(soil_temp, soil_type, season, location)
 
 def set_language(request):
     """Language switcher view"""
@@ -753,18 +469,14 @@ def test_weather_api(request):
         location = "Coimbatore"
         
         # Get coordinates
-        geocode_url = f"https://nominatim.openstreetmap.org/search?q={location}&format=json&limit=1"
-        geocode_response = requests.get(geocode_url, timeout=10)
-        geocode_data = geocode_response.json()
+        place = resolve_location(location)
         
-        if geocode_data:
-            lat = float(geocode_data[0]['lat'])
-            lon = float(geocode_data[0]['lon'])
+        if place:
+            lat = place['latitude']
+            lon = place['longitude']
             
-            # Get weather data
-            weather_url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,relative_humidity_2m,precipitation,weather_code,wind_speed_10m&daily=temperature_2m_max,temperature_2m_min,weather_code&timezone=auto"
-            weather_response = requests.get(weather_url, timeout=10)
-            weather_data = weather_response.json()
+            # Get weather data straight from the provider (bypasses the cache)
+            weather_data = fetch_forecast(lat, lon)
             
             return JsonResponse({
                 'status': 'success',
@@ -1007,57 +719,60 @@ def get_dashboard_data(request):
     
     return JsonResponse(dashboard_data)
 
+def recommendations_validators():
+    """ETag and Last-Modified for responses built from the stored recommendations
+
+    Both are read from the cache. The data version changes with every
+    committed insert, edit, delete or regeneration; the newest recent entry
+    also covers write-behind submissions that are still queued.
+    """
+    entries = writebehind.recent_entries()
+    newest = entries[0]['timestamp'].timestamp() if entries else 0
+    etag = quote_etag(f"{get_data_version()}-{newest}")
+    return etag, int(max(get_data_changed_at(), newest))
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+
+@cache_control(private=True, no_cache=True)
+@vary_on_cookie
 def dashboard_data(request):
-    """Get dashboard data for AJAX requests"""
-    
-    # Get recent recommendations
-    recent_recommendations = PaddyRecommendation.objects.all()[:5]
+    """Get dashboard data for AJAX requests; served from cached counters without SQL"""
     
-    # Get statistics
-    total_recommendations = PaddyRecommendation.objects.count()
-    locations_count = PaddyRecommendation.objects.values('location').distinct().count()
+    # Pollers re-send the validators; unchanged data becomes a 304
+    etag, last_modified = recommendations_validators()
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
     
-    # Get temperature distribution
-    temp_stats = {
-        'cold': PaddyRecommendation.objects.filter(soil_temperature__lt=20).count(),
-        'optimal': PaddyRecommendation.objects.filter(soil_temperature__gte=20, soil_temperature__lte=30).count(),
-        'warm': PaddyRecommendation.objects.filter(soil_temperature__gt=30, soil_temperature__lte=35).count(),
-        'hot': PaddyRecommendation.objects.filter(soil_temperature__gt=35).count(),
-    }
+    # Live counters and the cached recent entries
+    kpis = get_counters()
+    recent_recommendations = [
+        {name: entry[name] for name in ['field_name', 'location', 'soil_temperature', 'timestamp']}
+        for entry in writebehind.recent_entries()
+    ]
     
     dashboard_data = {
-        'total_recommendations': total_recommendations,
-        'locations_count': locations_count,
-        'temperature_stats': temp_stats,
-        'recent_recommendations': list(recent_recommendations.values('field_name', 'location', 'soil_temperature', 'timestamp')[:5])
+        'total_recommendations': kpis['total'],
+        'locations_count': kpis['locations'],
+        'temperature_stats': kpis['bands'],
+        'stats': kpis,
+        'recent_recommendations': recent_recommendations
     }
     
-    return JsonResponse(dashboard_data)
+    response = JsonResponse(dashboard_data)
+    set_validators(response, etag, last_modified)
+    return response
 
 def paddy_history(request):
     """Display history of all paddy recommendations"""
     
     # Get filter parameters
-    location_filter = request.GET.get('location', '')
-    soil_type_filter = request.GET.get('soil_type', '')
-    season_filter = request.GET.get('season', '')
-    date_from = request.GET.get('date_from', '')
-    date_to = request.GET.get('date_to', '')
+    filters = history_filters(request.GET)
     
     # Start with all recommendations
-    recommendations = PaddyRecommendation.objects.all()
-    
-    # Apply filters
-    if location_filter:
-        recommendations = recommendations.filter(location__icontains=location_filter)
-    if soil_type_filter:
-        recommendations = recommendations.filter(soil_type=soil_type_filter)
-    if season_filter:
-        recommendations = recommendations.filter(planting_season=season_filter)
-    if date_from:
-        recommendations = recommendations.filter(timestamp__gte=date_from)
-    if date_to:
-        recommendations = recommendations.filter(timestamp__lte=date_to)
+    recommendations = filter_recommendations(PaddyRecommendation.objects.select_related('payload'), filters)
     
     # Get unique values for filter dropdowns
     locations = PaddyRecommendation.objects.values_list('location', flat=True).distinct()
@@ -1076,22 +791,45 @@ def paddy_history(request):
         'locations': locations,
         'soil_types': soil_types,
         'seasons': seasons,
-        'filters': {
-            'location': location_filter,
-            'soil_type': soil_type_filter,
-            'season': season_filter,
-            'date_from': date_from,
-            'date_to': date_to,
-        }
+        'filters': filters,
     }
     
     return render(request, 'paddy_history.html', context)
 
+def export_recommendations(request, fmt):
+    """Stream the recommendation history as CSV or NDJSON
+
+    Takes the paddy_history filters plus ?fields=a,b,c to pick columns. Rows
+    are read in chunks and written as they are produced, so memory stays flat
+    however many rows match; gzip is applied on the fly when the client
+    accepts it.
+    """
+    try:
+        fields = parse_fields(request.GET.get('fields', ''))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    try:
+        recommendations = filter_recommendations(PaddyRecommendation.objects.all(), history_filters(request.GET))
+    except ValidationError as e:
+        return JsonResponse({'error': ' '.join(e.messages)}, status=400)
+    
+    compress = 'gzip' in request.headers.get('Accept-Encoding', '')
+    response = StreamingHttpResponse(
+        export_stream(recommendations, fmt, fields, compress=compress),
+        content_type=EXPORT_CONTENT_TYPES[fmt],
+    )
+    filename = f"recommendations-{timezone.localdate():%Y%m%d}.{fmt}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Vary'] = 'Accept-Encoding'
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    return response
+
 def recommendation_details(request, rec_id):
     """Get detailed view of a specific recommendation"""
     
     try:
-        rec = PaddyRecommendation.objects.get(id=rec_id)
+        rec = PaddyRecommendation.objects.select_related('payload').get(id=rec_id)
         
         # Create detailed HTML view
         html_content = f"""
@@ -1145,6 +883,8 @@ def recommendation_details(request, rec_id):
     except PaddyRecommendation.DoesNotExist:
         return JsonResponse({'error': 'Recommendation not found'}, status=404)
 
+@cache_control(private=True, no_cache=True)
+@vary_on_cookie
 def weather_update(request):
     """API endpoint for weather updates"""
     lat = request.GET.get('lat')
@@ -1154,31 +894,184 @@ def weather_update(request):
         return JsonResponse({'error': 'Latitude and longitude required'}, status=400)
     
     try:
-        # Get current weather for the coordinates
-        weather_url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,relative_humidity_2m,precipitation,weather_code,wind_speed_10m&timezone=auto"
-        weather_response = requests.get(weather_url, timeout=10)
+        lat, lon = float(lat), float(lon)
+    except ValueError:
+        return JsonResponse({'error': 'Latitude and longitude must be numbers'}, status=400)
+    if not valid_coordinates(lat, lon):
+        return JsonResponse({'error': 'Latitude must be within [-90, 90] and longitude within [-180, 180]'}, status=400)
+    
+    try:
+        # Get current weather for the grid cell around the coordinates (cached)
+        weather_data = get_forecast(lat, lon)
+        current = weather_data.get('current', {})
         
-        if weather_response.status_code == 200:
-            weather_data = weather_response.json()
-            current = weather_data.get('current', {})
-            
-            return JsonResponse({
-                'temperature': current.get('temperature_2m'),
-                'humidity': current.get('relative_humidity_2m'),
-                'precipitation': current.get('precipitation'),
-                'wind_speed': current.get('wind_speed_10m'),
-                'weather_code': current.get('weather_code'),
-                'timestamp': current.get('time')
-            })
-        else:
-            return JsonResponse({'error': 'Weather API error'}, status=500)
+        # Pollers re-send the ETag; unchanged observations become a 304
+        etag = quote_etag(forecast_etag(snap_to_grid(lat, lon), weather_data))
+        last_modified = observation_time(weather_data)
+        not_modified = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None
+        )
+        if not_modified is not None:
+            return not_modified
+        
+        response = JsonResponse({
+            'temperature': current.get('temperature_2m'),
+            'humidity': current.get('relative_humidity_2m'),
+            'precipitation': current.get('precipitation'),
+            'wind_speed': current.get('wind_speed_10m'),
+            'weather_code': current.get('weather_code'),
+            'timestamp': current.get('time'),
+            'stale': weather_data.get('stale', False)
+        })
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
             
+    except (WeatherServiceError, requests.RequestException) as e:
+        if not is_provider_fault(e):
+            return JsonResponse({'error': str(e)}, status=400)
+        # Upstream outage or open circuit: tell pollers when to come back
+        response = JsonResponse({'error': 'Weather service is temporarily unavailable'}, status=503)
+        response['Retry-After'] = weather_breaker.retry_after() or WEATHER_RETRY_AFTER
+        return response
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+@csrf_exempt
+@require_POST
+def weather_batch(request):
+    """API endpoint returning current weather for many coordinates at once"""
+    try:
+        coordinates = json.loads(request.body).get('coordinates')
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    
+    if not isinstance(coordinates, list) or not coordinates:
+        return JsonResponse({'error': 'A non-empty "coordinates" list is required'}, status=400)
+    if len(coordinates) > WEATHER_BATCH_MAX_POINTS:
+        return JsonResponse({'error': f'At most {WEATHER_BATCH_MAX_POINTS} coordinates per request'}, status=400)
+    
+    points = []
+    for item in coordinates:
+        try:
+            point = (float(item['lat']), float(item['lon']))
+        except (KeyError, TypeError, ValueError):
+            point = None
+        # Open-Meteo rejects a whole multi-location request for one bad point
+        points.append(point if point and valid_coordinates(*point) else None)
+    
+    forecasts = get_forecasts([point for point in points if point])
+    
+    # Results are returned in input order
+    results = []
+    for item, point in zip(coordinates, points):
+        if point is None:
+            results.append({'input': item, 'error': 'Invalid coordinates'})
+            continue
+        
+        cell = snap_to_grid(*point)
+        weather_data = forecasts[cell]
+        result = {'lat': point[0], 'lon': point[1], 'cell': {'lat': cell[0], 'lon': cell[1]}}
+        current_weather = None if isinstance(weather_data, Exception) else parse_current_weather(weather_data)
+        if current_weather:
+            result['current_weather'] = current_weather
+            result['stale'] = weather_data.get('stale', False)
+        else:
+            result['error'] = 'Weather data not available for this location'
+        results.append(result)
+    
+    return JsonResponse({
+        'results': results,
+        'cells': len(forecasts),
+        'timestamp': timezone.now().isoformat()
+    })
+
+@csrf_exempt
+@require_POST
+def recommendations_batch(request):
+    """API endpoint generating and saving recommendations for many fields at once"""
+    try:
+        rows = batch.parse_rows(request.body, request.content_type)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if len(rows) > batch.RECOMMENDATION_BATCH_MAX_ROWS:
+        return JsonResponse({'error': f'At most {batch.RECOMMENDATION_BATCH_MAX_ROWS} rows per request'}, status=400)
+    
+    valid_rows, errors = batch.clean_rows(rows)
+    created = []
+    groups = 0
+    if valid_rows:
+        objects, groups = batch.build_recommendations(valid_rows)
+        try:
+            created = batch.save_recommendations(objects)
+        except Exception as e:
+            print(f"Batch recommendation save error: {e}")
+            return JsonResponse({'error': 'Could not save recommendations'}, status=500)
+    
+    return JsonResponse({
+        'created': len(created),
+        'ids': [rec.pk for rec in created if rec.pk is not None],
+        'groups': groups,
+        'errors': errors,
+        'timestamp': timezone.now().isoformat()
+    }, status=201 if created else 400)
+
+def location_autocomplete(request):
+    """API endpoint suggesting place names from the local gazetteer"""
+    query = request.GET.get('q', '').strip()
+    if len(query) < 2:
+        return JsonResponse({'results': []})
+    
+    try:
+        limit = min(int(request.GET.get('limit', 8)), 20)
+    except ValueError:
+        limit = 8
+    
+    results = [{
+        'name': place['name'],
+        'label': f"{place['name']}, {place['admin']}, {COUNTRY_LABELS.get(place['country'], place['country'])}",
+        'latitude': place['latitude'],
+        'longitude': place['longitude'],
+    } for place in get_gazetteer().autocomplete(query, limit)]
+    
+    return JsonResponse({'results': results})
+
+def upstream_stats(request):
+    """API endpoint exposing per-host upstream latency and error counters"""
+    return JsonResponse({
+        'hosts': upstream.get_stats(),
+        'timestamp': timezone.now().isoformat()
+    })
+
+def counter_drift(request):
+    """API endpoint exposing the latest counter reconciliation and its drift"""
+    return JsonResponse({
+        'reconciliation': get_counter_drift(),
+        'counters': get_counters(),
+        'timestamp': timezone.now().isoformat()
+    })
+
+def recommendation_stats(request):
+    """API endpoint exposing the recommendation memo counters"""
+    return JsonResponse({
+        'memo': get_memo_stats(),
+        'timestamp': timezone.now().isoformat()
+    })
+
+@cache_control(private=True, no_cache=True)
+@vary_on_cookie
 def notifications(request):
     """API endpoint for notifications"""
     
+    # Pollers re-send the validators; unchanged data becomes a 304
+    etag, last_modified = recommendations_validators()
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+    
     # Get recent notifications (last 5 recommendations)
     recent_recommendations = PaddyRecommendation.objects.all().order_by('-timestamp')[:5]
     
@@ -1204,7 +1097,12 @@ def notifications(request):
             'location': rec.location
         })
     
-    return JsonResponse({
+    data = {
         'notifications': notifications_data,
-        'count': len(notifications_data)
-    })
+        'count': len(notifications_data),
+        'stats': get_recommendation_stats()
+    }
+    
+    response = JsonResponse(data)
+    set_validators(response, etag, last_modified)
+    return response
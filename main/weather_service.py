@@ -0,0 +1,237 @@
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import upstream
+from .caching import SingleFlight
+from .prefetch import record_hits
+
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+FORECAST_PARAMS = "current=temperature_2m,relative_humidity_2m,precipitation,weather_code,wind_speed_10m&daily=temperature_2m_max,temperature_2m_min,weather_code&timezone=auto"
+
+# Grid size in degrees (0.05° is roughly 5.5 km) and cache lifetime in seconds
+WEATHER_GRID_DEGREES = getattr(settings, 'WEATHER_GRID_DEGREES', 0.05)
+WEATHER_CACHE_TTL = getattr(settings, 'WEATHER_CACHE_TTL', 300)
+
+# Maximum number of grid cells per multi-location upstream request
+WEATHER_BATCH_CHUNK = getattr(settings, 'WEATHER_BATCH_CHUNK', 50)
+
+# Last-known-good forecasts are kept this long and served (marked stale)
+# while a refresh runs in the background or the provider is down
+WEATHER_STALE_TTL = getattr(settings, 'WEATHER_STALE_TTL', 60 * 60 * 6)
+WEATHER_BREAKER_FAILURES = getattr(settings, 'WEATHER_BREAKER_FAILURES', 5)
+WEATHER_BREAKER_RESET = getattr(settings, 'WEATHER_BREAKER_RESET', 30)
+
+_forecast_flights = SingleFlight()
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+class WeatherServiceError(Exception):
+    """Raised when the weather provider returns an unusable response
+
+    status is the HTTP status of the provider's reply, when it sent one.
+    """
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def is_provider_fault(exc):
+    """Whether an error should count against the breaker
+
+    Timeouts, connection errors, bad payloads and 5xx/429 replies do; other
+    4xx replies reject the request (e.g. bad coordinates) and do not.
+    """
+    status = getattr(exc, 'status', None)
+    return status is None or status >= 500 or status == 429
+
+
+breaker = upstream.CircuitBreaker('Open-Meteo', WEATHER_BREAKER_FAILURES, WEATHER_BREAKER_RESET, is_provider_fault)
+
+
+def valid_coordinates(lat, lon):
+    """Whether coordinates are a real latitude/longitude pair"""
+    return -90 <= lat <= 90 and -180 <= lon <= 180
+
+
+def snap_to_grid(lat, lon):
+    """Snap coordinates to the centre of their weather grid cell"""
+    step = WEATHER_GRID_DEGREES
+    return round(round(float(lat) / step) * step, 4), round(round(float(lon) / step) * step, 4)
+
+
+def cell_cache_key(cell):
+    """Cache key for a snapped grid cell"""
+    return f"weather:{WEATHER_GRID_DEGREES}:{cell[0]:.4f}:{cell[1]:.4f}"
+
+
+def stale_cache_key(cell):
+    """Cache key for a cell's last-known-good forecast"""
+    return cell_cache_key(cell) + ':stale'
+
+
+def fetched_cache_key(cell):
+    """Cache key for when a cell's fresh forecast was stored"""
+    return cell_cache_key(cell) + ':fetched'
+
+
+def fetch_forecast(lat, lon):
+    """Fetch the forecast for exact coordinates from Open-Meteo"""
+    weather_url = f"{FORECAST_URL}?latitude={lat}&longitude={lon}&{FORECAST_PARAMS}"
+    print(f"Weather URL: {weather_url}")
+    weather_response = upstream.get(weather_url)
+
+    if weather_response.status_code != 200:
+        print(f"Weather API error: Status {weather_response.status_code}")
+        raise WeatherServiceError(
+            f'Weather service error (Status: {weather_response.status_code})', status=weather_response.status_code
+        )
+
+    try:
+        return weather_response.json()
+    except json.JSONDecodeError as e:
+        print(f"Weather JSON decode error: {e}")
+        raise WeatherServiceError('Invalid response from weather service. Please try again.')
+
+
+def fetch_forecasts(cells):
+    """Fetch forecasts for several cells in one multi-location Open-Meteo request"""
+    latitudes = ','.join(f"{lat:.4f}" for lat, lon in cells)
+    longitudes = ','.join(f"{lon:.4f}" for lat, lon in cells)
+    weather_data = fetch_forecast(latitudes, longitudes)
+    # Open-Meteo returns a bare object for a single location and a list otherwise
+    if isinstance(weather_data, dict):
+        weather_data = [weather_data]
+    if len(weather_data) != len(cells):
+        raise WeatherServiceError('Unexpected number of locations from weather service')
+    return weather_data
+
+
+def get_forecast(lat, lon, name=''):
+    """Return the forecast for the grid cell containing the coordinates
+
+    Cached per cell; concurrent misses for the same cell share one upstream
+    call. When the fresh entry has expired but a last-known-good forecast
+    exists, that copy is returned immediately with 'stale': True while one
+    background refresh runs.
+    """
+    cell = snap_to_grid(lat, lon)
+    record_hits([cell], name)
+    key = cell_cache_key(cell)
+    weather_data = cache.get(key)
+    if weather_data is not None:
+        return weather_data
+
+    stale_data = cache.get(stale_cache_key(cell))
+    if stale_data is not None:
+        _refresh_in_background(cell)
+        return dict(stale_data, stale=True)
+
+    return _forecast_flights.do(key, lambda: cache.get(key) or refresh_cell(cell))
+
+
+def refresh_cell(cell):
+    """Fetch a cell through the circuit breaker and replace its cache entries"""
+    try:
+        weather_data = breaker.call(fetch_forecast, *cell)
+    except upstream.CircuitOpenError:
+        raise WeatherServiceError('Weather service is temporarily unavailable. Please try again shortly.')
+    _store({cell: weather_data})
+    return weather_data
+
+
+def _store(forecasts):
+    """Cache fresh forecasts and keep them as each cell's last-known-good copy"""
+    cache.set_many({cell_cache_key(cell): data for cell, data in forecasts.items()}, WEATHER_CACHE_TTL)
+    cache.set_many({stale_cache_key(cell): data for cell, data in forecasts.items()}, WEATHER_STALE_TTL)
+    cache.set_many({fetched_cache_key(cell): time.time() for cell in forecasts}, WEATHER_CACHE_TTL)
+
+
+def _refresh_in_background(cell):
+    """Start a refresh for a cell unless one is already running"""
+    with _refreshing_lock:
+        if cell in _refreshing or not breaker.available():
+            return
+        _refreshing.add(cell)
+    threading.Thread(target=_background_refresh, args=(cell,), name='weather-refresh', daemon=True).start()
+
+
+def _background_refresh(cell):
+    try:
+        refresh_cell(cell)
+    except Exception as e:
+        print(f"Background weather refresh failed for {cell}: {e}")
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(cell)
+
+
+def get_forecasts(points):
+    """Return forecasts for many coordinates, fetching each distinct grid cell once
+
+    Returns a dict mapping each snapped cell to its forecast, or to a
+    WeatherServiceError when that cell could not be fetched.
+    """
+    cells = list(dict.fromkeys(snap_to_grid(lat, lon) for lat, lon in points))
+    record_hits(cells)
+    keys = {cell: cell_cache_key(cell) for cell in cells}
+    cached = cache.get_many(keys.values())
+
+    forecasts = {cell: cached[keys[cell]] for cell in cells if keys[cell] in cached}
+    missing = [cell for cell in cells if cell not in forecasts]
+    for start in range(0, len(missing), WEATHER_BATCH_CHUNK):
+        chunk = missing[start:start + WEATHER_BATCH_CHUNK]
+        try:
+            fetched = dict(zip(chunk, breaker.call(fetch_forecasts, chunk)))
+        except Exception as e:
+            print(f"Weather batch error: {e}")
+            # Fall back to last-known-good forecasts for the chunk
+            stale = cache.get_many([stale_cache_key(cell) for cell in chunk])
+            for cell in chunk:
+                stale_data = stale.get(stale_cache_key(cell))
+                forecasts[cell] = dict(stale_data, stale=True) if stale_data is not None else WeatherServiceError('Weather API error')
+            continue
+        _store(fetched)
+        forecasts.update(fetched)
+    return forecasts
+
+
+def parse_current_weather(weather_data):
+    """Extract the current conditions shown to users, or None when missing"""
+    if 'current' not in weather_data:
+        return None
+    current = weather_data['current']
+    return {
+        'temperature': current.get('temperature_2m'),
+        'humidity': current.get('relative_humidity_2m'),
+        'rainfall': current.get('precipitation', 0),
+        'wind_speed': current.get('wind_speed_10m'),
+        'condition': 'Sunny' if current.get('weather_code') == 0 else 'Cloudy',
+        'feels_like': current.get('temperature_2m'),
+        'visibility': 10.0,
+        'timestamp': current.get('time')
+    }
+
+
+def observation_time(weather_data):
+    """UTC time of the current observation, or None when it cannot be read"""
+    try:
+        local_time = datetime.fromisoformat(weather_data['current']['time'])
+        offset = timedelta(seconds=weather_data.get('utc_offset_seconds', 0))
+    except (KeyError, TypeError, ValueError):
+        return None
+    return (local_time - offset).replace(tzinfo=dt_timezone.utc)
+
+
+def forecast_etag(cell, weather_data):
+    """ETag for a cell's current conditions; changes with each new observation"""
+    observed = (weather_data.get('current') or {}).get('time')
+    stale = weather_data.get('stale', False)
+    return hashlib.md5(f"{cell}:{observed}:{stale}".encode()).hexdigest()
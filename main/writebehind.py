@@ -0,0 +1,298 @@
+import atexit
+import fcntl
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, rollup
+from .dataversion import get_data_version
+from .models import PaddyRecommendation, RecommendationPayload
+
+# Save user_input submissions from a background thread instead of the request.
+# Every submission is fsync'd to a local journal first and replayed after a crash.
+RECOMMENDATION_WRITE_BEHIND = getattr(settings, 'RECOMMENDATION_WRITE_BEHIND', False)
+WRITE_BEHIND_QUEUE_SIZE = getattr(settings, 'WRITE_BEHIND_QUEUE_SIZE', 1000)
+WRITE_BEHIND_BATCH = getattr(settings, 'WRITE_BEHIND_BATCH', 200)
+WRITE_BEHIND_FLUSH_INTERVAL = getattr(settings, 'WRITE_BEHIND_FLUSH_INTERVAL', 1.0)
+WRITE_BEHIND_JOURNAL_DIR = getattr(settings, 'WRITE_BEHIND_JOURNAL_DIR', Path.home() / '.local' / 'state' / 'paddysense' / 'journal')
+
+RECENT_ENTRIES_CACHE_KEY = 'recommendations:recent'
+RECENT_ENTRIES_LIMIT = 5
+RECENT_ENTRIES_TTL = getattr(settings, 'RECENT_ENTRIES_TTL', 300)
+RECENT_ENTRY_FIELDS = ['id', 'field_name', 'location', 'soil_temperature', 'soil_type', 'planting_season', 'timestamp']
+
+INPUT_FIELDS = ['location', 'region', 'field_name', 'soil_temperature', 'soil_type', 'planting_season']
+
+_queue = queue.Queue(maxsize=WRITE_BEHIND_QUEUE_SIZE)
+# Journaled submissions whose inline write failed; the writer takes them first
+_retry = deque()
+_journal = None
+_worker = None
+_start_lock = threading.Lock()
+
+
+class Journal:
+    """Append-only segment files holding submissions until they are in the database
+
+    Each process writes its own segments and keeps them locked until every entry
+    in them has been flushed, so another process only replays segments whose
+    writer has died.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._handles = {}
+        self._pending = Counter()
+        self._active = None
+        self._sequence = 0
+
+    def append(self, entry):
+        """Durably record an entry and return the segment it was written to"""
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._active is None:
+                self._active = self._open_segment()
+            handle = self._handles[self._active]
+            handle.write(line.encode('utf-8'))
+            handle.flush()
+            os.fsync(handle.fileno())
+            self._pending[self._active] += 1
+            return self._active
+
+    def rotate(self):
+        """Seal the active segment so it can be removed once its entries are flushed"""
+        with self._lock:
+            segment, self._active = self._active, None
+            if segment is not None and not self._pending[segment]:
+                self._remove(segment)
+
+    def done(self, segments):
+        """Mark one flushed entry per listed segment; sealed, fully flushed segments are deleted"""
+        with self._lock:
+            for segment in segments:
+                self._pending[segment] -= 1
+                if self._pending[segment] <= 0 and segment != self._active:
+                    self._remove(segment)
+
+    def orphaned_segments(self):
+        """Yield (path, entries) for segments left behind by dead processes, deleting them once consumed"""
+        for path in sorted(self.directory.glob('*.jsonl')):
+            if path.name in self._handles:
+                continue
+            try:
+                handle = open(path, 'rb')
+            except FileNotFoundError:
+                continue
+            with handle:
+                try:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # still owned by a live writer
+                if not path.exists():
+                    continue  # replayed by another process meanwhile
+                entries = []
+                for line in handle:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        print(f"Skipping torn journal line in {path.name}")
+                yield path, entries
+                path.unlink(missing_ok=True)
+
+    def _open_segment(self):
+        self._sequence += 1
+        name = f"{os.getpid()}-{time.time_ns()}-{self._sequence:06d}.jsonl"
+        handle = open(self.directory / name, 'ab')
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        self._handles[name] = handle
+        return name
+
+    def _remove(self, segment):
+        handle = self._handles.pop(segment, None)
+        self._pending.pop(segment, None)
+        (self.directory / segment).unlink(missing_ok=True)
+        if handle is not None:
+            handle.close()
+
+
+def build_entry(fields, recommendations, rule_version):
+    """Journal entry for one submission"""
+    return {
+        'submission_id': uuid.uuid4().hex,
+        'timestamp': timezone.now().isoformat(),
+        'rule_version': rule_version,
+        'fields': {name: fields[name] for name in INPUT_FIELDS},
+        'recommendations': recommendations,
+    }
+
+
+def write_entries(entries):
+    """Insert journal entries; already stored submission ids are skipped"""
+    payloads = RecommendationPayload.objects.intern_many([entry['recommendations'] for entry in entries])
+    objects = [
+        PaddyRecommendation(
+            submission_id=uuid.UUID(entry['submission_id']),
+            payload=payload,
+            explanation=entry['recommendations']['explanation'],
+            rule_version=entry['rule_version'],
+            timestamp=parse_datetime(entry['timestamp']),
+            success=True,
+            **entry['fields'],
+        )
+        for entry, payload in zip(entries, payloads)
+    ]
+    with transaction.atomic():
+        # Replays may repeat submissions; only rows that are really new go into the rollup
+        stored = set(PaddyRecommendation.objects.filter(
+            submission_id__in=[rec.submission_id for rec in objects]
+        ).values_list('submission_id', flat=True))
+        objects = [rec for rec in objects if rec.submission_id not in stored]
+        PaddyRecommendation.objects.bulk_create(objects, batch_size=WRITE_BEHIND_BATCH, ignore_conflicts=True)
+        rollup.record_inserted(objects)
+        counters.record_inserted(objects)
+
+
+def submit(fields, recommendations, rule_version):
+    """Journal a submission and queue it for the background writer; returns the entry"""
+    start()
+    entry = build_entry(fields, recommendations, rule_version)
+    segment = _journal.append(entry)
+    try:
+        _queue.put_nowait((segment, entry))
+    except queue.Full:
+        # The writer is falling behind, so this request pays for its own insert
+        try:
+            write_entries([entry])
+        except Exception as e:
+            # Already journaled, so the submission is safe; leave it to the writer
+            print(f"Inline write of submission {entry['submission_id']} failed, deferring to the writer: {e}")
+            _retry.append((segment, entry))
+        else:
+            _journal.done([segment])
+    remember_recent(entry)
+    return entry
+
+
+def start():
+    """Start the writer thread once per process; it replays orphaned journal segments first"""
+    global _journal, _worker
+    with _start_lock:
+        if _worker is not None:
+            return
+        _journal = Journal(WRITE_BEHIND_JOURNAL_DIR)
+        _worker = threading.Thread(target=_writer_loop, name='recommendation-writer', daemon=True)
+        _worker.start()
+    atexit.register(drain)
+
+
+def replay_journal():
+    """Write entries from segments whose process died before flushing them"""
+    replayed = 0
+    for path, entries in _journal.orphaned_segments():
+        for start_index in range(0, len(entries), WRITE_BEHIND_BATCH):
+            write_entries(entries[start_index:start_index + WRITE_BEHIND_BATCH])
+        replayed += len(entries)
+        print(f"Replayed {len(entries)} journaled submission(s) from {path.name}")
+    return replayed
+
+
+def drain():
+    """Flush everything queued so far from the calling thread, e.g. at interpreter exit
+
+    Batches that fail stay in the journal and are replayed by the next process.
+    """
+    while True:
+        batch = _take_batch(block=False)
+        if not batch or not _flush(batch, retry=False):
+            return
+
+
+def _take_batch(block=True):
+    """Up to WRITE_BEHIND_BATCH queued items, waiting at most one flush interval for more"""
+    batch = []
+    while _retry and len(batch) < WRITE_BEHIND_BATCH:
+        batch.append(_retry.popleft())
+    if not batch:
+        try:
+            batch = [_queue.get(block=block)]
+        except queue.Empty:
+            return []
+    deadline = time.monotonic() + WRITE_BEHIND_FLUSH_INTERVAL
+    while len(batch) < WRITE_BEHIND_BATCH:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _flush(batch, retry=True):
+    """Write one batch, by default retrying until the database accepts it
+
+    The journal keeps the batch safe meanwhile. Returns False when a single
+    attempt (retry=False) failed.
+    """
+    _journal.rotate()
+    while True:
+        try:
+            write_entries([entry for segment, entry in batch])
+            break
+        except Exception as e:
+            print(f"Write-behind flush of {len(batch)} submission(s) failed: {e}")
+            if not retry:
+                return False
+            close_old_connections()
+            time.sleep(WRITE_BEHIND_FLUSH_INTERVAL)
+    _journal.done([segment for segment, entry in batch])
+    return True
+
+
+def _writer_loop():
+    """Background loop: replay leftovers once, then flush queued submissions in batches"""
+    try:
+        replay_journal()
+    except Exception as e:
+        print(f"Write-behind journal replay failed: {e}")
+    while True:
+        batch = _take_batch()
+        close_old_connections()
+        _flush(batch)
+
+
+def recent_entries_key():
+    """Cache key of the recent entries; every committed change moves to a new key"""
+    return f"{RECENT_ENTRIES_CACHE_KEY}:{get_data_version()}"
+
+
+def recent_entries():
+    """The latest submissions as dicts, served from the cache when possible"""
+    key = recent_entries_key()
+    entries = cache.get(key)
+    if entries is None:
+        entries = list(PaddyRecommendation.objects.values(*RECENT_ENTRY_FIELDS)[:RECENT_ENTRIES_LIMIT])
+        cache.set(key, entries, RECENT_ENTRIES_TTL)
+    return entries
+
+
+def remember_recent(entry):
+    """Show a queued submission in the recent entries list before it is written"""
+    recent = {'id': None, 'timestamp': parse_datetime(entry['timestamp'])}
+    recent.update({name: entry['fields'][name] for name in RECENT_ENTRY_FIELDS if name in entry['fields']})
+    entries = [recent] + recent_entries()
+    cache.set(recent_entries_key(), entries[:RECENT_ENTRIES_LIMIT], RECENT_ENTRIES_TTL)
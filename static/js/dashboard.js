@@ -536,8 +536,10 @@ class DashboardManager {
 
     async updateDashboardData() {
         try {
-            const response = await fetch('/api/dashboard-data/');
-            const data = await response.json();
+            const data = await fetchJSONIfModified('/api/dashboard-data/');
+            if (!data) {
+                return;
+            }
             
             // Update status displays
             this.updateStatusDisplay('irrigation', data.irrigation_status);
@@ -12,6 +12,7 @@ document.addEventListener('DOMContentLoaded', function() {
     initializeButtonHandlers();
     initializeWeatherWidget();
     initializeMobileMenu();
+    initializeLocationAutocomplete();
 });
 
 // Initialize Bootstrap tooltips
@@ -376,6 +377,33 @@ document.addEventListener('DOMContentLoaded', function() {
     initializeNotifications();
 });
 
+// ETags of the last response seen for each polled URL
+const pollETags = {};
+
+// Fetch JSON from a polled endpoint, sending If-None-Match so unchanged data
+// comes back as a body-less 304. Resolves to null when nothing changed and
+// rejects with an Error carrying the HTTP status for error responses.
+async function fetchJSONIfModified(url) {
+    const headers = {};
+    if (pollETags[url]) {
+        headers['If-None-Match'] = pollETags[url];
+    }
+    const response = await fetch(url, { headers: headers, cache: 'no-store' });
+    if (response.status === 304) {
+        return null;
+    }
+    if (!response.ok) {
+        const error = new Error(`${url} returned HTTP ${response.status}`);
+        error.status = response.status;
+        throw error;
+    }
+    const etag = response.headers.get('ETag');
+    if (etag) {
+        pollETags[url] = etag;
+    }
+    return response.json();
+}
+
 // Initialize real-time updates for dashboard
 function initializeRealTimeUpdates() {
     const dashboard = document.querySelector('.dashboard-container');
@@ -393,9 +421,8 @@ function initializeRealTimeUpdates() {
 // Update dashboard data from API
 async function updateDashboardData() {
     try {
-        const response = await fetch('/api/dashboard-data/');
-        if (response.ok) {
-            const data = await response.json();
+        const data = await fetchJSONIfModified('/api/dashboard-data/');
+        if (data) {
             updateDashboardUI(data);
         }
     } catch (error) {
@@ -622,9 +649,8 @@ function initializeMobileDashboard() {
 // Update mobile dashboard data
 async function updateMobileDashboard() {
     try {
-        const response = await fetch('/api/dashboard-data/');
-        if (response.ok) {
-            const data = await response.json();
+        const data = await fetchJSONIfModified('/api/dashboard-data/');
+        if (data) {
             updateMobileDashboardUI(data);
         }
     } catch (error) {
@@ -746,9 +772,8 @@ function initializeNotifications() {
 // Load notifications from API
 async function loadNotifications() {
     try {
-        const response = await fetch('/api/notifications/');
-        if (response.ok) {
-            const data = await response.json();
+        const data = await fetchJSONIfModified('/api/notifications/');
+        if (data) {
             updateNotificationsUI(data);
         }
     } catch (error) {
@@ -907,6 +932,38 @@ function updateNotificationCount() {
     }
 }
 
-
-
-
+// Suggest place names from the local gazetteer for location inputs
+function initializeLocationAutocomplete() {
+    const inputs = document.querySelectorAll('[data-location-autocomplete]');
+    inputs.forEach((input, index) => {
+        const list = document.createElement('datalist');
+        list.id = `locationSuggestions${index}`;
+        input.setAttribute('list', list.id);
+        input.after(list);
+        
+        let timer = null;
+        input.addEventListener('input', () => {
+            clearTimeout(timer);
+            const query = input.value.trim();
+            if (query.length < 2) {
+                list.innerHTML = '';
+                return;
+            }
+            timer = setTimeout(async () => {
+                try {
+                    const response = await fetch(`/api/locations/autocomplete/?q=${encodeURIComponent(query)}`);
+                    if (!response.ok) return;
+                    const data = await response.json();
+                    list.innerHTML = '';
+                    data.results.forEach(place => {
+                        const option = document.createElement('option');
+                        option.value = place.label;
+                        list.appendChild(option);
+                    });
+                } catch (error) {
+                    console.error('Error loading location suggestions:', error);
+                }
+            }, 150);
+        });
+    });
+}